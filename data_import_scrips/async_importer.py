@@ -0,0 +1,250 @@
+import asyncio
+import random
+import sys
+import time
+from queue import SimpleQueue, Empty
+from typing import Dict, List, Optional, Tuple
+
+from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import TransientError
+
+from metrics import metrics
+from neo4j_importer import BatchedNeo4JConnection, ImportJournal, Neo4JConnection, SharedNodes, DB_URI, \
+    IMPORT_BATCH_SIZE, IMPORT_RETRIES, RETRY_BASE_DELAY, collectSharedNodes, getSharedNodesBatches, \
+    importUserWithData
+
+# Transactions sent to the database at the same time, while one commits the others are already running
+ASYNC_IN_FLIGHT = 4
+# Batches built and waiting for a free transaction. Reading stops when they are full, so a slow
+# database slows reading down instead of filling the memory
+ASYNC_QUEUED_BATCHES = 4
+# Batches end between users, so batches in flight at the same time never MATCH what another one creates.
+# Users with more rows than this are split, their batches are written one after another
+ASYNC_SPLIT_USER_ROWS = 4 * IMPORT_BATCH_SIZE
+
+
+class AsyncBatch:
+    __slots__ = ("seq", "buffers", "rowsCount", "users", "dimensions", "splitsUser", "continuesUser")
+
+    def __init__(self, seq: int, buffers: Dict, rowsCount: int, users: List[str], dimensions: List,
+                 splitsUser: bool, continuesUser: bool):
+        self.seq = seq
+        self.buffers = buffers
+        self.rowsCount = rowsCount
+        self.users = users
+        self.dimensions = dimensions
+        # Rest of the last user is in the next batch, which has to wait for this one
+        self.splitsUser = splitsUser
+        self.continuesUser = continuesUser
+
+
+class QueuedBatchConnection(BatchedNeo4JConnection):
+    """
+    Builds the same rows as BatchedNeo4JConnection, but instead of writing full batches
+    hands them to AsyncImporter. Runs in the reading thread and blocks while the importer
+    has enough batches queued.
+    """
+
+    def __init__(self, importer: "AsyncImporter", batchSize: int, splitRows: int = ASYNC_SPLIT_USER_ROWS):
+        # Rows are flushed in the middle of a user only when there is more than splitRows of them
+        super().__init__(importer.driver, max(splitRows, batchSize))
+        self.importer = importer
+        self.targetRows = batchSize
+        self.batchesSubmitted = 0
+        self.lastSplitUser = False
+
+    def finishUser(self, userName: str):
+        self.finishedUsers.append(userName)
+        self.dimensions.addMany(self.importer.takeCommittedDimensions())
+        if self.bufferedRows >= self.targetRows:
+            self.submit(splitsUser=False)
+
+    def flush(self):
+        # Called only when the buffers are full, that is in the middle of a user
+        self.submit(splitsUser=True)
+
+    def close(self):
+        self.submit(splitsUser=False)
+
+    def submit(self, splitsUser: bool):
+        if self.bufferedRows == 0 and len(self.finishedUsers) == 0:
+            return
+        batch = AsyncBatch(self.batchesSubmitted, self.buffers, self.bufferedRows, self.finishedUsers,
+                           self.pendingDimensions, splitsUser, self.lastSplitUser)
+        self.batchesSubmitted += 1
+        self.lastSplitUser = splitsUser
+        self.buffers = {kind: {} for kind in self.FLUSH_ORDER}
+        self.bufferedRows = 0
+        self.finishedUsers = []
+        self.pendingDimensions = []
+        self.importer.put(batch)
+
+
+class AsyncImporter:
+    """
+    Reads the cache in a thread and writes what it reads with a bounded number of transactions
+    in flight on the async driver. Users go to the journal once their batch and all batches
+    before it are committed.
+    """
+
+    def __init__(self, driver, journal: ImportJournal = None, batchSize: int = IMPORT_BATCH_SIZE,
+                 inFlight: int = ASYNC_IN_FLIGHT, queuedBatches: int = ASYNC_QUEUED_BATCHES):
+        self.driver = driver
+        self.journal = journal
+        self.batchSize = batchSize
+        self.inFlight = inFlight
+        self.queuedBatches = queuedBatches
+        self.loop = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.error = None
+        self.sharedDimensions = []
+        # Filled by writers, read by the reading thread before it builds next rows
+        self.committedDimensions = SimpleQueue()
+        self.splitDone: Dict[int, asyncio.Event] = {}
+        self.committedUsers: Dict[int, List[str]] = {}
+        self.nextToJournal = 0
+        self.batchesWritten = 0
+
+    def put(self, batch: AsyncBatch):
+        start = time.perf_counter()
+        asyncio.run_coroutine_threadsafe(self.queue.put(batch), self.loop).result()
+        metrics.observe("async_put_wait_seconds", time.perf_counter() - start)
+
+    def takeCommittedDimensions(self) -> List[Tuple[str, object]]:
+        dimensions = []
+        while True:
+            try:
+                dimensions.extend(self.committedDimensions.get_nowait())
+            except Empty:
+                return dimensions
+
+    def read(self, userNames: List[str]):
+        conn = QueuedBatchConnection(self, self.batchSize)
+        conn.dimensions.addMany(self.sharedDimensions)
+        for userName in userNames:
+            if self.error is not None:
+                break
+            importUserWithData(userName, conn)
+            conn.finishUser(userName)
+        conn.close()
+
+    async def write(self):
+        while True:
+            batch = await self.queue.get()
+            if batch is None:
+                return
+            try:
+                if batch.continuesUser:
+                    await self.splitDone.setdefault(batch.seq - 1, asyncio.Event()).wait()
+                    del self.splitDone[batch.seq - 1]
+                if self.error is None:
+                    await writeWithRetriesAsync(self.driver, writeBuffersAsync, batch.buffers)
+                    self.committed(batch)
+            except Exception as e:
+                # Keeps draining, reading thread blocked on a full queue would never finish otherwise
+                self.error = e
+                print("[ASYNC]", "writing failed, stopping import:", e, file=sys.stderr)
+            finally:
+                if batch.splitsUser:
+                    self.splitDone.setdefault(batch.seq, asyncio.Event()).set()
+
+    def committed(self, batch: AsyncBatch):
+        for kind, queries in batch.buffers.items():
+            rowsCount = sum(len(rows) for rows in queries.values())
+            if rowsCount > 0:
+                metrics.increment("rows_written_total", rowsCount, {"statement": kind})
+        self.committedDimensions.put(batch.dimensions)
+        self.batchesWritten += 1
+        print("[BATCH]", f"batch {self.batchesWritten} with {batch.rowsCount} rows committed")
+        # Batches commit out of order, journal follows only the ones with everything before them committed
+        self.committedUsers[batch.seq] = batch.users
+        while self.nextToJournal in self.committedUsers:
+            users = self.committedUsers.pop(self.nextToJournal)
+            if self.journal is not None:
+                self.journal.markImported(users)
+            self.nextToJournal += 1
+
+    async def createSharedNodes(self, userNames: List[str]):
+        # Like the parallel import, nodes of many users are created first so transactions in flight only match them
+        shared: SharedNodes = await self.loop.run_in_executor(None, collectSharedNodes, userNames)
+        # Every batch has different nodes, they are written at the same time too
+        inFlight = asyncio.Semaphore(self.inFlight)
+
+        async def writeShared(query: str, rows: List):
+            async with inFlight:
+                await writeWithRetriesAsync(self.driver, runUnwindAsync, query, rows)
+
+        batches = getSharedNodesBatches(shared, self.batchSize)
+        await asyncio.gather(*(writeShared(query, rows) for query, rows in batches))
+        self.sharedDimensions = shared.getDimensions()
+        print("[SHARED]", len(shared.languages), "languages,", len(shared.topics), "topics,",
+              len(shared.licenses), "licenses,", len(shared.users), "users")
+
+    async def run(self, userNames: List[str]):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queuedBatches)
+        await self.createSharedNodes(userNames)
+        writers = [asyncio.ensure_future(self.write()) for _ in range(self.inFlight)]
+        try:
+            await self.loop.run_in_executor(None, self.read, userNames)
+        finally:
+            for _ in writers:
+                await self.queue.put(None)
+            await asyncio.gather(*writers)
+        if self.error is not None:
+            raise self.error
+
+
+async def writeBuffersAsync(tx, buffers: Dict):
+    for kind in BatchedNeo4JConnection.FLUSH_ORDER:
+        for query, rows in buffers[kind].items():
+            with metrics.timed("cypher_seconds", {"statement": kind}):
+                result = await tx.run(query, rows=rows)
+                await result.consume()
+
+
+async def runUnwindAsync(tx, query: str, rows: List):
+    result = await tx.run(query, rows=rows)
+    await result.consume()
+
+
+async def writeWithRetriesAsync(driver, work, *args):
+    # Same as writeWithRetries, waiting for the next attempt does not stop other transactions
+    for attempt in range(IMPORT_RETRIES):
+        try:
+            async with driver.session() as ses:
+                return await ses.write_transaction(work, *args)
+        except TransientError as e:
+            if attempt == IMPORT_RETRIES - 1:
+                raise
+            delay = RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+            metrics.increment("transaction_retries_total")
+            print("[RETRY]", f"attempt {attempt + 1} failed, retrying in {delay:.2f}s:", e.code, file=sys.stderr)
+            await asyncio.sleep(delay)
+
+
+async def importUsersAsync(userNames: List[str], driver, journal: ImportJournal = None,
+                           batchSize: int = IMPORT_BATCH_SIZE, inFlight: int = ASYNC_IN_FLIGHT):
+    await AsyncImporter(driver, journal, batchSize, inFlight).run(userNames)
+
+
+async def main():
+    journal = ImportJournal()
+    # Schema is created once with the sync driver, the rest goes through the async one
+    conn = Neo4JConnection(journal=journal)
+    conn.createSchema()
+    conn.close()
+    with open("users_to_fetch.txt") as userNamesList:
+        userNames = [userName.strip() for userName in userNamesList]
+    pendingUserNames = [userName for userName in userNames if not journal.isImported(userName)]
+    print("[JOURNAL]", len(userNames) - len(pendingUserNames), "users already imported, skipping them")
+    driver = AsyncGraphDatabase.driver(DB_URI)
+    try:
+        await importUsersAsync(pendingUserNames, driver, journal)
+    finally:
+        await driver.close()
+    metrics.writeReport()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+import json
+import random
+import time
+import tracemalloc
+
+import data_types
+from data_types import Issue, Repo
+
+# Synthetic payloads shaped like Github responses, users are drawn from a pool
+# so the same authors repeat like in real data
+BENCH_ISSUES = 40000
+BENCH_REPOS = 10000
+BENCH_USERS_POOL = 5000
+
+
+class LegacyUser:
+    # Copy of the User before __slots__ and interning, used as the baseline
+    def __init__(self, asDict):
+        self.type = asDict.get("type", "User")
+        self.name = asDict["login"]
+        self.blog = asDict.get("blog")
+        self.email = asDict.get("email")
+        self.isOriginal = False
+        self.id = asDict["id"]
+
+
+class LegacyIssue:
+    def __init__(self, asDict, repoFullName: str):
+        self.title = asDict["title"]
+        self.id = asDict["id"]
+        self.user = LegacyUser(asDict["user"])
+        self.body = asDict["body"]
+        self.createdAt = asDict["created_at"]
+        self.repoFullName = repoFullName
+
+
+class LegacyRepo:
+    def __init__(self, asDict):
+        self.id = asDict["id"]
+        self.name = asDict["name"]
+        self.fullName = asDict["full_name"]
+        self.owner = LegacyUser(asDict["owner"])
+        self.language = asDict["language"]
+        self.homepage = asDict["homepage"]
+        self.defaultBranch = asDict["default_branch"]
+        self.description = asDict["description"]
+        self.license = None
+        self.topics = asDict["topics"]
+
+
+def generateUser(i: int) -> dict:
+    # Shape of a user nested in Github responses
+    login = f"user-{i}"
+    return {
+        "login": login, "id": i, "node_id": f"MDQ6VXNlcj{i}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{i}?v=4",
+        "gravatar_id": "", "url": f"https://api.github.com/users/{login}", "html_url": f"https://github.com/{login}",
+        "followers_url": f"https://api.github.com/users/{login}/followers",
+        "following_url": f"https://api.github.com/users/{login}/following{{/other_user}}",
+        "gists_url": f"https://api.github.com/users/{login}/gists{{/gist_id}}",
+        "starred_url": f"https://api.github.com/users/{login}/starred{{/owner}}{{/repo}}",
+        "subscriptions_url": f"https://api.github.com/users/{login}/subscriptions",
+        "organizations_url": f"https://api.github.com/users/{login}/orgs",
+        "repos_url": f"https://api.github.com/users/{login}/repos",
+        "events_url": f"https://api.github.com/users/{login}/events{{/privacy}}",
+        "received_events_url": f"https://api.github.com/users/{login}/received_events",
+        "type": "User", "site_admin": False,
+    }
+
+
+def generateIssue(i: int, user: dict) -> dict:
+    # Shape of an item of /repos/{owner}/{repo}/issues
+    url = f"https://api.github.com/repos/owner/repo/issues/{i}"
+    return {
+        "url": url, "repository_url": "https://api.github.com/repos/owner/repo",
+        "labels_url": f"{url}/labels{{/name}}", "comments_url": f"{url}/comments", "events_url": f"{url}/events",
+        "html_url": f"https://github.com/owner/repo/issues/{i}", "id": i, "node_id": f"MDU6SXNzdWU{i}", "number": i,
+        "title": f"issue {i}", "user": user,
+        "labels": [{"id": 1, "node_id": "MDU6TGFiZWwx", "url": "https://api.github.com/repos/owner/repo/labels/bug",
+                    "name": "bug", "color": "d73a4a", "default": True, "description": "Something isn't working"}],
+        "state": "open", "locked": False, "assignee": None, "assignees": [], "milestone": None,
+        "comments": random.randint(0, 20), "created_at": "2020-01-01T00:00:00Z", "updated_at": "2020-01-02T00:00:00Z",
+        "closed_at": None, "author_association": "CONTRIBUTOR", "active_lock_reason": None,
+        "body": "text " * random.randint(0, 100),
+        "reactions": {"url": f"{url}/reactions", "total_count": 0, "+1": 0, "-1": 0, "laugh": 0, "hooray": 0,
+                      "confused": 0, "heart": 0, "rocket": 0, "eyes": 0},
+        "timeline_url": f"{url}/timeline", "performed_via_github_app": None, "state_reason": None,
+    }
+
+
+def generateRepo(i: int, owner: dict) -> dict:
+    # Shape of an item of /users/{user}/repos
+    fullName = f"{owner['login']}/repo-{i}"
+    url = f"https://api.github.com/repos/{fullName}"
+    repo = {
+        "id": i, "node_id": f"MDEwOlJlcG9zaXRvcnk{i}", "name": f"repo-{i}", "full_name": fullName, "private": False,
+        "owner": owner, "html_url": f"https://github.com/{fullName}", "description": "description " * 10,
+        "fork": False, "url": url, "homepage": None, "size": random.randint(0, 10000),
+        "stargazers_count": random.randint(0, 100), "watchers_count": 0, "language": "Python", "has_issues": True,
+        "has_projects": True, "has_downloads": True, "has_wiki": True, "has_pages": False, "forks_count": 0,
+        "mirror_url": None, "archived": False, "disabled": False, "open_issues_count": 0, "license": None,
+        "allow_forking": True, "is_template": False, "topics": ["a", "b"], "visibility": "public", "forks": 0,
+        "open_issues": 0, "watchers": 0, "default_branch": "main", "created_at": "2020-01-01T00:00:00Z",
+        "updated_at": "2020-01-02T00:00:00Z", "pushed_at": "2020-01-02T00:00:00Z",
+        "git_url": f"git://github.com/{fullName}.git", "ssh_url": f"git@github.com:{fullName}.git",
+        "clone_url": f"https://github.com/{fullName}.git", "svn_url": f"https://github.com/{fullName}",
+    }
+    for endpoint in ["forks", "keys", "collaborators", "teams", "hooks", "issue_events", "events", "assignees",
+                     "branches", "tags", "blobs", "git_tags", "git_refs", "trees", "statuses", "languages",
+                     "stargazers", "contributors", "subscribers", "subscription", "commits", "git_commits",
+                     "comments", "issue_comment", "contents", "compare", "merges", "archive", "downloads", "issues",
+                     "pulls", "milestones", "notifications", "labels", "releases", "deployments"]:
+        repo[f"{endpoint}_url"] = f"{url}/{endpoint}"
+    return repo
+
+
+def generatePayloads():
+    # Encoded like cached responses, objects are built from what json.loads returns for them
+    random.seed(1)
+    users = [generateUser(i) for i in range(BENCH_USERS_POOL)]
+    issues = [json.dumps(generateIssue(i, random.choice(users))) for i in range(BENCH_ISSUES)]
+    repos = [json.dumps(generateRepo(i, random.choice(users))) for i in range(BENCH_REPOS)]
+    return issues, repos
+
+
+def measure(title: str, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = build()
+    elapsed = time.perf_counter() - start
+    # Decoded payloads are gone by now, what is left is kept by the objects themselves
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("[BENCH]", f"{title}: {len(objects)} objects in {elapsed:.2f}s ({len(objects) / elapsed:.0f}/s),",
+          f"retained {retained / 2 ** 20:.1f} MB, peak {peak / 2 ** 20:.1f} MB")
+    return objects
+
+
+if __name__ == '__main__':
+    issues, repos = generatePayloads()
+
+    # Each payload is decoded and dropped right after its object is built, like when reading the cache
+    def buildLegacy():
+        return ([LegacyIssue(json.loads(i), "owner/repo") for i in issues] +
+                [LegacyRepo(json.loads(r)) for r in repos])
+
+    def buildSlotted():
+        data_types.internedUsers.clear()
+        return [Issue(json.loads(i), "owner/repo") for i in issues] + [Repo(json.loads(r)) for r in repos]
+
+    measure("plain classes", buildLegacy)
+    data_types.INTERN_USERS = False
+    measure("__slots__", buildSlotted)
+    data_types.INTERN_USERS = True
+    measure("__slots__ with interned users", buildSlotted)
@@ -0,0 +1,95 @@
+import asyncio
+import os.path
+import time
+import tracemalloc
+
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+import metrics
+import neo4j_importer
+from async_importer import importUsersAsync
+from dataset_snapshot import getSnapshot
+from metrics import metrics as runMetrics
+from neo4j_importer import Neo4JConnection, BatchedNeo4JConnection, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    importUserWithData, importUsersInParallel
+from recording_driver import AsyncRecordingDriver, RecordingDriver
+from synthetic_data import SYNTHETIC_USERS_FILE, enterSyntheticFolder, generateDataset, readSyntheticUsers
+
+# None runs against the recording driver, so only the importer itself is measured.
+# With an uri of a local throwaway database the whole path including Neo4j is measured.
+BENCH_DB_URI = None
+# Seconds the recording driver waits on every commit, stands in for the server when there is no database
+BENCH_COMMIT_LATENCY = 0.0
+# Import paths to measure, see importWith
+BENCH_MODES = ["sequential", "batched", "parallel", "async", "snapshot"]
+
+
+def openDriver(mode: str):
+    if mode == "async":
+        if BENCH_DB_URI is None:
+            return AsyncRecordingDriver(BENCH_COMMIT_LATENCY)
+        return AsyncGraphDatabase.driver(BENCH_DB_URI)
+    if BENCH_DB_URI is None:
+        return RecordingDriver(BENCH_COMMIT_LATENCY)
+    return GraphDatabase.driver(BENCH_DB_URI)
+
+
+def importWith(mode: str, userNames, driver):
+    if mode == "sequential":
+        conn = Neo4JConnection(driver)
+    elif mode == "batched" or mode == "snapshot":
+        conn = BatchedNeo4JConnection(driver, IMPORT_BATCH_SIZE)
+    elif mode == "parallel":
+        importUsersInParallel(userNames, driver, IMPORT_WORKERS, IMPORT_BATCH_SIZE)
+        return
+    elif mode == "async":
+        asyncio.run(importAsyncAndClose(userNames, driver))
+        return
+    else:
+        raise Exception(f"Unknown import mode {mode}")
+    for userName in userNames:
+        importUserWithData(userName, conn)
+        conn.finishUser(userName)
+    if isinstance(conn, BatchedNeo4JConnection):
+        conn.flush()
+
+
+async def importAsyncAndClose(userNames, driver):
+    # Async driver is closed on the loop that used it
+    try:
+        await importUsersAsync(userNames, driver, batchSize=IMPORT_BATCH_SIZE)
+    finally:
+        await driver.close()
+
+
+def measure(mode: str, userNames):
+    # Batched import reading the compiled snapshot instead of the cache
+    neo4j_importer.IMPORT_FROM_SNAPSHOT = mode == "snapshot"
+    if mode == "snapshot":
+        # Compiled once before measuring, like on every import after the first one
+        getSnapshot()
+    driver = openDriver(mode)
+    runMetrics.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    importWith(mode, userNames, driver)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if mode != "async":
+        driver.close()
+    # Every row is one entity or relationship, unbatched writes count one row per transaction
+    entities = sum(value for key, value in runMetrics.report()["counters"].items()
+                   if key.startswith("rows_written_total"))
+    print("[BENCH]", f"{mode}: {entities:.0f} entities in {elapsed:.2f}s ({entities / elapsed:.0f}/s),",
+          f"peak {peak / 2 ** 20:.1f} MB")
+
+
+if __name__ == '__main__':
+    enterSyntheticFolder()
+    if not os.path.exists(SYNTHETIC_USERS_FILE):
+        generateDataset()
+    metrics.LOG_LEVEL = "quiet"
+    userNames = readSyntheticUsers()
+    for mode in BENCH_MODES:
+        measure(mode, userNames)
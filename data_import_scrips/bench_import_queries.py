@@ -0,0 +1,58 @@
+import random
+
+from data_types import Gist, Repo, User
+from neo4j_importer import Neo4JConnection, BatchedNeo4JConnection
+from recording_driver import RecordingDriver
+
+# Synthetic entities, counted statements do not depend on the data so a small sample is enough
+BENCH_REPOS = 1000
+BENCH_GISTS = 1000
+BENCH_TOPICS_PER_REPO = 5
+BENCH_FILES_PER_GIST = 3
+
+
+def generateEntities():
+    random.seed(1)
+    owner = User({"login": "owner", "id": 1, "type": "User"})
+    repos = [Repo({
+        "id": i, "name": f"repo-{i}", "full_name": f"owner/repo-{i}", "owner": {"login": "owner", "id": 1},
+        "language": "Python", "homepage": None, "default_branch": "main", "description": "description",
+        "license": {"key": "mit", "name": "MIT License", "spdx_id": "MIT", "url": None},
+        "topics": [f"topic-{random.randrange(100)}" for _ in range(BENCH_TOPICS_PER_REPO)],
+    }) for i in range(BENCH_REPOS)]
+    gists = [Gist({
+        "id": f"gist-{i}", "description": "gist", "owner": {"login": "owner", "id": 1},
+        "files": {f"file-{j}.py": {"filename": f"file-{j}.py", "type": "text/plain", "language": "Python", "size": 10}
+                  for j in range(BENCH_FILES_PER_GIST)},
+    }) for i in range(BENCH_GISTS)]
+    return owner, repos, gists
+
+
+def measure(title: str, conn: Neo4JConnection, driver: RecordingDriver, write, count: int):
+    driver.statements = 0
+    driver.transactions = 0
+    write(conn)
+    if isinstance(conn, BatchedNeo4JConnection):
+        conn.flush()
+    print("[BENCH]", f"{title}: {driver.statements / count:.3f} statements and",
+          f"{driver.transactions / count:.3f} transactions per entity")
+
+
+if __name__ == '__main__':
+    owner, repos, gists = generateEntities()
+
+    def writeRepos(conn: Neo4JConnection):
+        for repo in repos:
+            conn.createRepo(repo)
+
+    def writeGists(conn: Neo4JConnection):
+        for gist in gists:
+            conn.createGist(owner, gist)
+
+    for connectionClass in [Neo4JConnection, BatchedNeo4JConnection]:
+        driver = RecordingDriver()
+        conn = connectionClass(driver)
+        measure(f"{connectionClass.__name__} repos with {BENCH_TOPICS_PER_REPO} topics", conn, driver, writeRepos,
+                BENCH_REPOS)
+        measure(f"{connectionClass.__name__} gists with {BENCH_FILES_PER_GIST} files", conn, driver, writeGists,
+                BENCH_GISTS)
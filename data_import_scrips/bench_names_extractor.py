@@ -0,0 +1,62 @@
+import json
+import os.path
+import sys
+import tempfile
+import time
+
+from names_extractor import iterLogins, READ_BUFFER_SIZE
+
+# Generated dump is big, it goes to the temporary folder and not next to the scripts
+BENCH_FILE = os.path.join(tempfile.gettempdir(), "bench_users.jsonl")
+# Size of generated dump, can be overridden in MB with first argument
+BENCH_FILE_SIZE = 1 << 30
+
+
+def generateDump(path: str, size: int):
+    # Shape of user records in the dump, long enough for the login to be a small part of the line
+    template = {
+        "login": None, "id": None, "node_id": "MDQ6VXNlcjE=", "type": "User", "site_admin": False,
+        "name": "Some Name", "company": "@company", "blog": "https://example.com", "location": "Earth",
+        "email": None, "hireable": None, "bio": "x" * 200, "public_repos": 10, "public_gists": 1,
+        "followers": 5, "following": 7, "created_at": "2010-01-01T00:00:00Z", "updated_at": "2020-01-01T00:00:00Z",
+        "avatar_url": "https://avatars.githubusercontent.com/u/1?v=4",
+        "url": "https://api.github.com/users/someone", "repos_url": "https://api.github.com/users/someone/repos",
+    }
+    written = 0
+    i = 0
+    with open(path, "w", buffering=READ_BUFFER_SIZE) as out:
+        while written < size:
+            template["login"] = f"user-{i}"
+            template["id"] = i
+            line = json.dumps(template) + "\n"
+            out.write(line)
+            written += len(line)
+            i += 1
+    print("[BENCH]", f"generated {i} users, {written / 2 ** 20:.0f} MB")
+
+
+def measure(title: str, size: int, work):
+    start = time.perf_counter()
+    count = work()
+    elapsed = time.perf_counter() - start
+    print("[BENCH]", f"{title}: {count} lines in {elapsed:.2f}s, {size / 2 ** 20 / elapsed:.0f} MB/s")
+
+
+def readRaw(path: str) -> int:
+    lines = 0
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as f:
+        for _ in f:
+            lines += 1
+    return lines
+
+
+if __name__ == '__main__':
+    size = BENCH_FILE_SIZE
+    if len(sys.argv) > 1:
+        size = int(sys.argv[1]) * 2 ** 20
+    if not os.path.exists(BENCH_FILE) or os.path.getsize(BENCH_FILE) < size:
+        generateDump(BENCH_FILE, size)
+    size = os.path.getsize(BENCH_FILE)
+    measure("raw line reading", size, lambda: readRaw(BENCH_FILE))
+    measure("fast login extraction", size, lambda: sum(1 for _ in iterLogins(BENCH_FILE, fast=True)))
+    measure("json.loads per line", size, lambda: sum(1 for _ in iterLogins(BENCH_FILE, fast=False)))
@@ -0,0 +1,198 @@
+import time
+from typing import Dict, List, Tuple
+
+from neo4j import GraphDatabase
+# Needed only by this stage, the importer itself works without them
+import numpy as np
+from scipy import sparse
+
+from data_types import Repo, User, internUser
+from gh_cache import getRepoCacheName, iterCachedItems
+from metrics import metrics
+from neo4j_importer import DB_URI, IMPORT_BATCH_SIZE, runUnwind, writeWithRetries
+
+# (contributor)-[:HELPS {repos}]->(owner) - contributor contributes to that many repositories of the owner,
+# what dbproject.findHelpers traverses on every call
+HELPS_QUERY = """
+UNWIND $rows AS row
+MATCH (c:{fromLabel} {{id: row.from_id}})
+MATCH (o:{toLabel} {{id: row.to_id}})
+MERGE (c)-[h:HELPS]->(o)
+SET h.repos = row.repos
+"""
+# (coder)-[:CODES_IN {repos}]->(language) - coder owns or contributes to that many repositories in the language,
+# what dbproject.findCodersInLanguage traverses on every call
+CODES_IN_QUERY = """
+UNWIND $rows AS row
+MATCH (c:{label} {{id: row.user_id}})
+MATCH (lang:Language {{name: row.lang}})
+MERGE (c)-[r:CODES_IN]->(lang)
+SET r.repos = row.repos
+"""
+# Edges are rebuilt in one pass, old ones go first so edges and counts of contributions
+# or languages that changed since the last run do not stay behind
+DELETE_EDGES_QUERY = """
+MATCH ()-[r:{relation}]->()
+WITH r LIMIT $limit
+DELETE r
+RETURN count(r)
+"""
+
+
+class KeyIndex:
+    # Keys to consecutive matrix rows/columns and back
+    def __init__(self):
+        self.positions: Dict[object, int] = {}
+        self.keys = []
+
+    def add(self, key) -> int:
+        position = self.positions.get(key)
+        if position is None:
+            position = len(self.keys)
+            self.positions[key] = position
+            self.keys.append(key)
+        return position
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class CollaborationMatrices:
+    """
+    Cached repositories as sparse 0/1 matrices: owns and contributes are user x repository,
+    writtenIn is repository x language.
+    """
+
+    def __init__(self):
+        self.users = KeyIndex()
+        self.userLabels = []
+        self.repos = KeyIndex()
+        self.languages = KeyIndex()
+        self.owns: Tuple[List[int], List[int]] = ([], [])
+        self.contributes: Tuple[List[int], List[int]] = ([], [])
+        self.writtenIn: Tuple[List[int], List[int]] = ([], [])
+
+    def addUser(self, user: User) -> int:
+        position = self.users.add(user.id)
+        if position == len(self.userLabels):
+            self.userLabels.append(user.type)
+        return position
+
+    def addRepo(self, repo: Repo) -> int:
+        position = self.repos.add(repo.id)
+        self.owns[0].append(self.addUser(repo.owner))
+        self.owns[1].append(position)
+        if repo.language is not None:
+            self.writtenIn[0].append(position)
+            self.writtenIn[1].append(self.languages.add(repo.language))
+        return position
+
+    def addContributor(self, repoPosition: int, user: User):
+        self.contributes[0].append(self.addUser(user))
+        self.contributes[1].append(repoPosition)
+
+    def toMatrix(self, pairs: Tuple[List[int], List[int]], shape: Tuple[int, int]) -> sparse.csr_matrix:
+        rows = np.array(pairs[0], dtype=np.int32)
+        columns = np.array(pairs[1], dtype=np.int32)
+        matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=shape)
+        # Repository listed twice (e.g. under two users) is still one repository
+        matrix.data[:] = 1
+        return matrix
+
+    def computeHelps(self) -> sparse.coo_matrix:
+        usersCount, reposCount = len(self.users), len(self.repos)
+        contributes = self.toMatrix(self.contributes, (usersCount, reposCount))
+        owns = self.toMatrix(self.owns, (usersCount, reposCount))
+        # contributor x owner, value is the number of owner's repositories the contributor contributes to
+        helps = (contributes @ owns.T).tolil()
+        # Owners contributing to their own repositories do not help themselves
+        helps.setdiag(0)
+        helps = helps.tocsr()
+        helps.eliminate_zeros()
+        return helps.tocoo()
+
+    def computeCodesIn(self) -> sparse.coo_matrix:
+        usersCount, reposCount = len(self.users), len(self.repos)
+        codes = self.toMatrix((self.contributes[0] + self.owns[0], self.contributes[1] + self.owns[1]),
+                              (usersCount, reposCount))
+        writtenIn = self.toMatrix(self.writtenIn, (reposCount, len(self.languages)))
+        # coder x language, value is the number of repositories in the language the coder owns or contributes to
+        return (codes @ writtenIn).tocoo()
+
+
+def loadCollaborationMatrices(userNames: List[str]) -> CollaborationMatrices:
+    matrices = CollaborationMatrices()
+    for userName in userNames:
+        for repo in (Repo(r) for r in iterCachedItems(f"users__{userName}__repos")):
+            position = matrices.addRepo(repo)
+            for contributor in (internUser(u) for u in iterCachedItems(getRepoCacheName(repo, "contributors"))):
+                matrices.addContributor(position, contributor)
+    return matrices
+
+
+def getHelpsBatches(matrices: CollaborationMatrices, batchSize: int = IMPORT_BATCH_SIZE) -> List[Tuple[str, List]]:
+    helps = matrices.computeHelps()
+    rowsByLabels = {}
+    userIds, labels = matrices.users.keys, matrices.userLabels
+    for contributor, owner, repos in zip(helps.row.tolist(), helps.col.tolist(), helps.data.tolist()):
+        rowsByLabels.setdefault((labels[contributor], labels[owner]), []).append(
+            {"from_id": userIds[contributor], "to_id": userIds[owner], "repos": repos})
+    return splitBatches({HELPS_QUERY.format(fromLabel=fromLabel, toLabel=toLabel): rows
+                         for (fromLabel, toLabel), rows in rowsByLabels.items()}, batchSize)
+
+
+def getCodesInBatches(matrices: CollaborationMatrices, batchSize: int = IMPORT_BATCH_SIZE) -> List[Tuple[str, List]]:
+    codesIn = matrices.computeCodesIn()
+    rowsByLabel = {}
+    userIds, labels, languages = matrices.users.keys, matrices.userLabels, matrices.languages.keys
+    for coder, language, repos in zip(codesIn.row.tolist(), codesIn.col.tolist(), codesIn.data.tolist()):
+        rowsByLabel.setdefault(labels[coder], []).append(
+            {"user_id": userIds[coder], "lang": languages[language], "repos": repos})
+    return splitBatches({CODES_IN_QUERY.format(label=label): rows for label, rows in rowsByLabel.items()}, batchSize)
+
+
+def splitBatches(rowsByQuery: Dict[str, List], batchSize: int) -> List[Tuple[str, List]]:
+    batchSize = max(batchSize, 1)
+    return [(query, rows[i:i + batchSize])
+            for query, rows in rowsByQuery.items() for i in range(0, len(rows), batchSize)]
+
+
+def deleteEdgesBatch(tx, relation: str, limit: int) -> int:
+    return tx.run(DELETE_EDGES_QUERY.format(relation=relation), limit=limit).single()[0]
+
+
+def deleteEdges(driver, relation: str, batchSize: int = IMPORT_BATCH_SIZE) -> int:
+    # In batches, one transaction deleting every edge could run out of memory
+    deleted = 0
+    while True:
+        count = writeWithRetries(driver, deleteEdgesBatch, relation, max(batchSize, 1))
+        if not count:
+            return deleted
+        deleted += count
+
+
+def importCollaborationGraph(userNames: List[str], driver, batchSize: int = IMPORT_BATCH_SIZE):
+    # Runs after the import, edges MATCH users and languages written by it. Every run rebuilds all
+    # HELPS and CODES_IN edges from the given users, so it is called with all imported users
+    start = time.perf_counter()
+    matrices = loadCollaborationMatrices(userNames)
+    print("[GRAPH]", len(matrices.users), "users,", len(matrices.repos), "repos,", len(matrices.languages),
+          "languages loaded in", f"{time.perf_counter() - start:.2f}s")
+    for statement, relation, batches in [("helps", "HELPS", getHelpsBatches(matrices, batchSize)),
+                                         ("codes_in", "CODES_IN", getCodesInBatches(matrices, batchSize))]:
+        with metrics.timed("cypher_seconds", {"statement": f"delete_{statement}"}):
+            print("[GRAPH]", deleteEdges(driver, relation, batchSize), "old", statement, "edges deleted")
+        with metrics.timed("cypher_seconds", {"statement": statement}):
+            for query, rows in batches:
+                writeWithRetries(driver, runUnwind, query, rows)
+                metrics.increment("rows_written_total", len(rows), {"statement": statement})
+        print("[GRAPH]", sum(len(rows) for _, rows in batches), statement, "edges written")
+
+
+if __name__ == '__main__':
+    with open("users_to_fetch.txt") as userNamesList:
+        userNames = [userName.strip() for userName in userNamesList if userName.strip() != ""]
+    graphDriver = GraphDatabase.driver(DB_URI)
+    importCollaborationGraph(userNames, graphDriver)
+    graphDriver.close()
+    metrics.writeReport()
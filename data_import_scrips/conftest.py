@@ -0,0 +1,50 @@
+import pytest
+
+import data_types
+import gh_cache
+import metrics
+import rate_limiter
+from synthetic_data import generateDataset
+
+
+@pytest.fixture
+def emptyCache(tmp_path, monkeypatch):
+    # Cache paths are relative, every test runs in its own folder with its own cache
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gh_cache, "cache", None)
+    monkeypatch.setattr(metrics, "LOG_LEVEL", "quiet")
+    data_types.internedUsers.clear()
+    metrics.metrics.reset()
+    yield tmp_path
+    if gh_cache.cache is not None:
+        gh_cache.cache.close()
+
+
+@pytest.fixture
+def syntheticUsers(emptyCache):
+    return generateDataset(usersCount=5)
+
+
+class FakeClock:
+    # Stands in for the time module in rate_limiter, sleeping only moves the clock
+    def __init__(self, now: float = 1700000000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fakeClock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    monkeypatch.setattr(metrics, "LOG_LEVEL", "quiet")
+    return clock
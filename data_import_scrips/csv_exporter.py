@@ -0,0 +1,195 @@
+import csv
+import json
+import os.path
+from typing import Dict, List
+
+from data_types import User, Issue, PullRequest, Gist, Repo, internUser
+from gh_cache import getRepoCacheName, iterCachedItems, readCached
+
+EXPORT_FOLDER = "csv_export"
+
+# Header of every node file, ids are grouped in id spaces so e.g. repo 1 and issue 1 do not clash.
+# Owners are in one file because their label (User, Organization, Bot) comes from the data.
+NODE_FILES = {
+    "owners": (None, [":ID(Owner)", "id:long", "name", "blog", "email", ":LABEL"]),
+    "repositories": ("Repository", [":ID(Repository)", "id:long", "name", "fullName", "description", "homepage",
+                                    "defaultBranch"]),
+    "gists": ("Gist", ["id:ID(Gist)", "description"]),
+    "gist_files": ("GistFile", [":ID(GistFile)", "name", "type", "size:long"]),
+    "issues": ("Issue", [":ID(Issue)", "id:long", "name", "body"]),
+    "pull_requests": ("PullRequest", [":ID(PullRequest)", "id:long", "name", "body"]),
+    "languages": ("Language", ["name:ID(Language)"]),
+    "topics": ("Topic", ["name:ID(Topic)"]),
+    "licenses": ("License", ["spdxId:ID(License)", "key", "name", "url"]),
+}
+
+# Relationship file -> (type, id space of start node, id space of end node),
+# the same relationships that Neo4JConnection creates
+RELATIONSHIP_FILES = {
+    "owns": ("OWNS", "Owner", "Repository"),
+    "contributes": ("CONTRIBUTES", "Owner", "Repository"),
+    "subscribes": ("SUBSCRIBES", "Owner", "Repository"),
+    "has_issues": ("HAS", "Repository", "Issue"),
+    "has_pull_requests": ("HAS", "Repository", "PullRequest"),
+    "created_gists": ("CREATED", "Owner", "Gist"),
+    "created_issues": ("CREATED", "Owner", "Issue"),
+    "created_pull_requests": ("CREATED", "Owner", "PullRequest"),
+    "contains": ("CONTAINS", "Gist", "GistFile"),
+    "repo_is_written_in": ("IS_WRITTEN_IN", "Repository", "Language"),
+    "gist_file_is_written_in": ("IS_WRITTEN_IN", "GistFile", "Language"),
+    "relates_to": ("RELATES_TO", "Repository", "Topic"),
+}
+
+
+class CsvExporter:
+    def __init__(self, folder: str = EXPORT_FOLDER):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.files = []
+        self.writers = {}
+        for name, (_, header) in NODE_FILES.items():
+            self.writers[name] = self.__open(f"nodes_{name}.csv", header)
+        for name, (_, startSpace, endSpace) in RELATIONSHIP_FILES.items():
+            self.writers[name] = self.__open(f"relationships_{name}.csv",
+                                             [f":START_ID({startSpace})", f":END_ID({endSpace})"])
+        # Ids of nodes already written, per node file
+        self.written = {name: set() for name in NODE_FILES}
+
+    def __open(self, fileName: str, header: List[str]):
+        file = open(os.path.join(self.folder, fileName), "w", newline="")
+        self.files.append(file)
+        writer = csv.writer(file)
+        writer.writerow(header)
+        return writer
+
+    def close(self):
+        for file in self.files:
+            file.close()
+        self.files = []
+
+    def __addNode(self, fileName: str, nodeId, row: List) -> bool:
+        if nodeId in self.written[fileName]:
+            return False
+        self.written[fileName].add(nodeId)
+        self.writers[fileName].writerow(row)
+        return True
+
+    def __addRelationship(self, fileName: str, startId, endId):
+        self.writers[fileName].writerow([startId, endId])
+
+    def addUser(self, user: User):
+        self.__addNode("owners", user.id, [user.id, user.id, user.name, user.blog, user.email, user.type])
+
+    def addLanguage(self, language: str):
+        self.__addNode("languages", language, [language])
+
+    def addRepo(self, repo: Repo) -> bool:
+        self.addUser(repo.owner)
+        isNew = self.__addNode("repositories", repo.id, [
+            repo.id, repo.id, repo.name, repo.fullName, repo.description, repo.homepage, repo.defaultBranch
+        ])
+        if not isNew:
+            return False
+        self.__addRelationship("owns", repo.owner.id, repo.id)
+        if repo.language is not None:
+            self.addLanguage(repo.language)
+            self.__addRelationship("repo_is_written_in", repo.id, repo.language)
+        if repo.license is not None:
+            license = repo.license
+            self.__addNode("licenses", license.spdxId, [license.spdxId, license.key, license.name, license.url])
+        for topic in repo.topics:
+            self.__addNode("topics", topic, [topic])
+            self.__addRelationship("relates_to", repo.id, topic)
+        return True
+
+    def addGist(self, user: User, gist: Gist):
+        if not self.__addNode("gists", gist.id, [gist.id, gist.description]):
+            return
+        self.addUser(user)
+        self.__addRelationship("created_gists", user.id, gist.id)
+        for file in gist.files:
+            fileId = f"{gist.id}/{file.name}"
+            self.__addNode("gist_files", fileId, [fileId, file.name, file.type, file.size])
+            self.__addRelationship("contains", gist.id, fileId)
+            self.addLanguage(file.language)
+            self.__addRelationship("gist_file_is_written_in", fileId, file.language)
+
+    def addRepoUser(self, repo: Repo, user: User, relationFile: str):
+        self.addUser(user)
+        self.__addRelationship(relationFile, user.id, repo.id)
+
+    def addIssue(self, repo: Repo, issue: Issue):
+        if not self.__addNode("issues", issue.id, [issue.id, issue.id, issue.title, issue.body]):
+            return
+        self.addUser(issue.user)
+        self.__addRelationship("has_issues", repo.id, issue.id)
+        self.__addRelationship("created_issues", issue.user.id, issue.id)
+
+    def addPullRequest(self, repo: Repo, pullRequest: PullRequest):
+        if not self.__addNode("pull_requests", pullRequest.id, [
+            pullRequest.id, pullRequest.id, pullRequest.title, pullRequest.body
+        ]):
+            return
+        self.addUser(pullRequest.user)
+        self.__addRelationship("has_pull_requests", repo.id, pullRequest.id)
+        self.__addRelationship("created_pull_requests", pullRequest.user.id, pullRequest.id)
+
+    def getImportArguments(self) -> List[str]:
+        # Bodies and descriptions of issues, pull requests and repositories often span many lines
+        arguments = ["--multiline-fields=true", f"--nodes={os.path.join(self.folder, 'nodes_owners.csv')}"]
+        for name, (label, _) in NODE_FILES.items():
+            if label is not None:
+                arguments.append(f"--nodes={label}={os.path.join(self.folder, f'nodes_{name}.csv')}")
+        for name, (relationType, _, _) in RELATIONSHIP_FILES.items():
+            arguments.append(f"--relationships={relationType}={os.path.join(self.folder, f'relationships_{name}.csv')}")
+        return arguments
+
+
+def readUser(userName: str):
+    userData = readCached(f"users__{userName}")
+    if userData is None:
+        return None
+    parsedUserData = json.loads(userData)
+    if "message" in parsedUserData and parsedUserData["message"] == "Not Found":
+        return None
+    return User(parsedUserData)
+
+
+def exportUsers(userNames: List[str], exporter: CsvExporter):
+    users: Dict[str, User] = {}
+    # Fetched users go first, they are the only ones with blog and email,
+    # later mentions of the same user (e.g. as contributor) are deduplicated
+    for userName in userNames:
+        user = readUser(userName)
+        if user is None:
+            print("[CSV]", f"[{userName}]", "skipping user as he does not exist")
+            continue
+        exporter.addUser(user)
+        users[userName] = user
+
+    for userName, user in users.items():
+        print("[CSV]", f"[{userName}]", "exporting")
+        for gist in (Gist(g) for g in iterCachedItems(f"users__{userName}__gists")):
+            exporter.addGist(user, gist)
+        for repo in (Repo(r) for r in iterCachedItems(f"users__{userName}__repos")):
+            if not exporter.addRepo(repo):
+                continue
+            for sub in (internUser(u) for u in iterCachedItems(getRepoCacheName(repo, "subscribers"))):
+                exporter.addRepoUser(repo, sub, "subscribes")
+            for contr in (internUser(u) for u in iterCachedItems(getRepoCacheName(repo, "contributors"))):
+                exporter.addRepoUser(repo, contr, "contributes")
+            for issue in (Issue(i, repo.fullName) for i in iterCachedItems(getRepoCacheName(repo, "issues"))):
+                exporter.addIssue(repo, issue)
+            for pr in (PullRequest(p, repo.fullName) for p in iterCachedItems(getRepoCacheName(repo, "pulls"))):
+                exporter.addPullRequest(repo, pr)
+
+
+if __name__ == '__main__':
+    with open("users_to_fetch.txt") as userNamesList:
+        userNames = [userName.strip() for userName in userNamesList]
+    exporter = CsvExporter()
+    exportUsers(userNames, exporter)
+    exporter.close()
+    print("[CSV]", "import with:")
+    # Syntax of Neo4j 4.x, the version in pom.xml
+    print("neo4j-admin import --database=neo4j", " ".join(exporter.getImportArguments()))
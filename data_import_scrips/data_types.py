@@ -1,7 +1,14 @@
 import datetime
 
+# Users nested in other objects (owners, authors, contributors, subscribers) repeat a lot,
+# with interning one User object is shared by every object that mentions the same id
+INTERN_USERS = True
+INTERNED_USERS_LIMIT = 100000
+
 
 class User:
+    __slots__ = ("type", "name", "blog", "email", "isOriginal", "id")
+
     def __init__(self, asDict, isOriginal=False):
         if "type" in asDict:
             self.type = asDict["type"]
@@ -23,7 +30,24 @@ class User:
         return self.type != "User"
 
 
+internedUsers = {}
+
+
+def internUser(asDict) -> User:
+    if not INTERN_USERS:
+        return User(asDict)
+    user = internedUsers.get(asDict["id"])
+    if user is None:
+        if len(internedUsers) >= INTERNED_USERS_LIMIT:
+            internedUsers.clear()
+        user = User(asDict)
+        internedUsers[user.id] = user
+    return user
+
+
 class GistFile:
+    __slots__ = ("name", "type", "language", "size")
+
     def __init__(self, asDict):
         self.name = asDict["filename"]
         self.type = asDict["type"]
@@ -37,35 +61,44 @@ class GistFile:
 
 
 class Gist:
+    __slots__ = ("id", "description", "files", "owner")
+
     def __init__(self, asDict):
         self.id = asDict["id"]
         self.description = asDict["description"]
         filesMap = asDict["files"]
         self.files = [GistFile(filesMap[fileName]) for fileName in asDict["files"]]
-        self.owner = User(asDict["owner"])
+        self.owner = internUser(asDict["owner"])
 
 
 class Issue:
+    # Only the used fields are copied, keeping the decoded dict would keep every other field of the payload
+    __slots__ = ("title", "id", "user", "body", "createdAt", "repoFullName")
+
     def __init__(self, asDict, repoFullName: str):
         self.title = asDict["title"]
         self.id = asDict["id"]
-        self.user = User(asDict["user"])
+        self.user = internUser(asDict["user"])
         self.body = asDict["body"]
         self.createdAt = asDict["created_at"]
         self.repoFullName = repoFullName
 
 
 class PullRequest:
+    __slots__ = ("title", "id", "user", "body", "createdAt", "repoFullName")
+
     def __init__(self, asDict, repoFullName: str):
         self.title = asDict["title"]
         self.id = asDict["id"]
-        self.user = User(asDict["user"])
+        self.user = internUser(asDict["user"])
         self.body = asDict["body"]
         self.createdAt = asDict["created_at"]
         self.repoFullName = repoFullName
 
 
 class License:
+    __slots__ = ("key", "name", "spdxId", "url")
+
     def __init__(self, asDict):
         self.key = asDict["key"]
         self.name = asDict["name"]
@@ -74,11 +107,14 @@ class License:
 
 
 class Repo:
+    __slots__ = ("id", "name", "fullName", "owner", "language", "homepage", "defaultBranch", "description", "license",
+                 "topics")
+
     def __init__(self, asDict):
         self.id = asDict["id"]
         self.name = asDict["name"]
         self.fullName = asDict["full_name"]
-        self.owner = User(asDict["owner"])
+        self.owner = internUser(asDict["owner"])
         self.language=asDict["language"]
         self.homepage = asDict["homepage"]
         self.defaultBranch = asDict["default_branch"]
@@ -91,6 +127,8 @@ class Repo:
 
 
 class RemainingLimit:
+    __slots__ = ("used", "limit", "remaining", "reset")
+
     def __init__(self, asDict):
         rate = asDict["resources"]["core"]
         self.used = rate["used"]
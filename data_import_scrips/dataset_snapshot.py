@@ -0,0 +1,562 @@
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from data_types import User, Issue, PullRequest, Gist, Repo, License, internUser
+from gh_cache import getCache, getRepoCacheName, isCached, iterCachedItems, readCached
+from metrics import metrics
+
+# Compiled cache, columns of numbers and one table of strings, read with mmap without parsing any json
+SNAPSHOT_FILE = ".cached_results.snapshot"
+SNAPSHOT_MAGIC = b"GHSNAP01"
+# Bumped when columns change, snapshots of older format are compiled again
+SNAPSHOT_FORMAT = 1
+# Columns start at multiples of this, so they can be cast to numbers in place
+SNAPSHOT_ALIGNMENT = 8
+
+# Typecodes of columns: "q" for Github ids, sizes and offsets of ranges, "i" for rows of other tables
+# and strings, -1 is None. "ranges" columns have one more item than their table, items of row i
+# are between ranges[i] and ranges[i + 1]
+SNAPSHOT_COLUMNS = {
+    "strings.data": "B",
+    "strings.offsets": "q",
+    "users.id": "q",
+    "users.type": "i",
+    "users.login": "i",
+    "users.blog": "i",
+    "users.email": "i",
+    "accounts.name": "i",
+    "accounts.user": "i",
+    "accounts.gists": "q",
+    "accounts.repos": "q",
+    "gists.id": "i",
+    "gists.description": "i",
+    "gists.owner": "i",
+    "gists.files": "q",
+    "files.name": "i",
+    "files.type": "i",
+    "files.language": "i",
+    "files.size": "q",
+    "licenses.key": "i",
+    "licenses.name": "i",
+    "licenses.spdxId": "i",
+    "licenses.url": "i",
+    "repos.id": "q",
+    "repos.name": "i",
+    "repos.fullName": "i",
+    "repos.owner": "i",
+    "repos.language": "i",
+    "repos.homepage": "i",
+    "repos.defaultBranch": "i",
+    "repos.description": "i",
+    "repos.license": "i",
+    "repos.topics": "q",
+    "repos.subscribers": "q",
+    "repos.pulls": "q",
+    "repos.issues": "q",
+    "repos.contributors": "q",
+    "topics.name": "i",
+    "subscribers.user": "i",
+    "contributors.user": "i",
+    "pulls.id": "q",
+    "pulls.title": "i",
+    "pulls.user": "i",
+    "pulls.createdAt": "i",
+    "pulls.body": "i",
+    "issues.id": "q",
+    "issues.title": "i",
+    "issues.user": "i",
+    "issues.createdAt": "i",
+    "issues.body": "i",
+}
+
+
+def getCachedAccounts() -> List[str]:
+    # users__{login}, pages and lists of the user have more parts. Logins can not contain "_"
+    return sorted(key[len("users__"):] for key in getCache().keys()
+                  if key.startswith("users__") and key.count("__") == 1)
+
+
+class SnapshotWriter:
+    def __init__(self):
+        self.columns: Dict[str, array] = {name: array(typecode) for name, typecode in SNAPSHOT_COLUMNS.items()}
+        self.stringRows: Dict[str, int] = {}
+        self.userRows: Dict[int, int] = {}
+        self.licenseRows: Dict[tuple, int] = {}
+        self.columns["strings.offsets"].append(0)
+        for ranges in ["accounts.gists", "accounts.repos", "gists.files", "repos.topics", "repos.subscribers",
+                       "repos.pulls", "repos.issues", "repos.contributors"]:
+            self.columns[ranges].append(0)
+
+    def append(self, table: str, **values):
+        for name, value in values.items():
+            self.columns[f"{table}.{name}"].append(value)
+
+    def endRange(self, ranges: str, items: str):
+        self.columns[ranges].append(len(self.columns[items]))
+
+    def addString(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        row = self.stringRows.get(value)
+        if row is None:
+            row = len(self.stringRows)
+            self.stringRows[value] = row
+            # Lone surrogates from json are kept as they are
+            self.columns["strings.data"].frombytes(value.encode("utf-8", "surrogatepass"))
+            self.columns["strings.offsets"].append(len(self.columns["strings.data"]))
+        return row
+
+    def addUser(self, user: User, full: bool = False) -> int:
+        row = self.userRows.get(user.id)
+        if row is None:
+            row = len(self.columns["users.id"])
+            self.userRows[user.id] = row
+            self.append("users", id=user.id, type=self.addString(user.type), login=self.addString(user.name),
+                        blog=-1, email=-1)
+        if full:
+            # Nested users have no blog and email, only the fetched profile has them
+            self.columns["users.blog"][row] = self.addString(user.blog)
+            self.columns["users.email"][row] = self.addString(user.email)
+        return row
+
+    def addLicense(self, license: Optional[License]) -> int:
+        if license is None:
+            return -1
+        key = (license.key, license.name, license.spdxId, license.url)
+        row = self.licenseRows.get(key)
+        if row is None:
+            row = len(self.licenseRows)
+            self.licenseRows[key] = row
+            self.append("licenses", key=self.addString(license.key), name=self.addString(license.name),
+                        spdxId=self.addString(license.spdxId), url=self.addString(license.url))
+        return row
+
+    def addAccount(self, userName: str):
+        userData = readCached(f"users__{userName}")
+        parsedUserData = json.loads(userData) if userData is not None else {}
+        if "login" not in parsedUserData:
+            # Not Found, the importer skips such users
+            self.append("accounts", name=self.addString(userName), user=-1)
+            self.endRange("accounts.gists", "gists.id")
+            self.endRange("accounts.repos", "repos.id")
+            return
+        user = User(parsedUserData)
+        self.append("accounts", name=self.addString(userName), user=self.addUser(user, full=True))
+        for gist in (Gist(g) for g in iterCachedItems(f"users__{userName}__gists")):
+            self.addGist(gist)
+        self.endRange("accounts.gists", "gists.id")
+        if isCached(f"users__{userName}__repos"):
+            for repo in (Repo(r) for r in iterCachedItems(f"users__{userName}__repos")):
+                self.addRepo(repo)
+        self.endRange("accounts.repos", "repos.id")
+
+    def addGist(self, gist: Gist):
+        self.append("gists", id=self.addString(gist.id), description=self.addString(gist.description),
+                    owner=self.addUser(gist.owner))
+        for file in gist.files:
+            self.append("files", name=self.addString(file.name), type=self.addString(file.type),
+                        language=self.addString(file.language), size=file.size)
+        self.endRange("gists.files", "files.name")
+
+    def addRepo(self, repo: Repo):
+        self.append("repos", id=repo.id, name=self.addString(repo.name), fullName=self.addString(repo.fullName),
+                    owner=self.addUser(repo.owner), language=self.addString(repo.language),
+                    homepage=self.addString(repo.homepage), defaultBranch=self.addString(repo.defaultBranch),
+                    description=self.addString(repo.description), license=self.addLicense(repo.license))
+        for topic in repo.topics:
+            self.append("topics", name=self.addString(topic))
+        self.endRange("repos.topics", "topics.name")
+        for endpoint in ["subscribers", "contributors"]:
+            try:
+                for user in (internUser(u) for u in iterCachedItems(getRepoCacheName(repo, endpoint))):
+                    self.append(endpoint, user=self.addUser(user))
+            except Exception as e:
+                # Same as the importer, broken list of one repository does not stop the rest
+                print("[SNAPSHOT]", f"[{repo.fullName}]", f"failed to load {endpoint}:", e, file=sys.stderr)
+            self.endRange(f"repos.{endpoint}", f"{endpoint}.user")
+        for endpoint, itemType in [("pulls", PullRequest), ("issues", Issue)]:
+            for item in (itemType(i, repo.fullName) for i in iterCachedItems(getRepoCacheName(repo, endpoint))):
+                self.append(endpoint, id=item.id, title=self.addString(item.title), user=self.addUser(item.user),
+                            createdAt=self.addString(item.createdAt), body=self.addString(item.body))
+            self.endRange(f"repos.{endpoint}", f"{endpoint}.id")
+
+    def write(self, path: str, cacheVersion: str):
+        columns = {}
+        offset = 0
+        for name, column in self.columns.items():
+            columns[name] = [offset, len(column)]
+            size = len(column) * column.itemsize
+            offset += size + (-size % SNAPSHOT_ALIGNMENT)
+        header = json.dumps({
+            "format": SNAPSHOT_FORMAT,
+            "cacheVersion": cacheVersion,
+            "byteorder": sys.byteorder,
+            "columns": columns,
+        }).encode()
+        header += b" " * (-(len(SNAPSHOT_MAGIC) + 8 + len(header)) % SNAPSHOT_ALIGNMENT)
+        # Written next to the old one and swapped, readers never see half of a file
+        temporaryPath = f"{path}.tmp"
+        with open(temporaryPath, "wb") as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(len(header).to_bytes(8, "little"))
+            file.write(header)
+            for column in self.columns.values():
+                column.tofile(file)
+                file.write(b"\0" * (-len(column) * column.itemsize % SNAPSHOT_ALIGNMENT))
+        os.replace(temporaryPath, path)
+
+
+def compileSnapshot(path: str = SNAPSHOT_FILE, accounts: List[str] = None) -> str:
+    # Version is read first, anything written to the cache during compilation makes the snapshot stale
+    cacheVersion = getCache().getVersion()
+    if accounts is None:
+        accounts = getCachedAccounts()
+    start = time.perf_counter()
+    writer = SnapshotWriter()
+    for userName in accounts:
+        writer.addAccount(userName)
+    writer.write(path, cacheVersion)
+    metrics.observe("snapshot_compile_seconds", time.perf_counter() - start)
+    print("[SNAPSHOT]", len(accounts), "users,", len(writer.columns["repos.id"]), "repos,",
+          len(writer.userRows), "distinct users compiled in", f"{time.perf_counter() - start:.2f}s,",
+          os.path.getsize(path) // 1024, "KiB")
+    return path
+
+
+def readSnapshotHeader(file) -> Optional[dict]:
+    if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        return None
+    headerLength = int.from_bytes(file.read(8), "little")
+    return json.loads(file.read(headerLength))
+
+
+def isSnapshotFresh(path: str = SNAPSHOT_FILE) -> bool:
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as file:
+        header = readSnapshotHeader(file)
+    return (header is not None and header["format"] == SNAPSHOT_FORMAT and header["byteorder"] == sys.byteorder
+            and header["cacheVersion"] == getCache().getVersion())
+
+
+class DatasetSnapshot:
+    """
+    Compiled cache mapped into memory. Columns are memoryviews over the mapping, entities
+    below read them only when their attributes are accessed.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_FILE):
+        self.path = path
+        with open(path, "rb") as file:
+            header = readSnapshotHeader(file)
+            if header is None:
+                raise Exception(f"{path} is not a snapshot")
+            dataStart = file.tell()
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.cacheVersion = header["cacheVersion"]
+        view = memoryview(self.mapping)
+        self.columns: Dict[str, memoryview] = {}
+        for name, (offset, count) in header["columns"].items():
+            typecode = SNAPSHOT_COLUMNS[name]
+            start = dataStart + offset
+            self.columns[name] = view[start:start + count * array(typecode).itemsize].cast(typecode)
+        view.release()
+        self.strings = self.columns["strings.data"]
+        self.stringOffsets = self.columns["strings.offsets"]
+        accountNames = self.columns["accounts.name"]
+        self.accounts = {self.getString(accountNames[row]): row for row in range(len(accountNames))}
+
+    def getString(self, row: int) -> Optional[str]:
+        if row < 0:
+            return None
+        return str(self.strings[self.stringOffsets[row]:self.stringOffsets[row + 1]], "utf-8", "surrogatepass")
+
+    def getRange(self, ranges: str, row: int) -> range:
+        column = self.columns[ranges]
+        return range(column[row], column[row + 1])
+
+    def getUser(self, row: int) -> Optional["SnapshotUser"]:
+        if row < 0:
+            return None
+        return SnapshotUser(self, row)
+
+    def findAccount(self, userName: str) -> Optional["SnapshotAccount"]:
+        row = self.accounts.get(userName)
+        if row is None:
+            return None
+        return SnapshotAccount(self, row)
+
+    def close(self):
+        # Mapping can be closed only after every view of it is released
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+        self.mapping.close()
+
+
+class SnapshotUser:
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot: DatasetSnapshot, row: int):
+        self.snapshot = snapshot
+        self.row = row
+
+    @property
+    def id(self) -> int:
+        return self.snapshot.columns["users.id"][self.row]
+
+    @property
+    def type(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["users.type"][self.row])
+
+    @property
+    def name(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["users.login"][self.row])
+
+    @property
+    def blog(self) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns["users.blog"][self.row])
+
+    @property
+    def email(self) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns["users.email"][self.row])
+
+    def isOrg(self):
+        return self.type != "User"
+
+
+class SnapshotAccount:
+    # User from users_to_fetch.txt with everything fetched for him
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot: DatasetSnapshot, row: int):
+        self.snapshot = snapshot
+        self.row = row
+
+    @property
+    def user(self) -> Optional[SnapshotUser]:
+        return self.snapshot.getUser(self.snapshot.columns["accounts.user"][self.row])
+
+    @property
+    def gists(self) -> Iterator["SnapshotGist"]:
+        return (SnapshotGist(self.snapshot, row) for row in self.snapshot.getRange("accounts.gists", self.row))
+
+    @property
+    def repos(self) -> Iterator["SnapshotRepo"]:
+        return (SnapshotRepo(self.snapshot, row) for row in self.snapshot.getRange("accounts.repos", self.row))
+
+
+class SnapshotGistFile:
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot: DatasetSnapshot, row: int):
+        self.snapshot = snapshot
+        self.row = row
+
+    @property
+    def name(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["files.name"][self.row])
+
+    @property
+    def type(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["files.type"][self.row])
+
+    @property
+    def language(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["files.language"][self.row])
+
+    @property
+    def size(self) -> int:
+        return self.snapshot.columns["files.size"][self.row]
+
+
+class SnapshotGist:
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot: DatasetSnapshot, row: int):
+        self.snapshot = snapshot
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["gists.id"][self.row])
+
+    @property
+    def description(self) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns["gists.description"][self.row])
+
+    @property
+    def owner(self) -> SnapshotUser:
+        return self.snapshot.getUser(self.snapshot.columns["gists.owner"][self.row])
+
+    @property
+    def files(self) -> List[SnapshotGistFile]:
+        return [SnapshotGistFile(self.snapshot, row) for row in self.snapshot.getRange("gists.files", self.row)]
+
+
+class SnapshotLicense:
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot: DatasetSnapshot, row: int):
+        self.snapshot = snapshot
+        self.row = row
+
+    @property
+    def key(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["licenses.key"][self.row])
+
+    @property
+    def name(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns["licenses.name"][self.row])
+
+    @property
+    def spdxId(self) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns["licenses.spdxId"][self.row])
+
+    @property
+    def url(self) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns["licenses.url"][self.row])
+
+
+class SnapshotItem:
+    # Issue or pull request, table is "issues" or "pulls"
+    __slots__ = ("snapshot", "table", "row", "repoFullName")
+
+    def __init__(self, snapshot: DatasetSnapshot, table: str, row: int, repoFullName: str):
+        self.snapshot = snapshot
+        self.table = table
+        self.row = row
+        self.repoFullName = repoFullName
+
+    @property
+    def id(self) -> int:
+        return self.snapshot.columns[f"{self.table}.id"][self.row]
+
+    @property
+    def title(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns[f"{self.table}.title"][self.row])
+
+    @property
+    def user(self) -> SnapshotUser:
+        return self.snapshot.getUser(self.snapshot.columns[f"{self.table}.user"][self.row])
+
+    @property
+    def createdAt(self) -> str:
+        return self.snapshot.getString(self.snapshot.columns[f"{self.table}.createdAt"][self.row])
+
+    @property
+    def body(self) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns[f"{self.table}.body"][self.row])
+
+
+class SnapshotRepo:
+    __slots__ = ("snapshot", "row")
+
+    def __init__(self, snapshot: DatasetSnapshot, row: int):
+        self.snapshot = snapshot
+        self.row = row
+
+    def getString(self, column: str) -> Optional[str]:
+        return self.snapshot.getString(self.snapshot.columns[column][self.row])
+
+    @property
+    def id(self) -> int:
+        return self.snapshot.columns["repos.id"][self.row]
+
+    @property
+    def name(self) -> str:
+        return self.getString("repos.name")
+
+    @property
+    def fullName(self) -> str:
+        return self.getString("repos.fullName")
+
+    @property
+    def owner(self) -> SnapshotUser:
+        return self.snapshot.getUser(self.snapshot.columns["repos.owner"][self.row])
+
+    @property
+    def language(self) -> Optional[str]:
+        return self.getString("repos.language")
+
+    @property
+    def homepage(self) -> Optional[str]:
+        return self.getString("repos.homepage")
+
+    @property
+    def defaultBranch(self) -> str:
+        return self.getString("repos.defaultBranch")
+
+    @property
+    def description(self) -> Optional[str]:
+        return self.getString("repos.description")
+
+    @property
+    def license(self) -> Optional[SnapshotLicense]:
+        row = self.snapshot.columns["repos.license"][self.row]
+        if row < 0:
+            return None
+        return SnapshotLicense(self.snapshot, row)
+
+    @property
+    def topics(self) -> List[str]:
+        names = self.snapshot.columns["topics.name"]
+        return [self.snapshot.getString(names[row]) for row in self.snapshot.getRange("repos.topics", self.row)]
+
+    def getUsers(self, endpoint: str) -> Iterator[SnapshotUser]:
+        users = self.snapshot.columns[f"{endpoint}.user"]
+        return (self.snapshot.getUser(users[row]) for row in self.snapshot.getRange(f"repos.{endpoint}", self.row))
+
+    def getItems(self, endpoint: str) -> Iterator[SnapshotItem]:
+        fullName = self.fullName
+        return (SnapshotItem(self.snapshot, endpoint, row, fullName)
+                for row in self.snapshot.getRange(f"repos.{endpoint}", self.row))
+
+    @property
+    def subscribers(self) -> Iterator[SnapshotUser]:
+        return self.getUsers("subscribers")
+
+    @property
+    def contributors(self) -> Iterator[SnapshotUser]:
+        return self.getUsers("contributors")
+
+    @property
+    def pullRequests(self) -> Iterator[SnapshotItem]:
+        return self.getItems("pulls")
+
+    @property
+    def issues(self) -> Iterator[SnapshotItem]:
+        return self.getItems("issues")
+
+
+def openSnapshot(path: str = SNAPSHOT_FILE) -> DatasetSnapshot:
+    if not isSnapshotFresh(path):
+        print("[SNAPSHOT]", f"{path} is missing or older than the cache, compiling it")
+        compileSnapshot(path)
+    start = time.perf_counter()
+    snapshot = DatasetSnapshot(path)
+    metrics.observe("snapshot_open_seconds", time.perf_counter() - start)
+    return snapshot
+
+
+snapshot = None
+snapshotLock = threading.Lock()
+
+
+def getSnapshot() -> DatasetSnapshot:
+    global snapshot
+    with snapshotLock:
+        if snapshot is None:
+            snapshot = openSnapshot()
+        return snapshot
+
+
+if __name__ == '__main__':
+    compileSnapshot()
+    metrics.writeReport()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import sqlite3
+from typing import Callable, Dict, List, Tuple
+
+from data_types import User, Issue, PullRequest, Gist, Repo, internUser
+from gh_cache import getRepoCacheName, iterCachedItems, readCached
+from neo4j_importer import Neo4JConnection, BatchedNeo4JConnection, IMPORT_BATCH_SIZE
+
+# Fingerprints of every entity written by the last import, per user
+MANIFEST_FILE = ".import_manifest.sqlite"
+
+# Entity is identified by (kind, key), e.g. ("issue", "1234") or ("contributor", "<repo id>/<user id>")
+EntityKey = Tuple[str, str]
+
+
+def fingerprint(*values) -> str:
+    # Only fields that end up in the graph are hashed, so changes Github makes
+    # to other fields (counters, timestamps) do not cause writes
+    data = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fingerprintUser(user: User) -> str:
+    return fingerprint(user.id, user.type, user.name, user.blog, user.email)
+
+
+def fingerprintRepo(repo: Repo) -> str:
+    license = None
+    if repo.license is not None:
+        license = [repo.license.spdxId, repo.license.key, repo.license.name, repo.license.url]
+    return fingerprint(repo.id, repo.name, repo.fullName, repo.description, repo.homepage, repo.defaultBranch,
+                       repo.language, license, sorted(repo.topics), repo.owner.id, repo.owner.type)
+
+
+def fingerprintRepoItem(item) -> str:
+    return fingerprint(item.id, item.title, item.body, item.user.id, item.user.type)
+
+
+def fingerprintGist(gist: Gist) -> str:
+    files = sorted([f.name, f.type, f.language, f.size] for f in gist.files)
+    return fingerprint(gist.id, gist.description, files, gist.owner.id)
+
+
+class ImportManifest:
+    def __init__(self, path: str = MANIFEST_FILE):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS entities (
+                userName TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (userName, kind, key)
+            )
+        """)
+        self.connection.commit()
+        # Entities of users whose rows are buffered, written once the rows are committed
+        self.staged: Dict[str, Dict[EntityKey, str]] = {}
+
+    def load(self, userName: str) -> Dict[EntityKey, str]:
+        rows = self.connection.execute("SELECT kind, key, hash FROM entities WHERE userName = ?", (userName,))
+        return {(kind, key): entityHash for kind, key, entityHash in rows}
+
+    def replace(self, userName: str, entities: Dict[EntityKey, str]):
+        with self.connection:
+            self.connection.execute("DELETE FROM entities WHERE userName = ?", (userName,))
+            self.connection.executemany(
+                "INSERT INTO entities (userName, kind, key, hash) VALUES (?, ?, ?, ?)",
+                [(userName, kind, key, entityHash) for (kind, key), entityHash in entities.items()]
+            )
+
+    def stage(self, userName: str, entities: Dict[EntityKey, str]):
+        self.staged[userName] = entities
+
+    def markImported(self, userNames: List[str]):
+        # Called by the connection as its journal, once every row of the users is committed
+        for userName in userNames:
+            self.replace(userName, self.staged.pop(userName))
+
+    def close(self):
+        self.connection.close()
+
+
+class UserSnapshot:
+    # Entities of one user found in the cache, with a function writing each of them.
+    # Insertion order is kept so repos are upserted before their issues and links.
+    def __init__(self):
+        self.hashes: Dict[EntityKey, str] = {}
+        self.upserts: Dict[EntityKey, Callable[[Neo4JConnection], None]] = {}
+        # Removes what the upsert only adds to (files of a gist, language and topics of a repo),
+        # needed only for entities written by an earlier import
+        self.clears: Dict[EntityKey, Callable[[Neo4JConnection], None]] = {}
+
+    def add(self, key: EntityKey, entityHash: str, upsert: Callable[[Neo4JConnection], None],
+            clear: Callable[[Neo4JConnection], None] = None):
+        self.hashes[key] = entityHash
+        self.upserts[key] = upsert
+        if clear is not None:
+            self.clears[key] = clear
+
+
+def readUserSnapshot(user: User) -> UserSnapshot:
+    snapshot = UserSnapshot()
+    snapshot.add(("user", str(user.id)), fingerprintUser(user), lambda conn: conn.createUserOrOrg(user))
+
+    for gist in (Gist(g) for g in iterCachedItems(f"users__{user.name}__gists")):
+        snapshot.add(("gist", gist.id), fingerprintGist(gist),
+                     lambda conn, gist=gist: conn.createGist(user, gist),
+                     lambda conn, gist=gist: conn.clearGistFiles(gist.id))
+
+    for repo in (Repo(r) for r in iterCachedItems(f"users__{user.name}__repos")):
+        snapshot.add(("repo", str(repo.id)), fingerprintRepo(repo),
+                     lambda conn, repo=repo: conn.createRepo(repo),
+                     lambda conn, repo=repo: conn.clearRepoLinks(repo.id))
+
+        for issue in (Issue(i, repo.fullName) for i in iterCachedItems(getRepoCacheName(repo, "issues"))):
+            snapshot.add(("issue", str(issue.id)), fingerprintRepoItem(issue),
+                         lambda conn, repo=repo, issue=issue: conn.createIssue(repo, issue))
+        for pr in (PullRequest(p, repo.fullName) for p in iterCachedItems(getRepoCacheName(repo, "pulls"))):
+            snapshot.add(("pull", str(pr.id)), fingerprintRepoItem(pr),
+                         lambda conn, repo=repo, pr=pr: conn.createPullRequest(repo, pr))
+        for contr in (internUser(c) for c in iterCachedItems(getRepoCacheName(repo, "contributors"))):
+            snapshot.add(("contributor", f"{repo.id}/{contr.id}"), fingerprintUser(contr),
+                         lambda conn, repo=repo, contr=contr: conn.createContributorLink(repo, contr))
+        for sub in (internUser(s) for s in iterCachedItems(getRepoCacheName(repo, "subscribers"))):
+            snapshot.add(("subscriber", f"{repo.id}/{sub.id}"), fingerprintUser(sub),
+                         lambda conn, repo=repo, sub=sub: conn.createSubscriberLink(repo, sub))
+    return snapshot
+
+
+def deleteEntity(conn: Neo4JConnection, kind: str, key: str):
+    if kind == "repo":
+        conn.deleteRepo(int(key))
+    elif kind == "issue":
+        conn.deleteIssue(int(key))
+    elif kind == "pull":
+        conn.deletePullRequest(int(key))
+    elif kind == "gist":
+        conn.deleteGist(key)
+    elif kind == "contributor":
+        repoId, userId = key.split("/")
+        conn.deleteContributorLink(int(repoId), int(userId))
+    elif kind == "subscriber":
+        repoId, userId = key.split("/")
+        conn.deleteSubscriberLink(int(repoId), int(userId))
+    # Users are shared with other subgraphs, they are never deleted
+
+
+def importUserDelta(userName: str, conn: Neo4JConnection, manifest: ImportManifest):
+    # Manifest has to be the journal of the connection
+    userData = readCached(f"users__{userName}")
+    if userData is None:
+        print("[DELTA]", f"[{userName}]", "user is not in cache, skipping")
+        return
+    parsedUserData = json.loads(userData)
+    if "message" in parsedUserData and parsedUserData["message"] == "Not Found":
+        print("[DELTA]", f"[{userName}]", "skipping user as he does not exist")
+        return
+    snapshot = readUserSnapshot(User(parsedUserData))
+    previous = manifest.load(userName)
+
+    deletes: List[EntityKey] = [key for key in previous if key not in snapshot.hashes]
+    upserts: List[EntityKey] = [key for key, entityHash in snapshot.hashes.items() if previous.get(key) != entityHash]
+    for kind, key in deletes:
+        deleteEntity(conn, kind, key)
+    for key in upserts:
+        if key in previous and key in snapshot.clears:
+            snapshot.clears[key](conn)
+        snapshot.upserts[key](conn)
+    # Manifest may only describe what is committed, it is written when the connection journals the user.
+    # Connection with wholeUsers commits deletes, clears and upserts of the user in one transaction;
+    # if it fails the manifest stays as it was and the next run writes the same changes again
+    manifest.stage(userName, snapshot.hashes)
+    conn.finishUser(userName)
+    print("[DELTA]", f"[{userName}]", len(upserts), "upserts,", len(deletes), "deletes,",
+          len(snapshot.hashes) - len(upserts), "unchanged")
+
+
+if __name__ == '__main__':
+    manifest = ImportManifest()
+    conn = BatchedNeo4JConnection(batchSize=IMPORT_BATCH_SIZE, journal=manifest, wholeUsers=True)
+    conn.createSchema()
+    with open("users_to_fetch.txt") as userNamesList:
+        for userName in userNamesList:
+            importUserDelta(userName.strip(), conn, manifest)
+    conn.close()
+    manifest.close()
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from synthetic_data import SyntheticGithub, SYNTHETIC_SEED
+
+# Local stand-in for api.github.com serving synthetic data, start it and run the fetcher with
+# GITHUB_API_URL=http://localhost:8000
+FAKE_HOST = "localhost"
+FAKE_PORT = 8000
+# Requests allowed per window, for every token (Authorization header) separately and for anonymous requests.
+# The window is much shorter than Github's hour so waiting for reset can be tested
+FAKE_RATE_LIMIT = 5000
+FAKE_RATE_LIMIT_WINDOW = 60
+# Fraction of requests answered with 403 secondary rate limit or 429, both with Retry-After
+FAKE_SECONDARY_LIMIT_RATE = 0.0
+FAKE_TOO_MANY_REQUESTS_RATE = 0.0
+FAKE_RETRY_AFTER = 1
+# Fraction of requests failing with 502 Bad Gateway
+FAKE_SERVER_ERROR_RATE = 0.0
+# Added to every response, mean and random part in seconds
+FAKE_LATENCY = 0.05
+FAKE_LATENCY_JITTER = 0.05
+# Github default page size when per_page is not given, and the maximum it allows
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+
+
+class RateLimitWindow:
+    def __init__(self, limit: int, windowSeconds: int):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.windowSeconds = windowSeconds
+        self.reset = int(time.time()) + windowSeconds
+        self.used = 0
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            self.__rollWindow()
+            return {"limit": self.limit, "used": self.used, "remaining": self.limit - self.used, "reset": self.reset}
+
+    def take(self) -> bool:
+        with self.lock:
+            self.__rollWindow()
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+    def __rollWindow(self):
+        if time.time() >= self.reset:
+            self.reset = int(time.time()) + self.windowSeconds
+            self.used = 0
+
+
+class FakeGithub:
+    # Generated data with responses memoized per user, so repeated requests return the same body and ETag
+    def __init__(self, seed: int = SYNTHETIC_SEED):
+        self.lock = threading.Lock()
+        self.synthetic = SyntheticGithub(seed)
+        self.users: Dict[str, Dict] = {}
+        self.limits: Dict[Optional[str], RateLimitWindow] = {}
+        self.random = random.Random(seed)
+
+    def getUserData(self, login: str) -> Dict:
+        with self.lock:
+            data = self.users.get(login)
+            if data is None:
+                data = self.synthetic.userData(login)
+                self.users[login] = data
+            return data
+
+    def getLimits(self, authorization: Optional[str]) -> RateLimitWindow:
+        with self.lock:
+            limits = self.limits.get(authorization)
+            if limits is None:
+                limits = RateLimitWindow(FAKE_RATE_LIMIT, FAKE_RATE_LIMIT_WINDOW)
+                self.limits[authorization] = limits
+            return limits
+
+    def find(self, path: str):
+        # Path of the api (users/<login>/repos) maps to the cache name of the same response
+        parts = [part for part in path.split("/") if part != ""]
+        if len(parts) < 2 or parts[0] not in ["users", "repos"]:
+            return None
+        owner = parts[1]
+        data = self.getUserData(owner)
+        return data.get("__".join(parts))
+
+    def shouldFail(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, with Nagle every keep-alive response waits for delayed ACK
+    disable_nagle_algorithm = True
+    github: FakeGithub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if FAKE_LATENCY > 0 or FAKE_LATENCY_JITTER > 0:
+            time.sleep(FAKE_LATENCY + random.uniform(0, FAKE_LATENCY_JITTER))
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.rstrip("/") == "/rate_limit":
+            # Asking for the limit does not count against it
+            limits = self.github.getLimits(self.headers.get("Authorization")).snapshot()
+            self.sendJson(200, {"resources": {"core": limits}, "rate": limits})
+            return
+
+        if self.github.shouldFail(FAKE_SECONDARY_LIMIT_RATE):
+            self.sendJson(403, {"message": "You have exceeded a secondary rate limit. Please wait a few minutes before "
+                                           "you try again."}, {"Retry-After": str(FAKE_RETRY_AFTER)})
+            return
+        if self.github.shouldFail(FAKE_TOO_MANY_REQUESTS_RATE):
+            self.sendJson(429, {"message": "Too many requests"}, {"Retry-After": str(FAKE_RETRY_AFTER)})
+            return
+        if self.github.shouldFail(FAKE_SERVER_ERROR_RATE):
+            self.sendJson(502, {"message": "Server Error"})
+            return
+
+        data = self.github.find(url.path)
+        if data is None:
+            self.sendJson(404, {"message": "Not Found"})
+            return
+
+        headers = {}
+        if isinstance(data, list):
+            perPage = min(int(query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+            page = max(int(query.get("page", ["1"])[0]), 1)
+            pagesCount = max((len(data) + perPage - 1) // perPage, 1)
+            if page < pagesCount:
+                base = f"http://{self.headers['Host']}{url.path}?per_page={perPage}"
+                headers["Link"] = f'<{base}&page={page + 1}>; rel="next", <{base}&page={pagesCount}>; rel="last"'
+            data = data[(page - 1) * perPage:page * perPage]
+            if len(data) == 0 and url.path.endswith("/contributors"):
+                # Github answers contributors of an empty repository with 204 and empty body
+                self.sendBody(204, b"", headers)
+                return
+
+        body = json.dumps(data).encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        headers["ETag"] = etag
+        if self.headers.get("If-None-Match") == etag:
+            # Conditional requests answered with 304 are free, like on Github
+            self.sendBody(304, b"", headers)
+            return
+        self.sendBody(200, body, headers)
+
+    def sendJson(self, status: int, data, headers: Optional[Dict] = None):
+        self.sendBody(status, json.dumps(data).encode("utf-8"), headers or {})
+
+    def sendBody(self, status: int, body: bytes, headers: Dict):
+        limits = self.github.getLimits(self.headers.get("Authorization"))
+        counted = status not in [304, 403, 429, 502] and not self.path.startswith("/rate_limit")
+        if counted and not limits.take():
+            status = 403
+            body = json.dumps({"message": "API rate limit exceeded for 127.0.0.1."}).encode("utf-8")
+            headers = {}
+        snapshot = limits.snapshot()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", str(snapshot["limit"]))
+        self.send_header("X-RateLimit-Remaining", str(snapshot["remaining"]))
+        self.send_header("X-RateLimit-Used", str(snapshot["used"]))
+        self.send_header("X-RateLimit-Reset", str(snapshot["reset"]))
+        self.send_header("X-RateLimit-Resource", "core")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def startFakeGithub(host: str = FAKE_HOST, port: int = FAKE_PORT, github: FakeGithub = None) -> ThreadingHTTPServer:
+    # Serves from a daemon thread, port 0 picks a free one (server.server_port)
+    handler = type("Handler", (FakeGithubHandler,), {"github": github or FakeGithub()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    server = startFakeGithub()
+    print("[FAKE]", f"serving synthetic Github on http://{FAKE_HOST}:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,138 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Iterator, List
+
+from data_types import Repo
+from gh_cache import PER_PAGE
+from gh_data_fetcher import Github, FETCH_CONCURRENCY, FILE_WITH_USERS_TO_FETCH, logError
+from metrics import logVerbose, metrics
+from neo4j_importer import BatchedNeo4JConnection, ImportJournal, IMPORT_BATCH_SIZE
+
+# Pages waiting for the writer, fetchers block when it is full so a slow database
+# slows the fetch down instead of filling the memory
+PIPELINE_QUEUE_SIZE = 200
+# Fetched responses are also saved to cache, so the run can be imported again without fetching.
+# Without it pipeline is faster but only the database keeps the data
+PIPELINE_WRITE_CACHE = True
+
+
+class FetchImportPipeline:
+    """
+    Fetches users with many threads and writes what they fetch with one BatchedNeo4JConnection,
+    network and database work overlap instead of running one after another. Queue holds
+    (connection method, leading arguments, items) - method is called once for every item.
+    """
+
+    def __init__(self, github: Github, conn: BatchedNeo4JConnection, queueSize: int = PIPELINE_QUEUE_SIZE):
+        self.github = github
+        self.conn = conn
+        self.queue = Queue(maxsize=queueSize)
+        self.writerError = None
+
+    def put(self, method: str, args: tuple, items: list):
+        start = time.perf_counter()
+        self.queue.put((method, args, items))
+        metrics.observe("pipeline_put_wait_seconds", time.perf_counter() - start)
+
+    def putAll(self, method: str, args: tuple, items: Iterator):
+        # Items are passed in pages, one queue operation per page instead of per item
+        page = []
+        for item in items:
+            page.append(item)
+            if len(page) >= PER_PAGE:
+                self.put(method, args, page)
+                page = []
+        if len(page) > 0:
+            self.put(method, args, page)
+
+    def fetchUser(self, userName: str):
+        logVerbose("[PIPELINE]", "fetching", userName, "data")
+        try:
+            user = self.github.fetchUser(userName)
+        except Exception as e:
+            logError(f"__user__{userName}", e)
+            return
+        self.put("createUserOrOrg", (), [user])
+        complete = True
+        try:
+            self.putAll("createGist", (user,), self.github.fetchGists(user))
+        except Exception as e:
+            logError(f"{user.name}/gists", e)
+            complete = False
+        try:
+            for repo in self.github.fetchRepositories(user):
+                self.put("createRepo", (), [repo])
+                complete = self.fetchRepo(repo) and complete
+        except Exception as e:
+            logError(f"{user.name}/repos", e)
+            complete = False
+        if not complete:
+            # Not journaled, next run fetches the user again instead of keeping partial data
+            print("[PIPELINE]", f"[{userName}]", "some data failed to fetch, user will be retried", file=sys.stderr)
+            return
+        self.put("finishUser", (), [userName])
+
+    def fetchRepo(self, repo: Repo) -> bool:
+        lists = [
+            ("createIssue", self.github.fetchIssues, "issues"),
+            ("createPullRequest", self.github.fetchPullRequests, "pullrequests"),
+            ("createContributorLink", self.github.fetchContibutors, "contributuons"),
+            ("createSubscriberLink", self.github.fetchSubscriptions, "subscriptions"),
+        ]
+        complete = True
+        for method, fetch, title in lists:
+            try:
+                self.putAll(method, (repo,), fetch(repo))
+            except Exception as e:
+                logError(f"{repo.fullName}/{title}", e)
+                complete = False
+        return complete
+
+    def write(self):
+        while True:
+            start = time.perf_counter()
+            entry = self.queue.get()
+            metrics.observe("pipeline_get_wait_seconds", time.perf_counter() - start)
+            if entry is None:
+                return
+            if self.writerError is not None:
+                # Keeps draining, fetchers blocked on a full queue would never finish otherwise
+                continue
+            method, args, items = entry
+            try:
+                write = getattr(self.conn, method)
+                for item in items:
+                    write(*args, item)
+            except Exception as e:
+                self.writerError = e
+                print("[PIPELINE]", "writing failed, fetching continues without import:", e, file=sys.stderr)
+
+    def run(self, userNames: List[str], concurrency: int = FETCH_CONCURRENCY):
+        writer = threading.Thread(target=self.write)
+        writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(self.fetchUser, userNames))
+        finally:
+            self.queue.put(None)
+            writer.join()
+        self.conn.flush()
+        if self.writerError is not None:
+            raise self.writerError
+
+
+if __name__ == '__main__':
+    journal = ImportJournal()
+    with open(FILE_WITH_USERS_TO_FETCH) as usersList:
+        userNames = [userName.strip() for userName in usersList if userName.strip() != ""]
+    pendingUserNames = [userName for userName in userNames if not journal.isImported(userName)]
+    print("[JOURNAL]", len(userNames) - len(pendingUserNames), "users already imported, skipping them")
+    github = Github(writeCache=PIPELINE_WRITE_CACHE)
+    conn = BatchedNeo4JConnection(batchSize=IMPORT_BATCH_SIZE, journal=journal)
+    conn.createSchema()
+    FetchImportPipeline(github, conn).run(pendingUserNames)
+    conn.close()
+    metrics.writeReport()
@@ -0,0 +1,235 @@
+import datetime
+import math
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from gh_cache import PER_PAGE, hasNextPage, isCached
+from gh_data_fetcher import Github, FETCH_CONCURRENCY, FILE_WITH_USERS_TO_FETCH, logError
+from metrics import metrics
+
+FRONTIER_FILE = ".fetch_frontier.sqlite"
+# Lower number is fetched first, metadata that discovers more work goes before leaf lists
+PRIORITIES = {
+    "user": 0,
+    "repos": 1,
+    "gists": 2,
+    "issues": 3,
+    "pulls": 3,
+    "contributors": 4,
+    "subscribers": 5,
+}
+# Seconds between progress reports
+REPORT_INTERVAL = 30
+# Runs of a task that failed (after the retries of the fetcher) before it is left failed until the next start
+FRONTIER_MAX_ATTEMPTS = 3
+
+
+class FetchTask:
+    __slots__ = ("url", "baseUrl", "page", "kind")
+
+    def __init__(self, url: str, baseUrl: str, page: int, kind: str):
+        self.url = url
+        self.baseUrl = baseUrl
+        self.page = page
+        self.kind = kind
+
+
+class FetchFrontier:
+    # Pending urls persisted in sqlite, so an interrupted crawl continues where it stopped
+    def __init__(self, path: str = FRONTIER_FILE):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                baseUrl TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                cached INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(frontier)")]
+        if "attempts" not in columns:
+            # Frontier from before failed tasks were retried
+            self.connection.execute("ALTER TABLE frontier ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute("DROP INDEX IF EXISTS frontier_next")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_pending ON frontier (state, cached, attempts, priority, seq)")
+        # Tasks that were running when previous run stopped are started again, failed ones get new attempts
+        self.connection.execute("UPDATE frontier SET state = 'pending' WHERE state = 'running'")
+        self.connection.execute("UPDATE frontier SET state = 'pending', attempts = 0 WHERE state = 'failed'")
+        self.connection.commit()
+
+    def add(self, tasks: List[FetchTask], github: Github):
+        # Already cached pages cost nothing, they are taken first because they discover more work.
+        # Checked again when the task is claimed, the cache can change in the meantime
+        rows = [
+            (task.url, task.baseUrl, task.page, task.kind, PRIORITIES[task.kind],
+             1 if isCached(github.getCacheName(task.baseUrl), task.page) else 0)
+            for task in tasks
+        ]
+        with self.lock:
+            self.connection.executemany("""
+                INSERT OR IGNORE INTO frontier (url, baseUrl, page, kind, priority, cached)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            self.connection.commit()
+
+    def claim(self, onlyCached: bool, github: Github) -> Optional[FetchTask]:
+        query = "SELECT seq, url, baseUrl, page, kind, cached FROM frontier WHERE state = 'pending'"
+        if onlyCached:
+            query += " AND cached = 1"
+        # Retried tasks go after the ones not tried yet
+        query += " ORDER BY cached DESC, attempts, priority, seq LIMIT 1"
+        with self.lock:
+            while True:
+                row = self.connection.execute(query).fetchone()
+                if row is None:
+                    return None
+                cached = 1 if isCached(github.getCacheName(row[2]), row[3]) else 0
+                if cached == row[5]:
+                    break
+                # Cached or removed from cache since it was added, e.g. by another fetcher
+                self.connection.execute("UPDATE frontier SET cached = ? WHERE seq = ?", (cached, row[0]))
+            self.connection.execute("UPDATE frontier SET state = 'running' WHERE seq = ?", (row[0],))
+            self.connection.commit()
+        return FetchTask(row[1], row[2], row[3], row[4])
+
+    def finish(self, task: FetchTask):
+        with self.lock:
+            self.connection.execute("UPDATE frontier SET state = 'done' WHERE url = ?", (task.url,))
+            self.connection.commit()
+
+    def fail(self, task: FetchTask, maxAttempts: int = FRONTIER_MAX_ATTEMPTS):
+        # Queued again until it runs out of attempts, then it waits for the next start
+        with self.lock:
+            self.connection.execute("""
+                UPDATE frontier SET attempts = attempts + 1,
+                    state = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+                WHERE url = ?
+            """, (maxAttempts, task.url))
+            self.connection.commit()
+
+    def countPending(self):
+        with self.lock:
+            rows = self.connection.execute("""
+                SELECT cached, count(*) FROM frontier WHERE state IN ('pending', 'running') GROUP BY cached
+            """).fetchall()
+        counts = dict(rows)
+        return counts.get(1, 0), counts.get(0, 0)
+
+    def close(self):
+        self.connection.close()
+
+
+def getListTask(baseUrl: str, kind: str) -> FetchTask:
+    return FetchTask(f"{baseUrl}?per_page={PER_PAGE}", baseUrl, 1, kind)
+
+
+class FetchScheduler:
+    def __init__(self, github: Github, frontier: FetchFrontier, concurrency: int = FETCH_CONCURRENCY):
+        self.github = github
+        self.frontier = frontier
+        self.concurrency = concurrency
+        self.statsLock = threading.Lock()
+        self.requests = 0
+        self.requestsTime = 0.0
+        self.lastReport = time.monotonic()
+
+    def addUsers(self, userNames: List[str]):
+        self.frontier.add([
+            FetchTask(f"{self.github.domain}/users/{userName}", f"{self.github.domain}/users/{userName}", 1, "user")
+            for userName in userNames
+        ], self.github)
+
+    def run(self):
+        threads = [threading.Thread(target=self.work) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report()
+
+    def work(self):
+        while True:
+            # Without budget only cached pages are processed, network ones wait for reset
+            task = self.frontier.claim(not self.github.hasBudget(), self.github)
+            if task is None:
+                cachedPending, networkPending = self.frontier.countPending()
+                if cachedPending + networkPending == 0:
+                    return
+                task = self.frontier.claim(False, self.github)
+                if task is None:
+                    # Everything left is being processed by other workers, they can still find more
+                    time.sleep(0.5)
+                    continue
+            self.process(task)
+            if time.monotonic() - self.lastReport > REPORT_INTERVAL:
+                self.report()
+
+    def process(self, task: FetchTask):
+        start = time.monotonic()
+        wasCached = isCached(self.github.getCacheName(task.baseUrl), task.page)
+        try:
+            data, meta = self.github.fetchPage(task.baseUrl, task.page, task.url)
+        except Exception as e:
+            logError(self.github.getCacheName(task.url), e)
+            self.frontier.fail(task)
+            return
+        if not wasCached:
+            with self.statsLock:
+                self.requests += 1
+                self.requestsTime += time.monotonic() - start
+
+        discovered = []
+        if task.kind == "user":
+            userName = data["login"]
+            discovered.append(getListTask(f"{self.github.domain}/users/{userName}/repos", "repos"))
+            discovered.append(getListTask(f"{self.github.domain}/users/{userName}/gists", "gists"))
+        elif task.kind == "repos":
+            for repo in data:
+                for endpoint in ["issues", "pulls", "contributors", "subscribers"]:
+                    discovered.append(getListTask(f"{self.github.domain}/repos/{repo['full_name']}/{endpoint}", endpoint))
+        if task.kind != "user" and hasNextPage(data, meta):
+            nextUrl = meta.get("next", f"{task.baseUrl}?per_page={PER_PAGE}&page={task.page + 1}")
+            discovered.append(FetchTask(nextUrl, task.baseUrl, task.page + 1, task.kind))
+        if len(discovered) > 0:
+            self.frontier.add(discovered, self.github)
+        self.frontier.finish(task)
+
+    def estimateRemainingSeconds(self) -> float:
+        _, networkPending = self.frontier.countPending()
+        limits = self.github.getLimits()
+        with self.statsLock:
+            requestTime = self.requestsTime / self.requests if self.requests > 0 else 0.5
+        fetchTime = networkPending * requestTime / self.concurrency
+        if limits is None or networkPending <= limits.remaining:
+            return fetchTime
+        # Rest of this window, then full windows for what does not fit into current budget
+        windows = math.ceil((networkPending - limits.remaining) / limits.limit)
+        untilReset = max((limits.reset - datetime.datetime.now()).total_seconds(), 0)
+        return max(untilReset + (windows - 1) * 3600, fetchTime)
+
+    def report(self):
+        self.lastReport = time.monotonic()
+        cachedPending, networkPending = self.frontier.countPending()
+        eta = datetime.timedelta(seconds=int(self.estimateRemainingSeconds()))
+        print("[FRONTIER]", networkPending, "urls to fetch,", cachedPending, "cached urls to process,",
+              self.requests, "requests done, ETA", eta)
+
+
+if __name__ == '__main__':
+    github = Github()
+    frontier = FetchFrontier()
+    scheduler = FetchScheduler(github, frontier)
+    with open(FILE_WITH_USERS_TO_FETCH) as usersList:
+        scheduler.addUsers([username.strip() for username in usersList if username.strip() != ""])
+    scheduler.run()
+    frontier.close()
+    metrics.writeReport()
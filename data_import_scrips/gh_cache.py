@@ -0,0 +1,311 @@
+import codecs
+import json
+import os.path
+import sqlite3
+import threading
+import zlib
+from typing import Iterator, Iterable, Optional, Tuple
+
+GITHUB_CACHE_FOLDER = ".cached_results"
+SQLITE_CACHE_FILE = ".cached_results.sqlite"
+# "sqlite" keeps every response compressed in one database file,
+# "directory" is the old layout with one json file per response in GITHUB_CACHE_FOLDER
+CACHE_BACKEND = "sqlite"
+# Items requested per page of a list endpoint, 100 is the maximum allowed by Github
+PER_PAGE = 100
+# Characters read at once when cached responses are parsed incrementally
+JSON_CHUNK_SIZE = 1 << 16
+
+
+def getCacheKey(name: str, page: int = 1) -> str:
+    # First page keeps the old name so caches from before pagination stay readable
+    if page > 1:
+        return f"{name}__page{page}"
+    return name
+
+
+def getRepoCacheName(repo, endpoint: str) -> str:
+    safeName = repo.fullName.replace("/", "__")
+    return f"repos__{safeName}__{endpoint}"
+
+
+class DirectoryCache:
+    def __init__(self, folder: str = GITHUB_CACHE_FOLDER):
+        self.folder = folder
+
+    def getPath(self, key: str) -> str:
+        return os.path.join(self.folder, key + ".json")
+
+    def getMetaPath(self, key: str) -> str:
+        # Validators (ETag, Last-Modified) and next page link of the cached response
+        return os.path.join(self.folder, key + ".meta")
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self.getPath(key))
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.contains(key):
+            return None
+        with open(self.getPath(key)) as f:
+            return f.read()
+
+    def iterChunks(self, key: str) -> Iterator[str]:
+        with open(self.getPath(key)) as f:
+            while True:
+                chunk = f.read(JSON_CHUNK_SIZE)
+                if chunk == "":
+                    return
+                yield chunk
+
+    def getMeta(self, key: str) -> dict:
+        path = self.getMetaPath(key)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, key: str, data: str, meta: dict = None):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.getPath(key), "w") as out:
+            out.write(data)
+        if meta is not None:
+            with open(self.getMetaPath(key), "w") as out:
+                json.dump(meta, out)
+
+    def putMany(self, entries: Iterable[Tuple[str, str, Optional[dict]]]):
+        for key, data, meta in entries:
+            self.put(key, data, meta)
+
+    def keys(self) -> Iterator[str]:
+        if not os.path.exists(self.folder):
+            return
+        for fileName in os.listdir(self.folder):
+            if fileName.endswith(".json"):
+                yield fileName[:-len(".json")]
+
+    def getVersion(self) -> str:
+        # Changes when any file is added, removed or written
+        if not os.path.exists(self.folder):
+            return "empty"
+        count, size, modified = 0, 0, 0
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                stat = entry.stat()
+                count += 1
+                size += stat.st_size
+                modified = max(modified, stat.st_mtime_ns)
+        return f"{count}-{size}-{modified}"
+
+    def close(self):
+        pass
+
+
+class SqliteCache:
+    def __init__(self, path: str = SQLITE_CACHE_FILE):
+        self.path = path
+        # One connection shared by fetcher threads, sqlite serializes writes anyway
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                meta TEXT
+            )
+        """)
+        # Bumped by every write, tells readers of derived data (dataset_snapshot.py) that it is out of date
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cache_version (version INTEGER NOT NULL)")
+        self.connection.execute("INSERT INTO cache_version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM cache_version)")
+        self.connection.commit()
+
+    def contains(self, key: str) -> bool:
+        with self.lock:
+            row = self.connection.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def iterChunks(self, key: str) -> Iterator[str]:
+        # Only compressed body is held in memory, it is inflated chunk by chunk
+        with self.lock:
+            row = self.connection.execute("SELECT body FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        compressed = row[0]
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for start in range(0, len(compressed), JSON_CHUNK_SIZE):
+            data = decompressor.decompress(compressed[start:start + JSON_CHUNK_SIZE])
+            yield decoder.decode(data)
+        yield decoder.decode(decompressor.flush(), final=True)
+
+    def getMeta(self, key: str) -> dict:
+        with self.lock:
+            row = self.connection.execute("SELECT meta FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] is None:
+            return {}
+        return json.loads(row[0])
+
+    def put(self, key: str, data: str, meta: dict = None):
+        self.putMany([(key, data, meta)])
+
+    def putMany(self, entries: Iterable[Tuple[str, str, Optional[dict]]]):
+        rows = [
+            (key, zlib.compress(data.encode("utf-8")), None if meta is None else json.dumps(meta))
+            for key, data, meta in entries
+        ]
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO responses (key, body, meta) VALUES (?, ?, ?)", rows)
+            self.connection.execute("UPDATE cache_version SET version = version + 1")
+            self.connection.commit()
+
+    def keys(self) -> Iterator[str]:
+        with self.lock:
+            keys = [row[0] for row in self.connection.execute("SELECT key FROM responses")]
+        return iter(keys)
+
+    def getVersion(self) -> str:
+        with self.lock:
+            row = self.connection.execute("SELECT version FROM cache_version").fetchone()
+        return str(row[0])
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def openCache(backend: str = CACHE_BACKEND):
+    if backend == "sqlite":
+        return SqliteCache()
+    if backend == "directory":
+        return DirectoryCache()
+    raise Exception(f"Unknown cache backend {backend}")
+
+
+cache = None
+cacheLock = threading.Lock()
+
+
+def getCache():
+    global cache
+    with cacheLock:
+        if cache is None:
+            cache = openCache()
+        return cache
+
+
+def isCached(name: str, page: int = 1) -> bool:
+    return getCache().contains(getCacheKey(name, page))
+
+
+def saveToCache(name: str, data: str, page: int = 1, meta: dict = None):
+    getCache().put(getCacheKey(name, page), data, meta)
+
+
+def readCacheMeta(name: str, page: int = 1) -> dict:
+    return getCache().getMeta(getCacheKey(name, page))
+
+
+def readCached(name: str, page: int = 1) -> Optional[str]:
+    return getCache().get(getCacheKey(name, page))
+
+
+def parsePage(content: str) -> list:
+    # Github answers some list endpoints (e.g. contributors of empty repo) with empty body
+    content = content.strip()
+    if content == "":
+        return []
+    return json.loads(content)
+
+
+def readCachedPage(name: str, page: int = 1) -> list:
+    return parsePage(readCached(name, page))
+
+
+def iterJsonArray(chunks: Iterator[str]) -> Iterator:
+    # Decodes top level json array one element at a time, so memory use is bounded
+    # by the chunk size and the biggest element instead of the whole document
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    finished = False
+    started = False
+
+    def readMore() -> bool:
+        nonlocal buffer, position, finished
+        for chunk in chunks:
+            if chunk != "":
+                buffer = buffer[position:] + chunk
+                position = 0
+                return True
+        finished = True
+        return False
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position == len(buffer):
+            if finished or not readMore():
+                if started:
+                    raise json.JSONDecodeError("Expecting ']'", buffer, position)
+                return
+            continue
+        if not started:
+            if buffer[position] != "[":
+                # Not an array (e.g. single object), nothing to stream
+                rest = buffer[position:] + "".join(chunks)
+                parsed = json.loads(rest)
+                if isinstance(parsed, list):
+                    yield from parsed
+                return
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if finished or not readMore():
+                raise
+            continue
+        # Element is complete only when followed by a separator, otherwise
+        # a number at the end of buffer could have been cut in the middle
+        separator = end
+        while separator < len(buffer) and buffer[separator] in " \t\r\n":
+            separator += 1
+        if separator == len(buffer) or buffer[separator] not in ",]":
+            if not finished and readMore():
+                continue
+            if separator < len(buffer):
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, separator)
+        position = end
+        yield item
+
+
+def hasNextPage(items: list, meta: dict) -> bool:
+    if "next" in meta:
+        return meta["next"] is not None
+    # Without saved Link header only full pages can be followed by another one.
+    # Pages saved before pagination had 30 items, so they are treated as the last one.
+    return len(items) >= PER_PAGE
+
+
+def iterCachedItems(name: str) -> Iterator:
+    page = 1
+    while isCached(name, page):
+        itemsCount = 0
+        for item in iterJsonArray(getCache().iterChunks(getCacheKey(name, page))):
+            itemsCount += 1
+            yield item
+        # hasNextPage only looks at the number of items
+        if not hasNextPage([None] * itemsCount, readCacheMeta(name, page)):
+            return
+        page += 1
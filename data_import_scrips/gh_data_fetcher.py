@@ -1,109 +1,227 @@
-import datetime
 import json
 import os.path
+import random
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
-from typing import List
+from typing import Iterator, List
 import requests as req
+from requests.adapters import HTTPAdapter
 
-from data_types import User, Repo, Issue, PullRequest, Gist, RemainingLimit
+from data_types import User, Repo, Issue, PullRequest, Gist, RemainingLimit, internUser
+from gh_cache import PER_PAGE, parsePage, hasNextPage, isCached, readCachedPage, readCacheMeta, saveToCache
+from metrics import logVerbose, metrics
+from rate_limiter import RateLimiter, TokenPool
 
 FILE_WITH_USERS_TO_FETCH = "users_to_fetch.txt"
-GITHUB_DOMAIN = "https://api.github.com"
-GITHUB_CACHE_FOLDER = ".cached_results"
+# Can point to a local fake_github.py server
+GITHUB_DOMAIN = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+# Number of users fetched at the same time, all workers share one rate limit budget
+FETCH_CONCURRENCY = 8
+# Revalidate cached responses with conditional requests instead of trusting them,
+# answers 304 Not Modified do not count against the rate limit
+REFRESH_CACHE = False
+# Attempts of one request that failed with 5xx, connection error or secondary rate limit
+FETCH_RETRIES = 6
+RETRY_BASE_DELAY = 1.0
+# Github asks to wait at least a minute after secondary limit when it does not send Retry-After
+SECONDARY_LIMIT_DELAY = 60
+FETCH_TIMEOUT = 30
+# Personal access tokens, comma separated in GITHUB_TOKENS or one per line in this file. Every token has
+# its own limit of 5000 requests per hour, without any the fetcher is anonymous and gets 60
+GITHUB_TOKENS_FILE = ".github_tokens.txt"
 
 
-def wait(end):
-    while True:
-        now = datetime.datetime.now()
-        if now > end:
-            return
-        print("[SLEEP]", f"waiting to {end}")
-        sleep(60)
+def loadTokens() -> List[str]:
+    tokens = os.environ.get("GITHUB_TOKENS", os.environ.get("GITHUB_TOKEN", "")).split(",")
+    if os.path.exists(GITHUB_TOKENS_FILE):
+        with open(GITHUB_TOKENS_FILE) as tokensFile:
+            tokens += tokensFile.read().splitlines()
+    tokens = [token.strip() for token in tokens]
+    return list(dict.fromkeys(token for token in tokens if token != "" and not token.startswith("#")))
 
 
 class Github:
-    def __init__(self):
-        self.limits = None
-        self.limits = self.fetchRemainingRequests()
-        print(self.limits.remaining)
+    def __init__(self, domain: str = GITHUB_DOMAIN, concurrency: int = FETCH_CONCURRENCY, refresh=REFRESH_CACHE,
+                 writeCache=True, tokens: List[str] = None):
+        self.domain = domain
+        self.refresh = refresh
+        # Without cache writes responses are only passed on, e.g. straight to the importer
+        self.writeCache = writeCache
+        self.session = req.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Shared by all workers, budgets are kept up to date from headers of every response
+        self.tokens = TokenPool(loadTokens() if tokens is None else tokens)
+        for limiter in self.tokens.limiters:
+            limiter.setLimits(self.fetchRemainingRequests(limiter))
+        limits = self.getLimits()
+        tokensCount = len(self.tokens.limiters) if self.tokens.limiters[0].token is not None else 0
+        print("[LIMITS]", limits.remaining, "requests left from", limits.limit, "with", tokensCount, "tokens")
 
-    def getLimits(self):
-        return self.limits
+    def getLimits(self) -> RemainingLimit:
+        return self.tokens.getLimits()
 
     def fetchUser(self, userName: str) -> User:
-        url = f"{GITHUB_DOMAIN}/users/{userName}"
+        url = f"{self.domain}/users/{userName}"
         return User(self.fetchFrom(url))
 
-    def fetchRepositories(self, user: User) -> List[Repo]:
-        url = f"{GITHUB_DOMAIN}/users/{user.name}/repos"
-        print(f"[{user.name}/repos]", "fetching for", user.name)
-        repos = [Repo(repo) for repo in self.fetchFrom(url)]
-        return repos
-
-    def fetchIssues(self, repo: Repo) -> List[Issue]:
-        url = f"{GITHUB_DOMAIN}/repos/{repo.fullName}/issues"
-        print(f"[{repo.fullName}/issues]", "fetching issues for", repo.fullName)
-        issues = [Issue(issue, repo.fullName) for issue in self.fetchFrom(url)]
-        return issues
-
-    def fetchPullRequests(self, repo: Repo) -> List[PullRequest]:
-        url = f"{GITHUB_DOMAIN}/repos/{repo.fullName}/pulls"
-        print(f'[{repo.fullName}/pulls]', "fetching pull requests for", repo.fullName)
-        pullRequest = [PullRequest(pr, repo.fullName) for pr in self.fetchFrom(url)]
-        return pullRequest
-
-    def fetchGists(self, user: User) -> List[Gist]:
-        url = f"{GITHUB_DOMAIN}/users/{user.name}/gists"
-        print(f"[{user.name}/gists]", "fetching gists for", user.name)
-        gists = [Gist(g) for g in self.fetchFrom(url)]
-        return gists
-
-    def fetchContibutors(self, repo: Repo) -> List[User]:
-        url = f"{GITHUB_DOMAIN}/repos/{repo.fullName}/contributors"
-        print(f"[{repo.fullName}/contributions]", "fetching for", repo.fullName)
-        contrs = [User(u) for u in self.fetchFrom(url)]
-        return contrs
-
-    def fetchSubscriptions(self, repo: Repo):
-        url = f"{GITHUB_DOMAIN}/repos/{repo.fullName}/subscribers"
-        print(f"[{repo.fullName}/subs]", "fetching for", repo.fullName)
-        subscriptions = [User(u) for u in self.fetchFrom(url)]
-        return subscriptions
-
-    def fetchRemainingRequests(self) -> RemainingLimit:
-        url = f"{GITHUB_DOMAIN}/rate_limit"
-        return RemainingLimit(self.fetchFrom(url, True))
-
-    def saveToCache(self, url: str, data):
-        if not os.path.exists(GITHUB_CACHE_FOLDER):
-            os.mkdir(GITHUB_CACHE_FOLDER)
-        with open(self.getPathToCached(url), "w") as out:
-            out.write(data)
-
-    def getPathToCached(self, url: str) -> str:
-        fileName = url.replace(f"{GITHUB_DOMAIN}/", "").replace("/", "__") + ".json"
-        return os.path.join(GITHUB_CACHE_FOLDER, fileName)
+    def fetchRepositories(self, user: User) -> Iterator[Repo]:
+        url = f"{self.domain}/users/{user.name}/repos"
+        logVerbose(f"[{user.name}/repos]", "fetching for", user.name)
+        return (Repo(repo) for repo in self.iterFrom(url))
+
+    def fetchIssues(self, repo: Repo) -> Iterator[Issue]:
+        url = f"{self.domain}/repos/{repo.fullName}/issues"
+        logVerbose(f"[{repo.fullName}/issues]", "fetching issues for", repo.fullName)
+        return (Issue(issue, repo.fullName) for issue in self.iterFrom(url))
+
+    def fetchPullRequests(self, repo: Repo) -> Iterator[PullRequest]:
+        url = f"{self.domain}/repos/{repo.fullName}/pulls"
+        logVerbose(f'[{repo.fullName}/pulls]', "fetching pull requests for", repo.fullName)
+        return (PullRequest(pr, repo.fullName) for pr in self.iterFrom(url))
+
+    def fetchGists(self, user: User) -> Iterator[Gist]:
+        url = f"{self.domain}/users/{user.name}/gists"
+        logVerbose(f"[{user.name}/gists]", "fetching gists for", user.name)
+        return (Gist(g) for g in self.iterFrom(url))
+
+    def fetchContibutors(self, repo: Repo) -> Iterator[User]:
+        url = f"{self.domain}/repos/{repo.fullName}/contributors"
+        logVerbose(f"[{repo.fullName}/contributions]", "fetching for", repo.fullName)
+        return (internUser(u) for u in self.iterFrom(url))
+
+    def fetchSubscriptions(self, repo: Repo) -> Iterator[User]:
+        url = f"{self.domain}/repos/{repo.fullName}/subscribers"
+        logVerbose(f"[{repo.fullName}/subs]", "fetching for", repo.fullName)
+        return (internUser(u) for u in self.iterFrom(url))
+
+    def fetchRemainingRequests(self, limiter: RateLimiter = None) -> RemainingLimit:
+        url = f"{self.domain}/rate_limit"
+        return RemainingLimit(json.loads(self.request(url, limiter=limiter).text))
+
+    def saveToCache(self, url: str, data, page: int = 1, meta: dict = None):
+        saveToCache(self.getCacheName(url), data, page, meta)
+
+    def getCacheName(self, url: str) -> str:
+        return url.replace(f"{self.domain}/", "").replace("/", "__")
+
+    def hasBudget(self) -> bool:
+        return self.tokens.hasBudget()
 
     def fetchFrom(self, url: str, skipCache=False, skipLimitsCheck=False):
-        cachedFilePath = self.getPathToCached(url)
-        if os.path.exists(cachedFilePath) and not skipCache:
-            with open(cachedFilePath, "r") as cachedVersionFile:
-                return json.load(cachedVersionFile)
-
-        if self.limits is not None and self.limits.remaining == 0:
-            wait(self.limits.reset)
-            self.limits = None
-            self.limits = self.fetchRemainingRequests()
-        response = req.get(url)
-        if not response.ok:
+        if skipCache:
+            return json.loads(self.request(url).text)
+        data, _ = self.fetchPage(url, 1, url)
+        return data
+
+    def iterFrom(self, url: str) -> Iterator:
+        # Yields items of list endpoint page by page, following Link: rel="next"
+        page = 1
+        pageUrl = f"{url}?per_page={PER_PAGE}"
+        while pageUrl is not None:
+            items, meta = self.fetchPage(url, page, pageUrl)
+            yield from items
+            pageUrl = None
+            if hasNextPage(items, meta):
+                pageUrl = meta.get("next", f"{url}?per_page={PER_PAGE}&page={page + 1}")
+            page += 1
+
+    def fetchPage(self, url: str, page: int, pageUrl: str):
+        cacheName = self.getCacheName(url)
+        cachedData = None
+        meta = {}
+        if isCached(cacheName, page):
+            with metrics.timed("json_parse_seconds", {"source": "cache"}):
+                cachedData = readCachedPage(cacheName, page)
+            meta = readCacheMeta(cacheName, page)
+            if not self.refresh:
+                metrics.increment("cache_hits_total")
+                return cachedData, meta
+
+        headers = {}
+        if "etag" in meta and meta["etag"] is not None:
+            headers["If-None-Match"] = meta["etag"]
+        if "lastModified" in meta and meta["lastModified"] is not None:
+            headers["If-Modified-Since"] = meta["lastModified"]
+        response = self.request(pageUrl, headers)
+        if response.status_code == 304:
+            metrics.increment("cache_hits_total")
+            return cachedData, meta
+        metrics.increment("cache_misses_total")
+
+        meta = {
+            "etag": response.headers.get("ETag"),
+            "lastModified": response.headers.get("Last-Modified"),
+            "next": response.links.get("next", {}).get("url"),
+        }
+        if self.writeCache:
+            self.saveToCache(url, response.text, page, meta)
+        with metrics.timed("json_parse_seconds", {"source": "network"}):
+            return parsePage(response.text), meta
+
+    def request(self, url: str, headers: dict = None, limiter: RateLimiter = None) -> req.Response:
+        attempt = 0
+        while True:
+            # Request is taken from the budget before it is sent, so workers running
+            # at the same time never go over the limit. Without given limiter the token
+            # with the most budget left is used
+            if limiter is not None:
+                limiter.acquire()
+                tokenLimiter = limiter
+            else:
+                tokenLimiter = self.tokens.acquire()
+            requestHeaders = dict(headers or {})
+            if tokenLimiter.token is not None:
+                requestHeaders["Authorization"] = f"token {tokenLimiter.token}"
+            try:
+                with metrics.timed("http_request_seconds"):
+                    response = self.session.get(url, headers=requestHeaders, timeout=FETCH_TIMEOUT)
+            except (req.ConnectionError, req.Timeout) as e:
+                attempt = self.retryLater(url, attempt, "connection", e)
+                continue
+            metrics.increment("http_responses_total", labels={"status": str(response.status_code)})
+            tokenLimiter.update(response.headers)
+            if response.status_code == 304:
+                # Not Modified does not count against the limit
+                tokenLimiter.refund()
+            if response.ok:
+                return response
+            if response.status_code in [403, 429]:
+                if response.headers.get("X-RateLimit-Remaining") == "0":
+                    # Primary limit, this token waits for reset and another token is used or the fetcher
+                    # sleeps. Counted as an attempt, with our clock ahead of Github it could repeat forever
+                    tokenLimiter.exhausted()
+                    attempt = self.retryLater(url, attempt, "primary limit", response.status_code, 0)
+                    continue
+                # Anything else is taken as secondary limit, Github does not always say so or send Retry-After.
+                # Without it the wait grows with attempts and is jittered, so workers do not come back at once
+                retryAfter = response.headers.get("Retry-After")
+                if retryAfter is not None and retryAfter.isdigit():
+                    delay = int(retryAfter)
+                else:
+                    delay = SECONDARY_LIMIT_DELAY * (2 ** attempt) * random.uniform(1.0, 1.5)
+                # Limit is per account, so all workers stop using this token until it passes
+                tokenLimiter.blockFor(delay)
+                attempt = self.retryLater(url, attempt, "secondary limit", response.status_code, 0)
+                continue
+            if response.status_code >= 500:
+                attempt = self.retryLater(url, attempt, "server error", response.status_code)
+                continue
             raise Exception(response.text)
-        if self.limits is not None:
-            self.limits.remaining -= 1
-            print("[LIMITS]", "left", self.limits.remaining, "from", self.limits.limit, "until", self.limits.reset)
-        respText = response.text
-        self.saveToCache(url, respText)
-        return json.loads(respText)
+
+    @staticmethod
+    def retryLater(url: str, attempt: int, reason: str, error, delay: float = None) -> int:
+        if attempt + 1 >= FETCH_RETRIES:
+            raise Exception(f"{url} failed {attempt + 1} times, last {reason}: {error}")
+        if delay is None:
+            delay = RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+        metrics.increment("http_retries_total", labels={"reason": reason})
+        print("[RETRY]", f"[{url}]", f"attempt {attempt + 1} failed with {reason}:", error, file=sys.stderr)
+        sleep(delay)
+        return attempt + 1
 
 
 FETCHED_USERS_FILE = ".fetched_users.txt"
@@ -118,42 +236,45 @@ def fetchUserData(userName: str, github: Github):
         return
 
     try:
-        github.fetchGists(user)
+        fetchAll(github.fetchGists(user))
     except Exception as e:
         logError(f"{user.name}/gists", e)
-    repos = []
     try:
-        repos = github.fetchRepositories(user)
+        for i, repo in enumerate(github.fetchRepositories(user)):
+            logVerbose("[REPOS]", f"{user.name}", i)
+            fetchRepoData(repo, github)
     except Exception as e:
         logError(f"{user.name}/repos", e)
 
-    reposCount = len(repos)
-    for i in range(reposCount):
-        print("[REPOS]", f"{i}/{reposCount}")
-        repo = repos[i]
-        try:
-            github.fetchIssues(repo)
-        except (Exception) as e:
-            logError(f"{repo.fullName}/issues", e)
-        try:
-            github.fetchPullRequests(repo)
-        except Exception as e:
-            logError(f"{repo.fullName}/pullrequests", e)
-        try:
-            github.fetchContibutors(repo)
-        except Exception as e:
-            logError(f"{repo.fullName}/contributuons", e)
-        try:
-            github.fetchSubscriptions(repo)
-        except Exception as e:
-            logError(f"{repo.fullName}/subscriptions", e)
-    pass
+
+def fetchRepoData(repo: Repo, github: Github):
+    try:
+        fetchAll(github.fetchIssues(repo))
+    except (Exception) as e:
+        logError(f"{repo.fullName}/issues", e)
+    try:
+        fetchAll(github.fetchPullRequests(repo))
+    except Exception as e:
+        logError(f"{repo.fullName}/pullrequests", e)
+    try:
+        fetchAll(github.fetchContibutors(repo))
+    except Exception as e:
+        logError(f"{repo.fullName}/contributuons", e)
+    try:
+        fetchAll(github.fetchSubscriptions(repo))
+    except Exception as e:
+        logError(f"{repo.fullName}/subscriptions", e)
+
+
+def fetchAll(items: Iterator):
+    # Fetching happens while items are iterated, objects themselves are not needed
+    for _ in items:
+        pass
 
 
 def logError(title, message):
     message = str(message)
-    if not os.path.exists(".errors"):
-        os.mkdir(".errors")
+    os.makedirs(".errors", exist_ok=True)
     errorPath = os.path.join(".errors", title.replace("/", "__"))
     print("[ERROR]", f"[{title}]", message, file=sys.stderr)
     with open(errorPath, "w") as file:
@@ -161,13 +282,26 @@ def logError(title, message):
         file.write("\n")
 
 
+fetchedUsersLock = threading.Lock()
+
+
+def fetchAndMarkUser(username: str, github: Github):
+    print("[USER]", "fetching", username, "data")
+    fetchUserData(username, github)
+    with fetchedUsersLock, open(FETCHED_USERS_FILE, "a") as fetchedUsersFile:
+        fetchedUsersFile.write(username)
+        fetchedUsersFile.write("\n")
+
+
+def fetchUsers(usernames: List[str], github: Github, concurrency: int = FETCH_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # list() re-raises exceptions from workers
+        list(executor.map(lambda username: fetchAndMarkUser(username, github), usernames))
+
+
 if __name__ == '__main__':
     github = Github()
     with open(FILE_WITH_USERS_TO_FETCH) as usersList:
-        for username in usersList:
-            username = username.strip()
-            print("[USER]", "fetching", username, "data")
-            fetchUserData(username, github)
-            with open(FETCHED_USERS_FILE, "a") as fetchedUsersFile:
-                fetchedUsersFile.write(username)
-                fetchedUsersFile.write("\n")
+        usernames = [username.strip() for username in usersList]
+    fetchUsers(usernames, github)
+    metrics.writeReport()
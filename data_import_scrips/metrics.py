@@ -0,0 +1,170 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# "verbose" prints a line for every fetched list and imported entity like before,
+# "quiet" prints only warnings, errors and periodic summaries
+LOG_LEVEL = "verbose"
+# End of run report, written next to the printed one
+METRICS_REPORT_FILE = "metrics_report.json"
+# Prometheus text exposition of the same metrics, e.g. for node_exporter textfile collector. None disables it
+PROMETHEUS_FILE = None
+# Upper bounds (seconds) of histogram buckets, from local cache reads to slow Github pages
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+def logVerbose(*args, **kwargs):
+    # For per-entity progress lines, at this volume printing them costs real time
+    if LOG_LEVEL == "verbose":
+        print(*args, **kwargs)
+
+
+def getMetricKey(name: str, labels: Optional[Dict[str, str]] = None) -> str:
+    if not labels:
+        return name
+    formattedLabels = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{formattedLabels}}}"
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        # Last bucket takes everything above the highest bound
+        self.counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(DURATION_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the quantile, precise enough to see where time goes
+        rank = q * self.count
+        seen = 0
+        for i, bucketCount in enumerate(self.counts):
+            seen += bucketCount
+            if seen >= rank and bucketCount > 0:
+                return DURATION_BUCKETS[i] if i < len(DURATION_BUCKETS) else self.max
+        return 0.0
+
+    def toDict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count > 0 else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+        }
+
+
+class Metrics:
+    # Counters and duration histograms shared by all threads of one run
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None):
+        key = getMetricKey(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict[str, str]] = None):
+        key = getMetricKey(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram()
+                self.histograms[key] = histogram
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, name: str, labels: Optional[Dict[str, str]] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def getCounter(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        with self.lock:
+            return self.counters.get(getMetricKey(name, labels), 0)
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.counters = {}
+            self.histograms = {}
+
+    def report(self) -> Dict:
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            counters = dict(self.counters)
+            histograms = {key: histogram.toDict() for key, histogram in self.histograms.items()}
+        cacheHits = counters.get("cache_hits_total", 0)
+        cacheMisses = counters.get("cache_misses_total", 0)
+        return {
+            "elapsedSeconds": round(elapsed, 3),
+            "counters": counters,
+            "ratesPerSecond": {key: round(value / elapsed, 3) for key, value in counters.items()} if elapsed > 0 else {},
+            "cacheHitRatio": cacheHits / (cacheHits + cacheMisses) if cacheHits + cacheMisses > 0 else None,
+            "durations": histograms,
+        }
+
+    def formatReport(self) -> List[str]:
+        report = self.report()
+        lines = [f"run took {report['elapsedSeconds']:.1f}s"]
+        if report["cacheHitRatio"] is not None:
+            lines.append(f"cache hit ratio {report['cacheHitRatio']:.1%}")
+        for key, value in sorted(report["counters"].items()):
+            lines.append(f"{key} {value:g} ({report['ratesPerSecond'].get(key, 0):g}/s)")
+        for key, stats in sorted(report["durations"].items()):
+            lines.append(f"{key} count {stats['count']} total {stats['sum']:.3f}s mean {stats['mean'] * 1000:.1f}ms "
+                         f"p95 {stats['p95'] * 1000:.0f}ms max {stats['max'] * 1000:.1f}ms")
+        return lines
+
+    def toPrometheus(self) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(h.counts), h.count, h.total) for key, h in self.histograms.items()}
+        lines = []
+        for key, value in sorted(counters.items()):
+            lines.append(f"{key} {value:g}")
+        for key, (counts, count, total) in sorted(histograms.items()):
+            name, _, labels = key.partition("{")
+            labels = labels.rstrip("}")
+            separator = "," if labels else ""
+            cumulative = 0
+            for bound, bucketCount in zip(DURATION_BUCKETS + ["+Inf"], counts):
+                cumulative += bucketCount
+                lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {total:g}")
+            lines.append(f"{name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
+
+    def writeReport(self, path: Optional[str] = None, prometheusPath: Optional[str] = None):
+        for line in self.formatReport():
+            print("[METRICS]", line)
+        with open(path or METRICS_REPORT_FILE, "w") as out:
+            json.dump(self.report(), out, indent=2)
+        prometheusPath = prometheusPath or PROMETHEUS_FILE
+        if prometheusPath is not None:
+            with open(prometheusPath, "w") as out:
+                out.write(self.toPrometheus())
+
+
+# Metrics of the current process, modules record into it and __main__ writes the report
+metrics = Metrics()
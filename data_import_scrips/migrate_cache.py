@@ -0,0 +1,26 @@
+from gh_cache import DirectoryCache, SqliteCache, GITHUB_CACHE_FOLDER, SQLITE_CACHE_FILE
+
+# Responses written to sqlite in one transaction
+MIGRATION_BATCH_SIZE = 1000
+
+
+def migrate(source: DirectoryCache, target: SqliteCache):
+    batch = []
+    migrated = 0
+    for key in source.keys():
+        batch.append((key, source.get(key), source.getMeta(key) or None))
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            target.putMany(batch)
+            migrated += len(batch)
+            batch = []
+            print("[MIGRATE]", "migrated", migrated, "responses")
+    target.putMany(batch)
+    migrated += len(batch)
+    print("[MIGRATE]", "done,", migrated, "responses in", target.path)
+
+
+if __name__ == '__main__':
+    source = DirectoryCache(GITHUB_CACHE_FOLDER)
+    target = SqliteCache(SQLITE_CACHE_FILE)
+    migrate(source, target)
+    target.close()
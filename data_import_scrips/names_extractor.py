@@ -1,14 +1,44 @@
 import json
+import re
 PATH_TO_ORIGINAL_FILE = "<tutaj ścieżka do pliku ze wszsytkimi danymi>"
 LIMIT=600
+# Read login straight from the raw line instead of parsing the whole record with json.
+# Every line of the dump is a user object, the first "login" key is used only if it is a key of
+# that object and not of a nested one. Lines where it is not, or login is escaped or missing, go through json.
+FAST_LOGIN_EXTRACTION = True
+READ_BUFFER_SIZE = 1 << 20
+
+LOGIN_PATTERN = re.compile(rb'"login"\s*:\s*"([^"\\]*)"')
+STRING_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*"')
+
+
+def isTopLevelKey(line: bytes, position: int) -> bool:
+    # Strings before the key are dropped, so braces and quotes inside them do not count
+    prefix = STRING_PATTERN.sub(b"", line[:position])
+    return b'"' not in prefix and prefix.count(b"{") - prefix.count(b"}") == 1
+
+
+def extractLogin(line: bytes, fast=FAST_LOGIN_EXTRACTION) -> str:
+    if fast:
+        match = LOGIN_PATTERN.search(line)
+        if match is not None and isTopLevelKey(line, match.start()):
+            return match.group(1).decode("utf-8")
+    return json.loads(line)["login"]
+
+
+def iterLogins(path: str, fast=FAST_LOGIN_EXTRACTION):
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as f:
+        for line in f:
+            if line.strip() == b"":
+                continue
+            yield extractLogin(line, fast)
 
 
 if __name__ == '__main__':
     i=0
-    with open(PATH_TO_ORIGINAL_FILE) as f, open("users_to_fetch.txt", "w") as out:
-        for line in f:
-            j = json.loads(line)
-            out.write(j["login"])
+    with open("users_to_fetch.txt", "w") as out:
+        for login in iterLogins(PATH_TO_ORIGINAL_FILE):
+            out.write(login)
             out.write("\n")
             if i < LIMIT:
                 i += 1
@@ -1,13 +1,74 @@
 import json
 import os.path
+import random
 import sys
-from typing import Dict
+import threading
+from collections import OrderedDict
+from itertools import chain
+from queue import Queue, Empty
+from time import sleep
+from typing import Dict, List, Tuple
 
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError
 
-from data_types import User, Issue, PullRequest, Gist, GistFile, Repo, License
+from data_types import User, Issue, PullRequest, Gist, Repo, License, internUser
+from dataset_snapshot import getSnapshot
+from gh_cache import getRepoCacheName, isCached, iterCachedItems, readCached
+from metrics import logVerbose, metrics
 
 DB_URI = "neo4j://localhost:7687"
+# Rows buffered by BatchedNeo4JConnection before they are written in one transaction,
+# 0 falls back to one transaction per entity
+IMPORT_BATCH_SIZE = 5000
+# Users imported at the same time, each worker has its own BatchedNeo4JConnection.
+# 1 imports users one by one in the main thread
+IMPORT_WORKERS = 4
+# Attempts of one batch that failed with transient error (e.g. deadlock)
+IMPORT_RETRIES = 6
+RETRY_BASE_DELAY = 0.2
+# Users that are completely written to the database, an interrupted import skips them when run again
+IMPORT_JOURNAL_FILE = ".imported_users.txt"
+# Print plans of the importer lookups before and after creating the schema
+CHECK_QUERY_PLANS = False
+# Users, languages, topics and licenses already written by one connection, later references
+# only MATCH them (or skip licenses) instead of MERGEing them again. 0 disables it
+DIMENSION_CACHE_SIZE = 200000
+# After the import write HELPS and CODES_IN edges computed by collaboration_graph.py (needs numpy and scipy)
+IMPORT_COLLABORATION_GRAPH = False
+# Read users from the binary snapshot of the cache (dataset_snapshot.py) instead of parsing json,
+# the snapshot is compiled again whenever the cache changes
+IMPORT_FROM_SNAPSHOT = False
+
+OWNER_LABELS = ["User", "Organization", "Bot"]
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT repository_id IF NOT EXISTS ON (n:Repository) ASSERT n.id IS UNIQUE",
+    "CREATE INDEX repository_full_name IF NOT EXISTS FOR (n:Repository) ON (n.fullName)",
+    "CREATE CONSTRAINT gist_id IF NOT EXISTS ON (n:Gist) ASSERT n.id IS UNIQUE",
+    "CREATE CONSTRAINT language_name IF NOT EXISTS ON (n:Language) ASSERT n.name IS UNIQUE",
+    "CREATE CONSTRAINT topic_name IF NOT EXISTS ON (n:Topic) ASSERT n.name IS UNIQUE",
+    "CREATE CONSTRAINT license_spdx_id IF NOT EXISTS ON (n:License) ASSERT n.spdxId IS UNIQUE",
+    "CREATE CONSTRAINT issue_id IF NOT EXISTS ON (n:Issue) ASSERT n.id IS UNIQUE",
+    "CREATE CONSTRAINT pull_request_id IF NOT EXISTS ON (n:PullRequest) ASSERT n.id IS UNIQUE",
+] + [
+    f"CREATE CONSTRAINT {label.lower()}_id IF NOT EXISTS ON (n:{label}) ASSERT n.id IS UNIQUE"
+    for label in OWNER_LABELS
+]
+# Lookups done by the import queries, used to check that they are served by indexes
+LOOKUP_QUERIES = {
+    "repo by fullName": "MATCH (repo:Repository) WHERE repo.fullName = $value RETURN repo",
+    "repo by id": "MATCH (repo:Repository) WHERE repo.id = $value RETURN repo",
+    "gist by id": "MATCH (gi:Gist {id: $value}) RETURN gi",
+    "language by name": "MERGE (lang:Language {name: $value})",
+    "topic by name": "MERGE (t:Topic {name: $value})",
+    "license by spdxId": "MERGE (l:License {spdxId: $value})",
+    "issue by id": "MATCH (issue:Issue {id: $value}) RETURN issue",
+    "pull request by id": "MATCH (pr:PullRequest {id: $value}) RETURN pr",
+}
+LOOKUP_QUERIES.update({
+    f"{label.lower()} by id": f"MERGE (owner:{label} {{id: $value}})" for label in OWNER_LABELS
+})
+SCANNING_OPERATORS = ["AllNodesScan", "NodeByLabelScan"]
 
 
 def getOrDefault(d: Dict, keyName: str, defaultValue):
@@ -16,23 +77,97 @@ def getOrDefault(d: Dict, keyName: str, defaultValue):
     return defaultValue
 
 
+class ImportJournal:
+    def __init__(self, path: str = IMPORT_JOURNAL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.imported = set()
+        if os.path.exists(path):
+            with open(path) as journalFile:
+                self.imported = {line.strip() for line in journalFile if line.strip() != ""}
+
+    def isImported(self, userName: str) -> bool:
+        return userName in self.imported
+
+    def markImported(self, userNames: List[str]):
+        if len(userNames) == 0:
+            return
+        with self.lock, open(self.path, "a") as journalFile:
+            for userName in userNames:
+                journalFile.write(userName)
+                journalFile.write("\n")
+                self.imported.add(userName)
+
+
+class DimensionCache:
+    # Bounded LRU of (kind, key) of nodes that are committed, so MATCH on them cannot miss
+    def __init__(self, maxSize: int = DIMENSION_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.keys = OrderedDict()
+
+    def contains(self, kind: str, key) -> bool:
+        if (kind, key) in self.keys:
+            self.keys.move_to_end((kind, key))
+            metrics.increment("dimension_cache_hits_total", labels={"kind": kind})
+            return True
+        metrics.increment("dimension_cache_misses_total", labels={"kind": kind})
+        return False
+
+    def addMany(self, keys: List[Tuple[str, object]]):
+        if self.maxSize <= 0:
+            return
+        for key in keys:
+            self.keys[key] = True
+            self.keys.move_to_end(key)
+        while len(self.keys) > self.maxSize:
+            self.keys.popitem(last=False)
+
+
+def ownerClause(variable: str, label: str, idValue: str, nameValue: str, known: bool) -> str:
+    if known:
+        return f"MATCH ({variable}:{label} {{id: {idValue}}})"
+    return f"MERGE ({variable}:{label} {{id: {idValue}}})\n    ON CREATE SET {variable}.name = {nameValue}"
+
+
 class Neo4JConnection:
-    def __init__(self):
-        self.driver = GraphDatabase.driver(DB_URI)
+    def __init__(self, driver=None, journal: ImportJournal = None):
+        if driver is None:
+            driver = GraphDatabase.driver(DB_URI)
+        self.driver = driver
+        self.journal = journal
+        self.dimensions = DimensionCache()
+
+    def finishUser(self, userName: str):
+        # Every write of this class is committed right away
+        if self.journal is not None:
+            self.journal.markImported([userName])
 
     def close(self):
         self.driver.close()
         self.driver = None
 
-    def createUserOrOrg(self, user: User):
+    def createSchema(self):
+        with self.driver.session() as ses:
+            for statement in SCHEMA_STATEMENTS:
+                ses.run(statement).consume()
+            ses.run("CALL db.awaitIndexes()").consume()
+
+    def explainLookups(self) -> Dict[str, List[str]]:
+        operators = {}
         with self.driver.session() as ses:
-            ses.write_transaction(self.createAndReturnUser, user)
+            for name, query in LOOKUP_QUERIES.items():
+                plan = ses.run("EXPLAIN " + query, value=None).consume().plan
+                operators[name] = collectPlanOperators(plan)
+        return operators
+
+    def createUserOrOrg(self, user: User):
+        # Always MERGEd, fetched user brings blog and email that other mentions do not have
+        self.timedWrite("users", self.createAndReturnUser, user, written=[("user", user.id)])
 
     @staticmethod
     def createAndReturnUser(tx, user: User):
-        query = f"""CREATE (a:{user.type}) 
+        query = f"""MERGE (a:{user.type} {{id: $id}})
         SET a.blog = $blog
-        SET a.id = $id
         SET a.email = $email
         SET a.name = $login
         RETURN a
@@ -46,84 +181,79 @@ class Neo4JConnection:
         return result.single()[0]
 
     def createGist(self, user: User, gist: Gist):
-        with self.driver.session() as session:
-            session.write_transaction(self.__createGist, user, gist)
-        pass
+        ownerKnown = self.dimensions.contains("user", user.id)
+        written = [("user", user.id)] + [("language", file.language) for file in gist.files]
+        self.timedWrite("gists", self.__createGist, user, gist, ownerKnown, written=written)
 
     @staticmethod
-    def __createGist(tx, user: User, gist: Gist):
-        query = """
-        MERGE (owner {id: $user_id, name: $user_name}) 
-        CREATE (g:Gist) 
-        SET g.id = $gist_id
+    def __createGist(tx, user: User, gist: Gist, ownerKnown: bool):
+        # Files are written by the same statement, so the gist does not have to be matched again for each of them
+        query = f"""
+        {ownerClause("owner", user.type, "$user_id", "$user_name", ownerKnown)}
+        MERGE (g:Gist {{id: $gist_id}})
         SET g.description = $gist_description
         
-        CREATE (owner)-[:CREATED]->(g)
+        MERGE (owner)-[:CREATED]->(g)
+        FOREACH (file IN $files |
+            MERGE (lang:Language {{name: file.lang}})
+            MERGE (g)-[:CONTAINS]->(gf:GistFile {{name: file.gf_name}})
+            SET gf.type = file.gf_type
+            SET gf.size = file.gf_size
+            MERGE (gf)-[:IS_WRITTEN_IN]->(lang)
+        )
         """
-        query += f" SET owner :{user.type} "
         tx.run(query,
                user_name=user.name,
                user_id=user.id,
                user_type=user.type,
                gist_id=gist.id,
                gist_description=gist.description,
+               files=getGistFileRows(gist),
                )
 
-    def createGistFile(self, gist, file: GistFile):
-        with self.driver.session() as ses:
-            ses.write_transaction(self.__createGistFile, gist, file)
-
-    @staticmethod
-    def __createGistFile(tx, gist: Gist, file: GistFile):
-        query = """
-        MATCH (gi:Gist {id: $gist_id})
-        MERGE (lang:Language {name: $lang})
-        CREATE (gf:GistFile {
-            name: $gf_name,
-            type: $gf_type,
-            size: $gf_size        
-        }),
-        (gi)-[:CONTAINS]->(gf),
-        (gf)-[:IS_WRITTEN_IN]->(lang)
-        """
-        tx.run(query,
-               gist_id=gist.id,
-               gf_name=file.name,
-               lang=file.language,
-               gf_type=file.type,
-               gf_size=file.size)
-
     def createRepo(self, repo: Repo):
-        with self.driver.session() as s:
-            s.write_transaction(self.__createRepo, repo)
+        known = self.getKnownRepoDimensions(repo)
+        self.timedWrite("repos", self.__createRepo, repo, known, written=getRepoDimensions(repo))
+
+    def getKnownRepoDimensions(self, repo: Repo) -> Dict:
+        return {
+            "owner": self.dimensions.contains("user", repo.owner.id),
+            "language": repo.language is not None and self.dimensions.contains("language", repo.language),
+            "license": repo.license is not None and self.dimensions.contains("license", repo.license.spdxId),
+            "topics": [topic for topic in repo.topics if self.dimensions.contains("topic", topic)],
+        }
 
     @staticmethod
-    def __createRepo(tx, repo: Repo):
-        query = """
-        MERGE (owner {id: $owner_id, name: $owner_name})
-        CREATE (repo:Repository {
-            id: $repo_id,
-            name: $repo_name,
-            fullName: $repo_fullName,
-            description: $repo_desc,
-            homepage: $repo_homepage,
-            defaultBranch: $repo_branch
-        }),
-        (owner)-[:OWNS]->(repo)
+    def __createRepo(tx, repo: Repo, known: Dict):
+        query = f"""
+        {ownerClause("owner", repo.owner.type, "$owner_id", "$owner_name", known["owner"])}
+        MERGE (repo:Repository {{id: $repo_id}})
+        SET repo.name = $repo_name
+        SET repo.fullName = $repo_fullName
+        SET repo.description = $repo_desc
+        SET repo.homepage = $repo_homepage
+        SET repo.defaultBranch = $repo_branch
+        MERGE (owner)-[:OWNS]->(repo)
         """
-        if repo.language is not None:
+        if repo.language is not None and known["language"]:
+            query += """
+            WITH repo
+            MATCH (lang:Language {name: $lang})
+            MERGE (repo)-[:IS_WRITTEN_IN]->(lang)
+            """
+        elif repo.language is not None:
             query += """
             
             MERGE (lang:Language {name: $lang})
-            CREATE (repo)-[:IS_WRITTEN_IN]->(lang)          
+            MERGE (repo)-[:IS_WRITTEN_IN]->(lang)          
             
             """
-        query += f" SET owner :{repo.owner.type} "
         licenseKey = None
         licenseName = None
         licenseUrl = None
         licenseSpdxId = None
-        if repo.license is not None:
+        # License has no relationship to the repo, once written there is nothing left to do
+        if repo.license is not None and not known["license"]:
             query += """
             
             MERGE (l:License{
@@ -137,6 +267,18 @@ class Neo4JConnection:
             licenseName = repo.license.name
             licenseUrl = repo.license.url
             licenseSpdxId = repo.license.spdxId
+        # Topics are part of the same statement instead of one statement per topic matching the repo again.
+        # Known ones go last, UNWIND of an empty list ends the statement
+        query += """
+        FOREACH (topicName IN $topics |
+            MERGE (t:Topic {name: topicName})
+            MERGE (repo)-[:RELATES_TO]->(t)
+        )
+        WITH repo
+        UNWIND $known_topics AS topicName
+        MATCH (t:Topic {name: topicName})
+        MERGE (repo)-[:RELATES_TO]->(t)
+        """
         tx.run(query,
                owner_id=repo.owner.id,
                owner_name=repo.owner.name,
@@ -151,44 +293,33 @@ class Neo4JConnection:
                l_key=licenseKey,
                l_name=licenseName,
                l_url=licenseUrl,
-               l_spdxId=licenseSpdxId
+               l_spdxId=licenseSpdxId,
+               topics=[topic for topic in repo.topics if topic not in known["topics"]],
+               known_topics=known["topics"]
                )
-        Neo4JConnection.__createRepoTopics(tx, repo)
-
-    @staticmethod
-    def __createRepoTopics(tx, repo: Repo):
-        for topic in repo.topics:
-            query = """
-            MATCH (r:Repository) WHERE r.fullName = $r_fullName
-            MERGE (t:Topic {name: $t_name})
-            CREATE (r)-[:RELATES_TO]->(t)
-            """
-            tx.run(query, t_name=topic, r_fullName=repo.fullName)
 
     def createContributorLink(self, repo: Repo, contributor: User):
-        with self.driver.session() as s:
-            s.write_transaction(self.__createContributorLink, repo, contributor)
-        pass
+        self.timedWrite("relations", self.__createContributorLink, repo, contributor,
+                        self.dimensions.contains("user", contributor.id), written=[("user", contributor.id)])
 
     @staticmethod
-    def __createContributorLink(tx, repo: Repo, contributor: User):
-        Neo4JConnection.__createRelationBetweenUserAndRepo(tx, repo, contributor, "CONTRIBUTES")
+    def __createContributorLink(tx, repo: Repo, contributor: User, userKnown: bool):
+        Neo4JConnection.__createRelationBetweenUserAndRepo(tx, repo, contributor, "CONTRIBUTES", userKnown)
 
     def createSubscriberLink(self, repo: Repo, user: User):
-        with self.driver.session() as s:
-            s.write_transaction(self.__createSubscriberLink, repo, user)
+        self.timedWrite("relations", self.__createSubscriberLink, repo, user,
+                        self.dimensions.contains("user", user.id), written=[("user", user.id)])
 
     @staticmethod
-    def __createSubscriberLink(tx, repo: Repo, subscriber: User):
-        Neo4JConnection.__createRelationBetweenUserAndRepo(tx, repo, subscriber, "SUBSCRIBES")
+    def __createSubscriberLink(tx, repo: Repo, subscriber: User, userKnown: bool):
+        Neo4JConnection.__createRelationBetweenUserAndRepo(tx, repo, subscriber, "SUBSCRIBES", userKnown)
 
     @staticmethod
-    def __createRelationBetweenUserAndRepo(tx, repo: Repo, user: User, relationName: str):
+    def __createRelationBetweenUserAndRepo(tx, repo: Repo, user: User, relationName: str, userKnown: bool):
         query = f"""
                MATCH (repo:Repository) WHERE repo.fullName = $repo_fullName
-               MERGE (user {{ id: $user_id, name: $user_name}})
-               SET user :{user.type}
-               CREATE (user)-[:{relationName}]->(repo)
+               {ownerClause("user", user.type, "$user_id", "$user_name", userKnown)}
+               MERGE (user)-[:{relationName}]->(repo)
                """
         tx.run(query,
                repo_fullName=repo.fullName,
@@ -196,22 +327,19 @@ class Neo4JConnection:
                user_name=user.name)
 
     def createIssue(self, repo: Repo, issue: Issue):
-        with self.driver.session() as s:
-            s.write_transaction(self.__createIssue, repo, issue)
+        self.timedWrite("items", self.__createIssue, repo, issue, self.dimensions.contains("user", issue.user.id),
+                        written=[("user", issue.user.id)])
 
     @staticmethod
-    def __createIssue(tx, repo: Repo, issue: Issue):
+    def __createIssue(tx, repo: Repo, issue: Issue, creatorKnown: bool):
         query = f"""
         MATCH (repo:Repository) WHERE repo.id = $repo_id
-        MERGE (creator {{id: $c_id, name: $c_name}})
-        SET creator :{issue.user.type}
-        CREATE (issue:Issue {{
-            name: $is_name,
-            body: $is_body,
-            id: $is_id
-        }}),
-        (repo)-[:HAS]->(issue),
-        (creator)-[:CREATED]->(issue)
+        {ownerClause("creator", issue.user.type, "$c_id", "$c_name", creatorKnown)}
+        MERGE (issue:Issue {{id: $is_id}})
+        SET issue.name = $is_name
+        SET issue.body = $is_body
+        MERGE (repo)-[:HAS]->(issue)
+        MERGE (creator)-[:CREATED]->(issue)
         """
         tx.run(query,
                repo_id=repo.id,
@@ -222,22 +350,19 @@ class Neo4JConnection:
                is_id=issue.id)
 
     def createPullRequest(self, repo: Repo, pullRequest: PullRequest):
-        with self.driver.session() as s:
-            s.write_transaction(self.__createPullRequest, repo, pullRequest)
+        self.timedWrite("items", self.__createPullRequest, repo, pullRequest,
+                        self.dimensions.contains("user", pullRequest.user.id), written=[("user", pullRequest.user.id)])
 
     @staticmethod
-    def __createPullRequest(tx, repo: Repo, pullRequest: PullRequest):
+    def __createPullRequest(tx, repo: Repo, pullRequest: PullRequest, creatorKnown: bool):
         query = f"""
         MATCH (repo:Repository) WHERE repo.id = $repo_id
-        MERGE (creator {{id: $c_id, name: $c_name}})
-        SET creator :{pullRequest.user.type}
-        CREATE (pr:PullRequest {{
-            name: $pr_name,
-            body: $pr_body,
-            id: $pr_id
-        }}),
-        (repo)-[:HAS]->(pr),
-        (creator)-[:CREATED]->(pr)
+        {ownerClause("creator", pullRequest.user.type, "$c_id", "$c_name", creatorKnown)}
+        MERGE (pr:PullRequest {{id: $pr_id}})
+        SET pr.name = $pr_name
+        SET pr.body = $pr_body
+        MERGE (repo)-[:HAS]->(pr)
+        MERGE (creator)-[:CREATED]->(pr)
         """
         tx.run(query,
                repo_id=repo.id,
@@ -248,125 +373,713 @@ class Neo4JConnection:
                pr_id=pullRequest.id)
 
 
+    def deleteRepo(self, repoId: int):
+        self.__write("MATCH (repo:Repository {id: $repo_id}) DETACH DELETE repo", repo_id=repoId)
+
+    def deleteIssue(self, issueId: int):
+        self.__write("MATCH (issue:Issue {id: $is_id}) DETACH DELETE issue", is_id=issueId)
+
+    def deletePullRequest(self, pullRequestId: int):
+        self.__write("MATCH (pr:PullRequest {id: $pr_id}) DETACH DELETE pr", pr_id=pullRequestId)
+
+    def deleteGist(self, gistId: str):
+        self.clearGistFiles(gistId)
+        self.__write("MATCH (g:Gist {id: $gist_id}) DETACH DELETE g", gist_id=gistId)
+
+    def deleteContributorLink(self, repoId: int, userId: int):
+        self.__deleteRelationBetweenUserAndRepo(repoId, userId, "CONTRIBUTES")
+
+    def deleteSubscriberLink(self, repoId: int, userId: int):
+        self.__deleteRelationBetweenUserAndRepo(repoId, userId, "SUBSCRIBES")
+
+    def __deleteRelationBetweenUserAndRepo(self, repoId: int, userId: int, relationName: str):
+        query = f"""
+        MATCH (repo:Repository {{id: $repo_id}})<-[rel:{relationName}]-(user)
+        WHERE user.id = $user_id
+        DELETE rel
+        """
+        self.__write(query, repo_id=repoId, user_id=userId)
+
+    def clearRepoLinks(self, repoId: int):
+        # Language and topics of changed repo are MERGEd again, old ones would stay otherwise
+        query = """
+        MATCH (repo:Repository {id: $repo_id})-[rel:IS_WRITTEN_IN|RELATES_TO]->()
+        DELETE rel
+        """
+        self.__write(query, repo_id=repoId)
+
+    def clearGistFiles(self, gistId: str):
+        query = """
+        MATCH (:Gist {id: $gist_id})-[:CONTAINS]->(gf:GistFile)
+        DETACH DELETE gf
+        """
+        self.__write(query, gist_id=gistId)
+
+    def __write(self, query: str, **params):
+        self.timedWrite("deletes", lambda tx: tx.run(query, **params).consume())
+
+    def timedWrite(self, statement: str, work, *args, written: List[Tuple[str, object]] = None):
+        # One transaction, its time goes to the statement type in the run report
+        with metrics.timed("cypher_seconds", {"statement": statement}), self.driver.session() as s:
+            s.write_transaction(work, *args)
+        metrics.increment("rows_written_total", labels={"statement": statement})
+        if written is not None:
+            self.dimensions.addMany(written)
+
+
+class BatchedNeo4JConnection(Neo4JConnection):
+    """
+    Drop-in replacement for Neo4JConnection that collects rows per entity type
+    and writes them with UNWIND statements in large transactions instead of
+    one transaction per entity. Produces the same graph as Neo4JConnection.
+    """
+
+    USERS_QUERY = """
+    UNWIND $rows AS row
+    MERGE (a:{label} {{id: row.id}})
+    SET a.blog = row.blog
+    SET a.email = row.email
+    SET a.name = row.login
+    """
+
+    # {owner}, {user} and {creator} are MERGE or MATCH from ownerClause
+    GISTS_QUERY = """
+    UNWIND $rows AS row
+    {owner}
+    MERGE (g:Gist {{id: row.gist_id}})
+    SET g.description = row.gist_description
+    MERGE (owner)-[:CREATED]->(g)
+    FOREACH (file IN row.files |
+        MERGE (lang:Language {{name: file.lang}})
+        MERGE (g)-[:CONTAINS]->(gf:GistFile {{name: file.gf_name}})
+        SET gf.type = file.gf_type
+        SET gf.size = file.gf_size
+        MERGE (gf)-[:IS_WRITTEN_IN]->(lang)
+    )
+    """
+
+    REPOS_QUERY = """
+    UNWIND $rows AS row
+    {owner}
+    MERGE (repo:Repository {{id: row.repo_id}})
+    SET repo.name = row.repo_name
+    SET repo.fullName = row.repo_fullName
+    SET repo.description = row.repo_desc
+    SET repo.homepage = row.repo_homepage
+    SET repo.defaultBranch = row.repo_branch
+    MERGE (owner)-[:OWNS]->(repo)
+    FOREACH (langName IN CASE WHEN row.lang IS NULL THEN [] ELSE [row.lang] END |
+        MERGE (lang:Language {{name: langName}})
+        MERGE (repo)-[:IS_WRITTEN_IN]->(lang)
+    )
+    FOREACH (lic IN CASE WHEN row.license IS NULL THEN [] ELSE [row.license] END |
+        MERGE (l:License {{spdxId: lic.spdxId}})
+        ON CREATE SET l.key = lic.key, l.name = lic.name, l.url = lic.url
+    )
+    FOREACH (topicName IN row.topics |
+        MERGE (t:Topic {{name: topicName}})
+        MERGE (repo)-[:RELATES_TO]->(t)
+    )
+    WITH repo, row
+    OPTIONAL MATCH (knownLang:Language {{name: row.known_lang}})
+    FOREACH (lang IN CASE WHEN knownLang IS NULL THEN [] ELSE [knownLang] END |
+        MERGE (repo)-[:IS_WRITTEN_IN]->(lang)
+    )
+    WITH repo, row
+    UNWIND row.known_topics AS topicName
+    MATCH (t:Topic {{name: topicName}})
+    MERGE (repo)-[:RELATES_TO]->(t)
+    """
+
+    USER_REPO_RELATIONS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (repo:Repository) WHERE repo.fullName = row.repo_fullName
+    {user}
+    MERGE (user)-[:{relation}]->(repo)
+    """
+
+    REPO_ITEMS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (repo:Repository) WHERE repo.id = row.repo_id
+    {creator}
+    MERGE (item:{itemLabel} {{id: row.item_id}})
+    SET item.name = row.item_name
+    SET item.body = row.item_body
+    MERGE (repo)-[:HAS]->(item)
+    MERGE (creator)-[:CREATED]->(item)
+    """
+
+    # Deletes of the delta import (delta_importer.py), rows are ids or {repo_id, user_id}
+    DELETE_QUERIES = {
+        "repo": "UNWIND $rows AS row MATCH (repo:Repository {id: row}) DETACH DELETE repo",
+        "issue": "UNWIND $rows AS row MATCH (issue:Issue {id: row}) DETACH DELETE issue",
+        "pull": "UNWIND $rows AS row MATCH (pr:PullRequest {id: row}) DETACH DELETE pr",
+        "gist": """
+        UNWIND $rows AS row
+        MATCH (g:Gist {id: row})
+        OPTIONAL MATCH (g)-[:CONTAINS]->(gf:GistFile)
+        WITH g, collect(gf) AS files
+        FOREACH (gf IN files | DETACH DELETE gf)
+        DETACH DELETE g
+        """,
+        "contributor": """
+        UNWIND $rows AS row
+        MATCH (repo:Repository {id: row.repo_id})<-[rel:CONTRIBUTES]-(user)
+        WHERE user.id = row.user_id
+        DELETE rel
+        """,
+        "subscriber": """
+        UNWIND $rows AS row
+        MATCH (repo:Repository {id: row.repo_id})<-[rel:SUBSCRIBES]-(user)
+        WHERE user.id = row.user_id
+        DELETE rel
+        """,
+        "repoLinks": """
+        UNWIND $rows AS row
+        MATCH (repo:Repository {id: row})-[rel:IS_WRITTEN_IN|RELATES_TO]->()
+        DELETE rel
+        """,
+        "gistFiles": """
+        UNWIND $rows AS row
+        MATCH (:Gist {id: row})-[:CONTAINS]->(gf:GistFile)
+        DETACH DELETE gf
+        """,
+    }
+
+    # Order in which buffers are flushed, nodes that later rows MATCH on go first.
+    # Deletes run before everything else, links cleared there are MERGEd again by the rows after them
+    FLUSH_ORDER = ["deletes", "users", "repos", "gists", "relations", "items"]
+
+    def __init__(self, driver=None, batchSize: int = 5000, journal: ImportJournal = None, wholeUsers: bool = False):
+        super().__init__(driver, journal)
+        self.batchSize = batchSize
+        # With wholeUsers batches are flushed only in finishUser, so all rows of a user commit together
+        self.wholeUsers = wholeUsers
+        self.buffers = {kind: {} for kind in self.FLUSH_ORDER}
+        self.bufferedRows = 0
+        self.batchesWritten = 0
+        self.failedBatches = 0
+        # Users whose rows are all buffered, they go to journal once the batch is committed
+        self.finishedUsers = []
+        # Dimensions written by buffered rows, MATCHed only after the batch is committed
+        self.pendingDimensions = []
+        # Rows of the user that is not finished yet, in the current batch
+        self.unfinishedRows = 0
+        # Set when a batch with rows of the unfinished user failed, so the user is partly lost
+        self.batchFailed = False
+
+    def finishUser(self, userName: str):
+        if self.batchFailed:
+            print("[BATCH]", f"[{userName}]", "part of the rows were in a failed batch, not journaling", file=sys.stderr)
+            self.batchFailed = False
+        else:
+            self.finishedUsers.append(userName)
+        self.unfinishedRows = 0
+        if self.bufferedRows == 0 or (self.wholeUsers and self.bufferedRows >= self.batchSize):
+            self.flush()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+    def __add(self, kind: str, query: str, row: Dict, written: List[Tuple[str, object]]):
+        self.buffers[kind].setdefault(query, []).append(row)
+        self.pendingDimensions.extend(written)
+        self.bufferedRows += 1
+        self.unfinishedRows += 1
+        if self.bufferedRows >= self.batchSize and not self.wholeUsers:
+            self.flush()
+
+    def flush(self):
+        buffers, bufferedRows = self.buffers, self.bufferedRows
+        pendingDimensions, finishedUsers = self.pendingDimensions, self.finishedUsers
+        unfinishedRows = self.unfinishedRows
+        # Reset first, a batch that failed is dropped and not sent again with the next one
+        self.buffers = {kind: {} for kind in self.FLUSH_ORDER}
+        self.bufferedRows = 0
+        self.pendingDimensions = []
+        self.finishedUsers = []
+        self.unfinishedRows = 0
+        if bufferedRows > 0:
+            try:
+                writeWithRetries(self.driver, self.__writeBuffers, buffers)
+            except Exception:
+                # Users in this batch are not journaled, so the next run imports them again
+                print("[BATCH]", f"batch with {bufferedRows} rows failed, not journaling {len(finishedUsers)} users",
+                      file=sys.stderr)
+                self.failedBatches += 1
+                self.batchFailed = self.batchFailed or unfinishedRows > 0
+                raise
+            for kind, queries in buffers.items():
+                rowsCount = sum(len(rows) for rows in queries.values())
+                if rowsCount > 0:
+                    metrics.increment("rows_written_total", rowsCount, {"statement": kind})
+            self.batchesWritten += 1
+            print("[BATCH]", f"batch {self.batchesWritten} with {bufferedRows} rows committed")
+            self.dimensions.addMany(pendingDimensions)
+        if self.journal is not None:
+            self.journal.markImported(finishedUsers)
+
+    @staticmethod
+    def __writeBuffers(tx, buffers: Dict):
+        for kind in BatchedNeo4JConnection.FLUSH_ORDER:
+            for query, rows in buffers[kind].items():
+                # Consumed right away, so the time is of this statement and not of the commit
+                with metrics.timed("cypher_seconds", {"statement": kind}):
+                    tx.run(query, rows=rows).consume()
+
+    def createUserOrOrg(self, user: User):
+        self.__add("users", self.USERS_QUERY.format(label=user.type), {
+            "id": user.id,
+            "blog": user.blog,
+            "login": user.name,
+            "email": user.email,
+        }, [("user", user.id)])
+
+    def createGist(self, user: User, gist: Gist):
+        owner = ownerClause("owner", user.type, "row.user_id", "row.user_name", self.dimensions.contains("user", user.id))
+        self.__add("gists", self.GISTS_QUERY.format(owner=owner), {
+            "user_name": user.name,
+            "user_id": user.id,
+            "gist_id": gist.id,
+            "gist_description": gist.description,
+            "files": getGistFileRows(gist),
+        }, [("user", user.id)] + [("language", file.language) for file in gist.files])
+
+    def createRepo(self, repo: Repo):
+        known = self.getKnownRepoDimensions(repo)
+        license = None
+        if repo.license is not None and not known["license"]:
+            license = {
+                "key": repo.license.key,
+                "name": repo.license.name,
+                "url": repo.license.url,
+                "spdxId": repo.license.spdxId,
+            }
+        owner = ownerClause("owner", repo.owner.type, "row.owner_id", "row.owner_name", known["owner"])
+        self.__add("repos", self.REPOS_QUERY.format(owner=owner), {
+            "owner_id": repo.owner.id,
+            "owner_name": repo.owner.name,
+            "repo_id": repo.id,
+            "repo_name": repo.name,
+            "repo_fullName": repo.fullName,
+            "repo_desc": repo.description,
+            "repo_homepage": repo.homepage,
+            "repo_branch": repo.defaultBranch,
+            "lang": None if known["language"] else repo.language,
+            "known_lang": repo.language if known["language"] else None,
+            "license": license,
+            "topics": [topic for topic in repo.topics if topic not in known["topics"]],
+            "known_topics": known["topics"],
+        }, getRepoDimensions(repo))
+
+    def createContributorLink(self, repo: Repo, contributor: User):
+        self.__addRelationBetweenUserAndRepo(repo, contributor, "CONTRIBUTES")
+
+    def createSubscriberLink(self, repo: Repo, user: User):
+        self.__addRelationBetweenUserAndRepo(repo, user, "SUBSCRIBES")
+
+    def __addRelationBetweenUserAndRepo(self, repo: Repo, user: User, relationName: str):
+        known = self.dimensions.contains("user", user.id)
+        query = self.USER_REPO_RELATIONS_QUERY.format(
+            user=ownerClause("user", user.type, "row.user_id", "row.user_name", known), relation=relationName)
+        self.__add("relations", query, {
+            "repo_fullName": repo.fullName,
+            "user_id": user.id,
+            "user_name": user.name,
+        }, [("user", user.id)])
+
+    def createIssue(self, repo: Repo, issue: Issue):
+        self.__addRepoItem(repo, issue, "Issue")
+
+    def createPullRequest(self, repo: Repo, pullRequest: PullRequest):
+        self.__addRepoItem(repo, pullRequest, "PullRequest")
+
+    def __addRepoItem(self, repo: Repo, item, itemLabel: str):
+        known = self.dimensions.contains("user", item.user.id)
+        query = self.REPO_ITEMS_QUERY.format(
+            creator=ownerClause("creator", item.user.type, "row.c_id", "row.c_name", known), itemLabel=itemLabel)
+        self.__add("items", query, {
+            "repo_id": repo.id,
+            "c_id": item.user.id,
+            "c_name": item.user.name,
+            "item_name": item.title,
+            "item_body": item.body,
+            "item_id": item.id,
+        }, [("user", item.user.id)])
+
+    def deleteRepo(self, repoId: int):
+        self.__add("deletes", self.DELETE_QUERIES["repo"], repoId, [])
+
+    def deleteIssue(self, issueId: int):
+        self.__add("deletes", self.DELETE_QUERIES["issue"], issueId, [])
+
+    def deletePullRequest(self, pullRequestId: int):
+        self.__add("deletes", self.DELETE_QUERIES["pull"], pullRequestId, [])
+
+    def deleteGist(self, gistId: str):
+        self.__add("deletes", self.DELETE_QUERIES["gist"], gistId, [])
+
+    def deleteContributorLink(self, repoId: int, userId: int):
+        self.__add("deletes", self.DELETE_QUERIES["contributor"], {"repo_id": repoId, "user_id": userId}, [])
+
+    def deleteSubscriberLink(self, repoId: int, userId: int):
+        self.__add("deletes", self.DELETE_QUERIES["subscriber"], {"repo_id": repoId, "user_id": userId}, [])
+
+    def clearRepoLinks(self, repoId: int):
+        self.__add("deletes", self.DELETE_QUERIES["repoLinks"], repoId, [])
+
+    def clearGistFiles(self, gistId: str):
+        self.__add("deletes", self.DELETE_QUERIES["gistFiles"], gistId, [])
+
+
+def getRepoDimensions(repo: Repo) -> List[Tuple[str, object]]:
+    dimensions = [("user", repo.owner.id)] + [("topic", topic) for topic in repo.topics]
+    if repo.language is not None:
+        dimensions.append(("language", repo.language))
+    if repo.license is not None:
+        dimensions.append(("license", repo.license.spdxId))
+    return dimensions
+
+
+def getGistFileRows(gist: Gist) -> List[Dict]:
+    return [{
+        "gf_name": file.name,
+        "lang": file.language,
+        "gf_type": file.type,
+        "gf_size": file.size,
+    } for file in gist.files]
+
+
+def writeWithRetries(driver, work, *args):
+    # Driver retries transient errors on its own only for a limited time, under heavy
+    # contention between workers batches are retried again after a jittered backoff
+    for attempt in range(IMPORT_RETRIES):
+        try:
+            with driver.session() as ses:
+                return ses.write_transaction(work, *args)
+        except TransientError as e:
+            if attempt == IMPORT_RETRIES - 1:
+                raise
+            delay = RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+            metrics.increment("transaction_retries_total")
+            print("[RETRY]", f"attempt {attempt + 1} failed, retrying in {delay:.2f}s:", e.code, file=sys.stderr)
+            sleep(delay)
+
+
+class SharedNodes:
+    # Nodes MERGEd by subgraphs of many users, created before parallel import
+    # so workers only match them instead of racing to create them
+    def __init__(self):
+        self.languages = set()
+        self.topics = set()
+        self.licenses = {}
+        self.users = {}
+
+    def addUser(self, user: User):
+        self.users[user.id] = user
+
+    def addRepo(self, repo: Repo):
+        self.addUser(repo.owner)
+        if repo.language is not None:
+            self.languages.add(repo.language)
+        if repo.license is not None and repo.license.spdxId is not None:
+            self.licenses[repo.license.spdxId] = repo.license
+        self.topics.update(repo.topics)
+
+    def addGist(self, gist: Gist):
+        self.addUser(gist.owner)
+        for file in gist.files:
+            self.languages.add(file.language)
+
+    def getDimensions(self) -> List[Tuple[str, object]]:
+        return ([("language", language) for language in self.languages] +
+                [("topic", topic) for topic in self.topics] +
+                [("license", spdxId) for spdxId in self.licenses] +
+                [("user", userId) for userId in self.users])
+
+
+SHARED_NODES_QUERIES = {
+    "languages": "UNWIND $rows AS row MERGE (lang:Language {name: row})",
+    "topics": "UNWIND $rows AS row MERGE (t:Topic {name: row})",
+    "licenses": """
+    UNWIND $rows AS row
+    MERGE (l:License {spdxId: row.spdxId})
+    ON CREATE SET l.key = row.key, l.name = row.name, l.url = row.url
+    """,
+    "users": """
+    UNWIND $rows AS row
+    MERGE (u:{label} {{id: row.id}})
+    ON CREATE SET u.name = row.name
+    """,
+}
+
+
+def collectSharedNodes(userNames: List[str]) -> SharedNodes:
+    if IMPORT_FROM_SNAPSHOT:
+        return collectSharedNodesFromSnapshot(userNames)
+    shared = SharedNodes()
+    for userName in userNames:
+        for gist in (Gist(g) for g in iterCachedItems(f"users__{userName}__gists")):
+            shared.addGist(gist)
+        for repo in (Repo(r) for r in iterCachedItems(f"users__{userName}__repos")):
+            shared.addRepo(repo)
+            for endpoint in ["contributors", "subscribers"]:
+                for user in (internUser(u) for u in iterCachedItems(getRepoCacheName(repo, endpoint))):
+                    shared.addUser(user)
+            for endpoint in ["issues", "pulls"]:
+                for item in iterCachedItems(getRepoCacheName(repo, endpoint)):
+                    shared.addUser(internUser(item["user"]))
+    return shared
+
+
+def collectSharedNodesFromSnapshot(userNames: List[str]) -> SharedNodes:
+    shared = SharedNodes()
+    for account in filter(None, map(getSnapshot().findAccount, userNames)):
+        for gist in account.gists:
+            shared.addGist(gist)
+        for repo in account.repos:
+            shared.addRepo(repo)
+            for user in chain(repo.contributors, repo.subscribers):
+                shared.addUser(user)
+            for item in chain(repo.issues, repo.pullRequests):
+                shared.addUser(item.user)
+    return shared
+
+
+def createSharedNodes(driver, shared: SharedNodes, batchSize: int = IMPORT_BATCH_SIZE):
+    for query, rows in getSharedNodesBatches(shared, batchSize):
+        writeWithRetries(driver, runUnwind, query, rows)
+    print("[SHARED]", len(shared.languages), "languages,", len(shared.topics), "topics,",
+          len(shared.licenses), "licenses,", len(shared.users), "users")
+
+
+def getSharedNodesBatches(shared: SharedNodes, batchSize: int = IMPORT_BATCH_SIZE) -> List[Tuple[str, List]]:
+    batches = [
+        (SHARED_NODES_QUERIES["languages"], sorted(shared.languages)),
+        (SHARED_NODES_QUERIES["topics"], sorted(shared.topics)),
+        (SHARED_NODES_QUERIES["licenses"], [
+            {"spdxId": l.spdxId, "key": l.key, "name": l.name, "url": l.url} for l in shared.licenses.values()
+        ]),
+    ]
+    usersByLabel = {}
+    for user in shared.users.values():
+        usersByLabel.setdefault(user.type, []).append({"id": user.id, "name": user.name})
+    for label, rows in usersByLabel.items():
+        batches.append((SHARED_NODES_QUERIES["users"].format(label=label), rows))
+
+    batchSize = max(batchSize, 1)
+    return [(query, rows[i:i + batchSize]) for query, rows in batches for i in range(0, len(rows), batchSize)]
+
+
+def runUnwind(tx, query: str, rows: List):
+    tx.run(query, rows=rows)
+
+
+def importUsersInParallel(userNames: List[str], driver, workers: int = IMPORT_WORKERS,
+                          batchSize: int = IMPORT_BATCH_SIZE, journal: ImportJournal = None):
+    print("[PARALLEL]", "collecting shared nodes")
+    shared = collectSharedNodes(userNames)
+    createSharedNodes(driver, shared, batchSize)
+    sharedDimensions = shared.getDimensions()
+
+    pending = Queue()
+    for userName in userNames:
+        pending.put(userName)
+    errors = []
+
+    def work():
+        # Workers share the driver (it is thread safe) but buffer rows separately,
+        # users are taken from the queue so one big account does not stall a whole partition
+        workerConn = BatchedNeo4JConnection(driver, batchSize, journal)
+        # Shared nodes are committed already, workers MATCH them from the first row
+        workerConn.dimensions.addMany(sharedDimensions)
+        while True:
+            try:
+                userName = pending.get_nowait()
+            except Empty:
+                break
+            try:
+                importUserWithData(userName, workerConn)
+                workerConn.finishUser(userName)
+            except Exception as e:
+                errors.append((userName, e))
+                print("[PARALLEL]", f"[{userName}]", "import failed:", e, file=sys.stderr)
+            if workerConn.failedBatches > 0:
+                # Batch of this worker was dropped, remaining users are left to workers that still write
+                print("[PARALLEL]", "stopping worker after failed batch", file=sys.stderr)
+                return
+        try:
+            workerConn.flush()
+        except Exception as e:
+            errors.append(("last batch", e))
+            print("[PARALLEL]", "last batch failed:", e, file=sys.stderr)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if len(errors) > 0:
+        raise Exception(f"{len(errors)} users failed to import, first: {errors[0][0]}, "
+                        f"{pending.qsize()} users left in queue")
+
+
+def collectPlanOperators(plan) -> List[str]:
+    if plan is None:
+        return []
+    # Operator names carry planner suffixes, e.g. "NodeIndexSeek@neo4j"
+    operators = [plan["operatorType"].split("@")[0]]
+    for child in plan.get("children", []):
+        operators += collectPlanOperators(child)
+    return operators
+
+
+def printQueryPlans(conn: Neo4JConnection, title: str):
+    for name, operators in conn.explainLookups().items():
+        scans = [op for op in operators if op in SCANNING_OPERATORS]
+        status = "SCAN" if len(scans) > 0 else "OK"
+        print("[PLAN]", f"[{title}]", f"[{status}]", name, "->", ", ".join(operators))
+
+
 def importRepositories(conn: Neo4JConnection, user: User):
-    filePath = os.path.join(".cached_results", f"users__{user.name}__repos.json")
-    if not os.path.exists(filePath):
+    cacheName = f"users__{user.name}__repos"
+    if not isCached(cacheName):
         print("[REPO]", f"[{user.name}]", "User has no repos file, skipping", file=sys.stderr)
         return
-    with open(filePath) as f:
-        print("[REPO]", f"[{user.name}] reading from disc")
-        repos = [Repo(r) for r in json.loads(f.read())]
-        for repo in repos:
-            print("[REPO]", f"[{repo.fullName}]", "importing to neo4j")
-            conn.createRepo(repo)
-            importSubscribers(conn, repo)
-            importPullRequests(conn, repo)
-            importIssues(conn, repo)
-            try:
-                importContributors(conn, repo)
-            except (Exception) as e:
-                print("[CONTR]", f"[{repo.fullName}]", "failed to load contributors", file=sys.stderr)
-                print(str(e), file=sys.stderr)
+    logVerbose("[REPO]", f"[{user.name}] reading from disc")
+    for repo in (Repo(r) for r in iterCachedItems(cacheName)):
+        logVerbose("[REPO]", f"[{repo.fullName}]", "importing to neo4j")
+        conn.createRepo(repo)
+        importSubscribers(conn, repo)
+        importPullRequests(conn, repo)
+        importIssues(conn, repo)
+        try:
+            importContributors(conn, repo)
+        except (Exception) as e:
+            print("[CONTR]", f"[{repo.fullName}]", "failed to load contributors", file=sys.stderr)
+            print(str(e), file=sys.stderr)
 
     pass
 
 
 def importGists(conn: Neo4JConnection, user: User):
-    pathToFileWIthGists = os.path.join(".cached_results", f"users__{user.name}__gists.json")
-    if not os.path.exists(pathToFileWIthGists):
-        print("[GIST]", f"[{user.name}]", "gists dont exist, skipping")
+    cacheName = f"users__{user.name}__gists"
+    if not isCached(cacheName):
+        logVerbose("[GIST]", f"[{user.name}]", "gists dont exist, skipping")
         return
-    with open(pathToFileWIthGists) as gistsFile:
-        parsedGists = json.loads(gistsFile.read())
-        gists = [Gist(g) for g in parsedGists]
-        for gist in gists:
-            print("[GIST]", f"[{user.name}] importing {gist.id}")
-            conn.createGist(user, gist)
-            for file in gist.files:
-                conn.createGistFile(gist, file)
+    for gist in (Gist(g) for g in iterCachedItems(cacheName)):
+        logVerbose("[GIST]", f"[{user.name}] importing {gist.id}")
+        conn.createGist(user, gist)
 
 
 def importContributors(conn: Neo4JConnection, repo: Repo):
-    safeName = repo.fullName.replace("/", "__")
-    fileWithContributions = os.path.join(".cached_results", f"repos__{safeName}__contributors.json")
-    if not os.path.exists(fileWithContributions):
-        print("[CONTR]", f"[{repo.fullName}]", "no contributors, skipping")
+    cacheName = getRepoCacheName(repo, "contributors")
+    if not isCached(cacheName):
+        logVerbose("[CONTR]", f"[{repo.fullName}]", "no contributors, skipping")
         return
-    with open(fileWithContributions) as f:
-        fileContent = f.read().strip()
-        if fileContent == "":
-            return
-        contrsAsJson = json.loads(fileContent)
-        contrs = [User(c) for c in contrsAsJson]
-        for contr in contrs:
-            print("[CONTR]", f"[{repo.fullName}]", f"[{contr.name}]", "importing")
-            conn.createContributorLink(repo, contr)
+    for contr in (internUser(c) for c in iterCachedItems(cacheName)):
+        logVerbose("[CONTR]", f"[{repo.fullName}]", f"[{contr.name}]", "importing")
+        conn.createContributorLink(repo, contr)
 
 
 def importIssues(conn: Neo4JConnection, repo: Repo):
-    safeName = repo.fullName.replace("/", "__")
-    fileWithIssues = os.path.join(".cached_results", f"repos__{safeName}__issues.json")
-    if not os.path.exists(fileWithIssues):
-        print("[ISSUE]", f"[{repo.fullName}]", "file does not exist, skipping")
+    cacheName = getRepoCacheName(repo, "issues")
+    if not isCached(cacheName):
+        logVerbose("[ISSUE]", f"[{repo.fullName}]", "file does not exist, skipping")
         return
-    with open(fileWithIssues) as f:
-        issues = [Issue(i, repo.fullName) for i in json.loads(f.read())]
-        for issue in issues:
-            print("[ISSUE]", f"[{repo.fullName}]", "importing issue", issue.id)
-            conn.createIssue(repo, issue)
+    for issue in (Issue(i, repo.fullName) for i in iterCachedItems(cacheName)):
+        logVerbose("[ISSUE]", f"[{repo.fullName}]", "importing issue", issue.id)
+        conn.createIssue(repo, issue)
 
 
 def importPullRequests(conn: Neo4JConnection, repo: Repo):
-    safeName = repo.fullName.replace("/", "__")
-    fileWithPulls = os.path.join(".cached_results", f"repos__{safeName}__pulls.json")
-    if not os.path.exists(fileWithPulls):
-        print("[PULL]", f"[{repo.fullName}]", "file does not exist, skipping")
+    cacheName = getRepoCacheName(repo, "pulls")
+    if not isCached(cacheName):
+        logVerbose("[PULL]", f"[{repo.fullName}]", "file does not exist, skipping")
         return
-    with open(fileWithPulls) as f:
-        pullRequests = [PullRequest(p, repo.fullName) for p in json.loads(f.read())]
-        for pullRequest in pullRequests:
-            print("[PULL]", f"[{repo.fullName}]", "importing pull request", pullRequest.id)
-            conn.createPullRequest(repo, pullRequest)
+    for pullRequest in (PullRequest(p, repo.fullName) for p in iterCachedItems(cacheName)):
+        logVerbose("[PULL]", f"[{repo.fullName}]", "importing pull request", pullRequest.id)
+        conn.createPullRequest(repo, pullRequest)
     pass
 
 
 def importSubscribers(conn: Neo4JConnection, repo: Repo):
-    safeName = repo.fullName.replace("/", "__")
-    fileWithContributions = os.path.join(".cached_results", f"repos__{safeName}__subscribers.json")
-    if not os.path.exists(fileWithContributions):
-        print("[SUBSC]", f"[{repo.fullName}]", "no subcribers, skipping")
+    cacheName = getRepoCacheName(repo, "subscribers")
+    if not isCached(cacheName):
+        logVerbose("[SUBSC]", f"[{repo.fullName}]", "no subcribers, skipping")
         return
-    with open(fileWithContributions) as f:
-        fileContent = f.read().strip()
-        if fileContent == "":
-            return
-        subscriberAsJson = json.loads(fileContent)
-        subscriber = [User(c) for c in subscriberAsJson]
-        for sub in subscriber:
-            print("[SUBSC]", f"[{repo.fullName}]", f"[{sub.name}]", "importing")
-            conn.createSubscriberLink(repo, sub)
+    for sub in (internUser(c) for c in iterCachedItems(cacheName)):
+        logVerbose("[SUBSC]", f"[{repo.fullName}]", f"[{sub.name}]", "importing")
+        conn.createSubscriberLink(repo, sub)
 
 
 def importUserWithData(userName: str, conn: Neo4JConnection):
-    pathToUserFile = os.path.join(".cached_results", f"users__{userName}.json")
-    if not os.path.exists(pathToUserFile):
+    if IMPORT_FROM_SNAPSHOT:
+        importUserFromSnapshot(userName, conn)
+        return
+    userData = readCached(f"users__{userName}")
+    if userData is None:
         print("[USER]", f"[{userName}]", "skipping user as he does not exist")
         return
-    with open(pathToUserFile) as fileWithUser:
-        parsedUserData = json.loads(fileWithUser.read())
-        if "message" in parsedUserData and parsedUserData["message"] == "Not Found":
-            print("[USER]", f"[{userName}]", "skipping user as he does not exist")
-            return
-        user = User(parsedUserData)
-        conn.createUserOrOrg(user)
-    pass
+    parsedUserData = json.loads(userData)
+    if "message" in parsedUserData and parsedUserData["message"] == "Not Found":
+        print("[USER]", f"[{userName}]", "skipping user as he does not exist")
+        return
+    user = User(parsedUserData)
+    conn.createUserOrOrg(user)
     importGists(conn, user)
     importRepositories(conn, user)
 
 
+def importUserFromSnapshot(userName: str, conn: Neo4JConnection):
+    # Same order of writes as importUserWithData
+    account = getSnapshot().findAccount(userName)
+    user = account.user if account is not None else None
+    if user is None:
+        print("[USER]", f"[{userName}]", "skipping user as he does not exist")
+        return
+    conn.createUserOrOrg(user)
+    for gist in account.gists:
+        conn.createGist(user, gist)
+    for repo in account.repos:
+        conn.createRepo(repo)
+        for sub in repo.subscribers:
+            conn.createSubscriberLink(repo, sub)
+        for pullRequest in repo.pullRequests:
+            conn.createPullRequest(repo, pullRequest)
+        for issue in repo.issues:
+            conn.createIssue(repo, issue)
+        for contr in repo.contributors:
+            conn.createContributorLink(repo, contr)
+
+
 if __name__ == '__main__':
-    conn = Neo4JConnection()
+    journal = ImportJournal()
+    if IMPORT_BATCH_SIZE > 0:
+        conn = BatchedNeo4JConnection(batchSize=IMPORT_BATCH_SIZE, journal=journal)
+    else:
+        conn = Neo4JConnection(journal=journal)
+    if CHECK_QUERY_PLANS:
+        printQueryPlans(conn, "before schema")
+    conn.createSchema()
+    if CHECK_QUERY_PLANS:
+        printQueryPlans(conn, "after schema")
     with open("users_to_fetch.txt") as userNamesList:
-        for userName in userNamesList:
-            userName = userName.strip()
+        userNames = [userName.strip() for userName in userNamesList]
+    pendingUserNames = [userName for userName in userNames if not journal.isImported(userName)]
+    print("[JOURNAL]", len(userNames) - len(pendingUserNames), "users already imported, skipping them")
+    if IMPORT_WORKERS > 1 and IMPORT_BATCH_SIZE > 0:
+        importUsersInParallel(pendingUserNames, conn.driver, IMPORT_WORKERS, IMPORT_BATCH_SIZE, journal)
+    else:
+        for userName in pendingUserNames:
             importUserWithData(userName, conn)
+            conn.finishUser(userName)
+    conn.close()
+    if IMPORT_COLLABORATION_GRAPH:
+        from collaboration_graph import importCollaborationGraph
+
+        graphDriver = GraphDatabase.driver(DB_URI)
+        importCollaborationGraph([userName for userName in userNames if userName != ""], graphDriver)
+        graphDriver.close()
+    metrics.writeReport()
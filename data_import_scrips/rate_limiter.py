@@ -0,0 +1,186 @@
+import datetime
+import threading
+import time
+from typing import List, Optional
+
+from data_types import RemainingLimit
+from metrics import logVerbose, metrics
+
+# Requests that can be sent at once without pacing, a small crawl never waits.
+# Above it requests are spread over the rest of the window at the rate the remaining budget allows,
+# so a long crawl keeps going instead of spending the budget in minutes and idling until reset.
+LIMITER_BURST = 500
+# Slack after reset time, Github clock and ours are not exactly the same
+RESET_MARGIN = 1.0
+# Length of Github rate limit window, used until first response of a new window tells the real reset
+RATE_LIMIT_WINDOW = 3600
+
+
+def parseLimitHeaders(headers) -> Optional[RemainingLimit]:
+    # Every Github response carries the state of the limit it was counted against
+    if "X-RateLimit-Remaining" not in headers or "X-RateLimit-Reset" not in headers:
+        return None
+    limit = int(headers.get("X-RateLimit-Limit", 0))
+    remaining = int(headers["X-RateLimit-Remaining"])
+    return RemainingLimit({"resources": {"core": {
+        "limit": limit,
+        "remaining": remaining,
+        "used": int(headers.get("X-RateLimit-Used", limit - remaining)),
+        "reset": int(headers["X-RateLimit-Reset"]),
+    }}})
+
+
+class RateLimiter:
+    """
+    Token bucket over Github rate limit. Budget and reset come from response headers,
+    requests wait for a token instead of being sent and failing, and when the budget
+    is gone they sleep exactly until the reset.
+    """
+
+    def __init__(self, limits: RemainingLimit = None, burst: int = LIMITER_BURST, token: str = None):
+        self.lock = threading.Lock()
+        # Requests counted against this budget are sent with this token, None is anonymous
+        self.token = token
+        self.limits = limits
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilledAt = time.monotonic()
+        # Set by Retry-After and secondary limits, no request is sent before it
+        self.blockedUntil = 0.0
+
+    def setLimits(self, limits: RemainingLimit):
+        with self.lock:
+            self.limits = limits
+
+    def hasBudget(self) -> bool:
+        limits = self.limits
+        return limits is None or limits.remaining > 0
+
+    def getRemaining(self) -> float:
+        limits = self.limits
+        # Budget not known yet, the first response will tell
+        return float("inf") if limits is None else limits.remaining
+
+    def acquire(self):
+        while True:
+            delay = self.tryAcquire()
+            if delay is None:
+                return
+            if delay > 1:
+                print("[SLEEP]", f"waiting {delay:.0f}s for rate limit")
+            sleep(delay)
+
+    def tryAcquire(self) -> Optional[float]:
+        with self.lock:
+            return self.__reserve()
+
+    def __reserve(self) -> Optional[float]:
+        # Takes one request from the budget, or says how long to wait before trying again
+        now = time.time()
+        if now < self.blockedUntil:
+            return self.blockedUntil - now
+        if self.limits is None:
+            return None
+        resetAt = self.limits.reset.timestamp()
+        if now >= resetAt:
+            # New window, real values come with the next response. Until then the rate from the guessed
+            # reset is far too low, full bucket lets requests go right away
+            self.limits.remaining = self.limits.limit
+            self.limits.used = 0
+            self.limits.reset = datetime.datetime.fromtimestamp(now + RATE_LIMIT_WINDOW)
+            resetAt = now + RATE_LIMIT_WINDOW
+            self.tokens = float(self.burst)
+        if self.limits.remaining <= 0:
+            return resetAt - now + RESET_MARGIN
+        rate = self.limits.remaining / max(resetAt - now, 1.0)
+        monotonic = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + rate * (monotonic - self.refilledAt))
+        self.refilledAt = monotonic
+        if self.tokens < 1:
+            return (1 - self.tokens) / rate
+        self.tokens -= 1
+        self.limits.remaining -= 1
+        self.limits.used += 1
+        logVerbose("[LIMITS]", "left", self.limits.remaining, "from", self.limits.limit, "until", self.limits.reset)
+        return None
+
+    def refund(self):
+        with self.lock:
+            if self.limits is not None:
+                self.limits.remaining += 1
+                self.limits.used -= 1
+
+    def update(self, headers):
+        limits = parseLimitHeaders(headers)
+        if limits is None:
+            return
+        with self.lock:
+            if self.limits is None or limits.reset > self.limits.reset + datetime.timedelta(seconds=RESET_MARGIN):
+                # First response of a new window
+                self.limits = limits
+            else:
+                # Responses of parallel requests come out of order, the lowest remaining is the newest.
+                # Local count can be lower too, it includes requests that are still in flight.
+                self.limits.limit = limits.limit
+                self.limits.reset = limits.reset
+                self.limits.remaining = min(self.limits.remaining, limits.remaining)
+
+    def exhausted(self):
+        # Github refused a request of this budget. Reset it sent can already be behind our clock,
+        # then nothing is sent until a margin from now instead of right away
+        with self.lock:
+            now = time.time()
+            resetAt = now
+            if self.limits is not None:
+                self.limits.remaining = 0
+                resetAt = max(resetAt, self.limits.reset.timestamp())
+            self.blockedUntil = max(self.blockedUntil, resetAt + RESET_MARGIN)
+
+    def blockFor(self, seconds: float):
+        with self.lock:
+            self.blockedUntil = max(self.blockedUntil, time.time() + seconds)
+
+
+class TokenPool:
+    """
+    Rate limiters of many Github tokens, every token has its own budget. Request goes to the
+    token with the most budget left, the fetcher sleeps only when all of them are used up
+    and then until the earliest reset.
+    """
+
+    def __init__(self, tokens: List[str] = None, burst: int = LIMITER_BURST):
+        # Without tokens there is one anonymous limiter
+        self.limiters = [RateLimiter(burst=burst, token=token) for token in tokens or [None]]
+
+    def acquire(self) -> RateLimiter:
+        while True:
+            delays = []
+            for limiter in sorted(self.limiters, key=lambda l: l.getRemaining(), reverse=True):
+                delay = limiter.tryAcquire()
+                if delay is None:
+                    return limiter
+                delays.append(delay)
+            delay = min(delays)
+            if delay > 1:
+                print("[SLEEP]", f"waiting {delay:.0f}s for rate limit of {len(self.limiters)} tokens")
+            sleep(delay)
+
+    def hasBudget(self) -> bool:
+        return any(limiter.hasBudget() for limiter in self.limiters)
+
+    def getLimits(self) -> Optional[RemainingLimit]:
+        # All tokens as one budget, reset of the one that resets first
+        known = [limiter.limits for limiter in self.limiters if limiter.limits is not None]
+        if len(known) == 0:
+            return None
+        return RemainingLimit({"resources": {"core": {
+            "limit": sum(limits.limit for limits in known),
+            "remaining": sum(limits.remaining for limits in known),
+            "used": sum(limits.used for limits in known),
+            "reset": min(limits.reset for limits in known).timestamp(),
+        }}})
+
+
+def sleep(seconds: float):
+    time.sleep(seconds)
+    metrics.increment("rate_limit_sleep_seconds_total", seconds)
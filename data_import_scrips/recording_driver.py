@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+
+# Stand-ins for the neo4j driver, used by tests and benchmarks to count statements without a database
+class RecordingTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, **params):
+        self.driver.record(query, params)
+        return RecordingResult()
+
+
+class RecordingResult:
+    def single(self):
+        # Record with one empty value, enough for createAndReturnUser
+        return [None]
+
+    def consume(self):
+        return None
+
+    def __iter__(self):
+        return iter([])
+
+
+class RecordingSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def write_transaction(self, work, *args, **kwargs):
+        self.driver.failIfRequested()
+        self.driver.transactions += 1
+        result = work(RecordingTransaction(self.driver), *args, **kwargs)
+        if self.driver.commitLatency > 0:
+            time.sleep(self.driver.commitLatency)
+        return result
+
+    read_transaction = write_transaction
+
+    def run(self, query, **params):
+        self.driver.record(query, params)
+        return RecordingResult()
+
+
+class RecordingDriver:
+    # Counts round trips instead of sending them to the database, commitLatency stands in for the server.
+    # With keepStatements queries and their parameters are kept too, e.g. for tests.
+    # The first failTransactions transactions raise before anything is recorded, as if they were rolled back
+    def __init__(self, commitLatency: float = 0.0, keepStatements: bool = False, failTransactions: int = 0):
+        self.statements = 0
+        self.transactions = 0
+        self.commitLatency = commitLatency
+        self.recorded = [] if keepStatements else None
+        self.failTransactions = failTransactions
+
+    def failIfRequested(self):
+        if self.failTransactions > 0:
+            self.failTransactions -= 1
+            raise Exception("transaction failed")
+
+    def record(self, query: str, params: dict):
+        self.statements += 1
+        if self.recorded is not None:
+            self.recorded.append((query, params))
+
+    def session(self, **kwargs):
+        return RecordingSession(self)
+
+    def close(self):
+        pass
+
+
+class AsyncRecordingTransaction(RecordingTransaction):
+    async def run(self, query, **params):
+        return AsyncRecordingResult(super().run(query, **params))
+
+
+class AsyncRecordingResult:
+    def __init__(self, result: RecordingResult):
+        self.result = result
+
+    async def single(self):
+        return self.result.single()
+
+    async def consume(self):
+        return self.result.consume()
+
+
+class AsyncRecordingSession(RecordingSession):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def write_transaction(self, work, *args, **kwargs):
+        self.driver.failIfRequested()
+        self.driver.transactions += 1
+        result = await work(AsyncRecordingTransaction(self.driver), *args, **kwargs)
+        if self.driver.commitLatency > 0:
+            await asyncio.sleep(self.driver.commitLatency)
+        return result
+
+
+class AsyncRecordingDriver(RecordingDriver):
+    def session(self, **kwargs):
+        return AsyncRecordingSession(self)
+
+    async def close(self):
+        pass
@@ -0,0 +1,214 @@
+import json
+import os.path
+import random
+import zlib
+from typing import Dict, List
+
+from gh_cache import PER_PAGE, getCache, getCacheKey
+
+# Generated data goes to its own folder (with its own cache inside), so the real cache is never touched
+SYNTHETIC_FOLDER = "synthetic"
+SYNTHETIC_USERS_FILE = "synthetic_users.txt"
+SYNTHETIC_SEED = 1
+SYNTHETIC_USERS = 200
+# Accounts that appear only as owners, contributors, subscribers and authors
+SYNTHETIC_OTHER_USERS = 20000
+# Means of the skewed distributions, most accounts have few items and a handful a lot of them
+REPOS_PER_USER = 15
+ISSUES_PER_REPO = 8
+PULLS_PER_REPO = 5
+CONTRIBUTORS_PER_REPO = 4
+SUBSCRIBERS_PER_REPO = 6
+GISTS_PER_USER = 3
+FILES_PER_GIST = 2
+TOPICS_PER_REPO = 2
+# Upper bound of every count, like Github lists it is also what keeps big accounts finite
+MAX_ITEMS = 3000
+# Shape of the pareto distribution, lower is more skewed
+SKEW = 1.5
+
+LANGUAGES = ["JavaScript", "Python", "Java", "Go", "TypeScript", "C++", "Ruby", "PHP", "C#", "C", "Shell", "Rust",
+             "Kotlin", "Swift", "Scala", "Haskell", "Elixir", "Lua", "R", "Dart"]
+TOPICS = [f"topic-{i}" for i in range(500)]
+LICENSES = [
+    {"key": "mit", "name": "MIT License", "spdx_id": "MIT", "url": "https://api.github.com/licenses/mit"},
+    {"key": "apache-2.0", "name": "Apache License 2.0", "spdx_id": "Apache-2.0",
+     "url": "https://api.github.com/licenses/apache-2.0"},
+    {"key": "gpl-3.0", "name": "GNU General Public License v3.0", "spdx_id": "GPL-3.0",
+     "url": "https://api.github.com/licenses/gpl-3.0"},
+    {"key": "other", "name": "Other", "spdx_id": "NOASSERTION", "url": None},
+]
+# Domain used in generated Link urls, only to make next page links look like the real ones
+SYNTHETIC_DOMAIN = "https://api.github.com"
+
+
+class SyntheticGithub:
+    def __init__(self, seed: int = SYNTHETIC_SEED, otherUsers: int = SYNTHETIC_OTHER_USERS):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.nextId = 1
+        self.others = [self.newUser(f"someone-{i}") for i in range(otherUsers)]
+
+    def newId(self) -> int:
+        self.nextId += 1
+        return self.nextId
+
+    def count(self, mean: float) -> int:
+        # Pareto shifted to start at 0 and scaled to the given mean
+        value = (self.random.paretovariate(SKEW) - 1) * (SKEW - 1) * mean
+        return min(int(value), MAX_ITEMS)
+
+    def newUser(self, login: str) -> Dict:
+        kind = self.random.random()
+        userType = "User" if kind < 0.9 else "Organization" if kind < 0.99 else "Bot"
+        return {"login": login, "id": self.newId(), "type": userType, "site_admin": False}
+
+    def someone(self) -> Dict:
+        # Popular accounts show up much more often than others
+        index = int(len(self.others) * self.random.random() ** 3)
+        return dict(self.others[index])
+
+    def someones(self, mean: float) -> List[Dict]:
+        users = {}
+        for _ in range(self.count(mean)):
+            user = self.someone()
+            users[user["id"]] = user
+        return list(users.values())
+
+    def text(self, words: int) -> str:
+        return " ".join(self.random.choice(TOPICS) for _ in range(words))
+
+    def user(self, login: str) -> Dict:
+        user = self.newUser(login)
+        user.update({"blog": f"https://{login}.example.com", "email": None, "name": login.title()})
+        return user
+
+    def repo(self, owner: Dict, i: int) -> Dict:
+        topics = self.random.sample(TOPICS, min(self.count(TOPICS_PER_REPO), 20))
+        return {
+            "id": self.newId(),
+            "name": f"repo-{i}",
+            "full_name": f"{owner['login']}/repo-{i}",
+            "owner": {key: owner[key] for key in ["login", "id", "type", "site_admin"]},
+            "description": self.text(self.random.randint(0, 20)) or None,
+            "homepage": None,
+            "language": self.random.choice(LANGUAGES) if self.random.random() < 0.9 else None,
+            "default_branch": "main",
+            "license": dict(self.random.choice(LICENSES)) if self.random.random() < 0.6 else None,
+            "topics": topics,
+            "stargazers_count": self.count(50),
+        }
+
+    def repoItem(self, number: int) -> Dict:
+        return {
+            "id": self.newId(),
+            "number": number,
+            "title": self.text(self.random.randint(2, 10)),
+            "user": self.someone(),
+            "body": self.text(self.random.randint(0, 200)) or None,
+            "state": self.random.choice(["open", "closed"]),
+            "created_at": "2021-01-01T00:00:00Z",
+        }
+
+    def gist(self, owner: Dict) -> Dict:
+        files = {}
+        for i in range(max(1, self.count(FILES_PER_GIST))):
+            name = f"file-{i}.txt"
+            language = self.random.choice(LANGUAGES + [None])
+            files[name] = {"filename": name, "type": "text/plain", "language": language,
+                           "size": self.random.randint(10, 10000)}
+        return {
+            "id": f"{self.newId():x}",
+            "description": self.text(self.random.randint(0, 10)) or None,
+            "files": files,
+            "owner": {key: owner[key] for key in ["login", "id", "type", "site_admin"]},
+        }
+
+    def userData(self, login: str) -> Dict:
+        # Every response about one account, by cache name. Depends only on the seed and the login,
+        # so the same user looks the same no matter in which order users are generated
+        self.random.seed(f"{self.seed}-{login}")
+        self.nextId = (zlib.crc32(login.encode("utf-8")) + 1) * 1000000
+        user = self.user(login)
+        responses = {f"users__{login}": user}
+        responses[f"users__{login}__gists"] = [self.gist(user) for _ in range(self.count(GISTS_PER_USER))]
+        repos = [self.repo(user, r) for r in range(self.count(REPOS_PER_USER))]
+        responses[f"users__{login}__repos"] = repos
+        for repo in repos:
+            repoName = f"repos__{repo['full_name'].replace('/', '__')}"
+            responses[f"{repoName}__issues"] = [self.repoItem(n) for n in range(self.count(ISSUES_PER_REPO))]
+            responses[f"{repoName}__pulls"] = [self.repoItem(n) for n in range(self.count(PULLS_PER_REPO))]
+            responses[f"{repoName}__contributors"] = self.someones(CONTRIBUTORS_PER_REPO)
+            responses[f"{repoName}__subscribers"] = self.someones(SUBSCRIBERS_PER_REPO)
+        return responses
+
+
+class DatasetWriter:
+    # Puts responses into the cache the same way the fetcher does, split into pages with Link metadata
+    def __init__(self):
+        self.cache = getCache()
+        self.pending = []
+        self.pages = 0
+
+    def putObject(self, name: str, data: Dict):
+        self.pending.append((getCacheKey(name), json.dumps(data), None))
+        self.__flushIfFull()
+
+    def putList(self, name: str, items: List[Dict]):
+        pagesCount = max(1, (len(items) + PER_PAGE - 1) // PER_PAGE)
+        for page in range(1, pagesCount + 1):
+            pageItems = items[(page - 1) * PER_PAGE:page * PER_PAGE]
+            nextUrl = None
+            if page < pagesCount:
+                nextUrl = f"{SYNTHETIC_DOMAIN}/{name.replace('__', '/')}?per_page={PER_PAGE}&page={page + 1}"
+            meta = {"etag": f'"{name}-{page}"', "lastModified": None, "next": nextUrl}
+            self.pending.append((getCacheKey(name, page), json.dumps(pageItems), meta))
+        self.__flushIfFull()
+
+    def __flushIfFull(self):
+        if len(self.pending) >= 1000:
+            self.flush()
+
+    def flush(self):
+        self.cache.putMany(self.pending)
+        self.pages += len(self.pending)
+        self.pending = []
+
+
+def generateDataset(usersCount: int = SYNTHETIC_USERS, seed: int = SYNTHETIC_SEED) -> List[str]:
+    github = SyntheticGithub(seed)
+    writer = DatasetWriter()
+    userNames = []
+    counts = {"repos": 0, "issues": 0, "pulls": 0, "contributors": 0, "subscribers": 0, "gists": 0}
+    for i in range(usersCount):
+        login = f"synthetic-{i}"
+        userNames.append(login)
+        for name, data in github.userData(login).items():
+            if isinstance(data, dict):
+                writer.putObject(name, data)
+                continue
+            writer.putList(name, data)
+            counts[name.rsplit("__", 1)[1]] += len(data)
+    writer.flush()
+    with open(SYNTHETIC_USERS_FILE, "w") as usersFile:
+        usersFile.write("\n".join(userNames))
+        usersFile.write("\n")
+    print("[SYNTHETIC]", usersCount, "users,", ", ".join(f"{value} {key}" for key, value in counts.items()) + ",",
+          writer.pages, "cached pages")
+    return userNames
+
+
+def readSyntheticUsers() -> List[str]:
+    with open(SYNTHETIC_USERS_FILE) as usersFile:
+        return [userName.strip() for userName in usersFile if userName.strip() != ""]
+
+
+def enterSyntheticFolder():
+    # Cache paths are relative, so everything that should see the synthetic data runs from inside the folder
+    os.makedirs(SYNTHETIC_FOLDER, exist_ok=True)
+    os.chdir(SYNTHETIC_FOLDER)
+
+
+if __name__ == '__main__':
+    enterSyntheticFolder()
+    generateDataset()
@@ -0,0 +1,130 @@
+import math
+
+import pytest
+
+import neo4j_importer
+from data_types import Gist, Repo, User, internUser
+from gh_cache import getRepoCacheName, iterCachedItems
+from neo4j_importer import BatchedNeo4JConnection, ImportJournal, Neo4JConnection, importUserWithData, \
+    importUsersInParallel
+from recording_driver import RecordingDriver
+
+
+def importUsers(conn, userNames):
+    for userName in userNames:
+        importUserWithData(userName, conn)
+        conn.finishUser(userName)
+    if isinstance(conn, BatchedNeo4JConnection):
+        conn.flush()
+
+
+def countEntities(userName: str) -> int:
+    # User, gists, repos and everything of the repos, one row each
+    count = 1 + sum(1 for _ in iterCachedItems(f"users__{userName}__gists"))
+    for repo in (Repo(r) for r in iterCachedItems(f"users__{userName}__repos")):
+        count += 1
+        for endpoint in ["issues", "pulls", "contributors", "subscribers"]:
+            count += sum(1 for _ in iterCachedItems(getRepoCacheName(repo, endpoint)))
+    return count
+
+
+def collectIds(value, ids: set):
+    # Every id anywhere in the parameters, rows of UNWIND included
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.lower().endswith("id") and not isinstance(item, (dict, list)):
+                if item is not None:
+                    ids.add(item)
+            else:
+                collectIds(item, ids)
+    elif isinstance(value, list):
+        for item in value:
+            collectIds(item, ids)
+
+
+def test_batchedWritesOneUnwindStatementPerQuery(syntheticUsers):
+    userName = syntheticUsers[0]
+    driver = RecordingDriver(keepStatements=True)
+    importUsers(BatchedNeo4JConnection(driver, batchSize=100000), [userName])
+
+    assert driver.transactions == 1
+    queries = [query for query, _ in driver.recorded]
+    assert len(queries) == len(set(queries))
+    assert all(query.strip().startswith("UNWIND $rows AS row") for query in queries)
+    assert sum(len(params["rows"]) for _, params in driver.recorded) == countEntities(userName)
+
+
+def test_batchedSplitsRowsIntoBatches(syntheticUsers):
+    driver = RecordingDriver(keepStatements=True)
+    importUsers(BatchedNeo4JConnection(driver, batchSize=50), syntheticUsers)
+
+    rows = sum(countEntities(userName) for userName in syntheticUsers)
+    assert sum(len(params["rows"]) for _, params in driver.recorded) == rows
+    assert driver.transactions == math.ceil(rows / 50)
+
+
+def test_batchedWritesSameEntitiesAsSequential(syntheticUsers):
+    sequentialDriver = RecordingDriver(keepStatements=True)
+    importUsers(Neo4JConnection(sequentialDriver), syntheticUsers)
+    batchedDriver = RecordingDriver(keepStatements=True)
+    importUsers(BatchedNeo4JConnection(batchedDriver, batchSize=1000), syntheticUsers)
+
+    sequentialIds, batchedIds = set(), set()
+    collectIds([params for _, params in sequentialDriver.recorded], sequentialIds)
+    collectIds([params for _, params in batchedDriver.recorded], batchedIds)
+    assert sequentialDriver.transactions == sum(countEntities(userName) for userName in syntheticUsers)
+    assert batchedIds == sequentialIds
+    # Nothing of the data is missing, e.g. ids of nested users and gists
+    gists = [Gist(g) for g in iterCachedItems(f"users__{syntheticUsers[0]}__gists")]
+    assert {gist.id for gist in gists} <= batchedIds
+    for repo in (Repo(r) for r in iterCachedItems(f"users__{syntheticUsers[0]}__repos")):
+        assert repo.id in batchedIds
+        assert {internUser(u).id for u in iterCachedItems(getRepoCacheName(repo, "contributors"))} <= batchedIds
+
+
+def test_failedBatchIsDroppedAndNotJournaled(syntheticUsers):
+    driver = RecordingDriver(keepStatements=True, failTransactions=1)
+    journal = ImportJournal()
+    conn = BatchedNeo4JConnection(driver, batchSize=100000, journal=journal)
+    with pytest.raises(Exception):
+        importUsers(conn, syntheticUsers[:2])
+    assert journal.imported == set()
+
+    # Next flush has nothing of the failed batch
+    conn.flush()
+    assert driver.transactions == 0
+    importUsers(conn, syntheticUsers[2:3])
+    assert driver.transactions == 1
+    assert sum(len(params["rows"]) for _, params in driver.recorded) == countEntities(syntheticUsers[2])
+    assert journal.imported == {syntheticUsers[2]}
+    assert ImportJournal().imported == {syntheticUsers[2]}
+
+
+def test_userWithRowsInFailedBatchIsNotJournaled(emptyCache):
+    driver = RecordingDriver(keepStatements=True, failTransactions=1)
+    journal = ImportJournal()
+    conn = BatchedNeo4JConnection(driver, batchSize=2, journal=journal)
+    conn.createUserOrOrg(User({"login": "first", "id": 1, "type": "User"}))
+    conn.finishUser("first")
+    # Second row fills the batch, which fails with the first rows of "second"
+    with pytest.raises(Exception):
+        conn.createUserOrOrg(User({"login": "second", "id": 2, "type": "User"}))
+    conn.createUserOrOrg(User({"login": "second", "id": 2, "type": "User"}))
+    conn.finishUser("second")
+    conn.createUserOrOrg(User({"login": "third", "id": 3, "type": "User"}))
+    conn.finishUser("third")
+    conn.flush()
+
+    assert journal.imported == {"third"}
+    assert [row["id"] for _, params in driver.recorded for row in params["rows"]] == [2, 3]
+
+
+def test_parallelWorkerStopsAfterFailedBatch(syntheticUsers, monkeypatch):
+    # Shared nodes go through the driver too, here only the batches of the worker fail
+    monkeypatch.setattr(neo4j_importer, "createSharedNodes", lambda *args: None)
+    driver = RecordingDriver(keepStatements=True, failTransactions=1)
+    journal = ImportJournal()
+    with pytest.raises(Exception, match="users left in queue"):
+        importUsersInParallel(syntheticUsers, driver, workers=1, batchSize=10, journal=journal)
+    assert driver.transactions == 0
+    assert journal.imported == set()
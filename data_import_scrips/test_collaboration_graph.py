@@ -0,0 +1,52 @@
+from collaboration_graph import CollaborationMatrices, getCodesInBatches, getHelpsBatches
+from data_types import Repo, User
+
+
+def createRepo(repoId: int, owner: str, language: str = None) -> Repo:
+    return Repo({"id": repoId, "name": f"repo-{repoId}", "full_name": f"{owner}/repo-{repoId}",
+                 "owner": {"login": owner, "id": ord(owner[0]), "type": "User"}, "language": language,
+                 "homepage": None, "default_branch": "main", "description": None, "license": None, "topics": []})
+
+
+def createUser(login: str) -> User:
+    return User({"login": login, "id": ord(login[0]), "type": "User"})
+
+
+def createMatrices() -> CollaborationMatrices:
+    matrices = CollaborationMatrices()
+    # alice owns two Python repos and one Go repo, bob contributes to both Python ones,
+    # alice contributes to her own repo and to one of carol's
+    first = matrices.addRepo(createRepo(1, "alice", "Python"))
+    second = matrices.addRepo(createRepo(2, "alice", "Python"))
+    matrices.addRepo(createRepo(3, "alice", "Go"))
+    carols = matrices.addRepo(createRepo(4, "carol"))
+    for position in [first, second]:
+        matrices.addContributor(position, createUser("bob"))
+    matrices.addContributor(first, createUser("alice"))
+    matrices.addContributor(carols, createUser("alice"))
+    # Listed twice, e.g. under two fetched users, is still one contribution
+    matrices.addContributor(carols, createUser("alice"))
+    return matrices
+
+
+def getEdges(batches, fromKey: str, toKey: str) -> dict:
+    return {(row[fromKey], row[toKey]): row["repos"] for _, rows in batches for row in rows}
+
+
+def test_helpsCountsReposOfOwnerWithoutSelfLoops(emptyCache):
+    helps = getEdges(getHelpsBatches(createMatrices()), "from_id", "to_id")
+    alice, bob, carol = ord("a"), ord("b"), ord("c")
+    assert helps == {(bob, alice): 2, (alice, carol): 1}
+
+
+def test_codesInCountsOwnedAndContributedRepos(emptyCache):
+    codesIn = getEdges(getCodesInBatches(createMatrices()), "user_id", "lang")
+    alice, bob = ord("a"), ord("b")
+    # Repo without language gives no edge, own repo alice contributes to is counted once
+    assert codesIn == {(alice, "Python"): 2, (alice, "Go"): 1, (bob, "Python"): 2}
+
+
+def test_batchesAreSplitByLabelsAndSize(emptyCache):
+    batches = getHelpsBatches(createMatrices(), batchSize=1)
+    assert all(len(rows) == 1 for _, rows in batches)
+    assert len(batches) == 2
@@ -0,0 +1,70 @@
+import csv
+import os.path
+
+from csv_exporter import EXPORT_FOLDER, NODE_FILES, RELATIONSHIP_FILES, CsvExporter, exportUsers
+
+
+def readCsv(fileName: str) -> list:
+    with open(os.path.join(EXPORT_FOLDER, fileName), newline="") as file:
+        return list(csv.reader(file))
+
+
+def getIdSpace(column: str) -> str:
+    # ":ID(Owner)" or "name:ID(Language)" -> "Owner"
+    return column.split("ID(")[1].rstrip(")")
+
+
+def exportSynthetic(userNames) -> CsvExporter:
+    exporter = CsvExporter()
+    exportUsers(userNames, exporter)
+    exporter.close()
+    return exporter
+
+
+def test_filesHaveHeadersWithIdSpaces(syntheticUsers):
+    exportSynthetic(syntheticUsers)
+    for name, (_, header) in NODE_FILES.items():
+        rows = readCsv(f"nodes_{name}.csv")
+        assert rows[0] == header
+        assert sum(1 for column in header if ":ID(" in column) == 1
+        # Every row has a value for every column of the header
+        assert all(len(row) == len(header) for row in rows[1:])
+    for name, (_, startSpace, endSpace) in RELATIONSHIP_FILES.items():
+        rows = readCsv(f"relationships_{name}.csv")
+        assert rows[0] == [f":START_ID({startSpace})", f":END_ID({endSpace})"]
+        assert all(len(row) == 2 for row in rows[1:])
+
+
+def test_everyNodeIsWrittenOnce(syntheticUsers):
+    # Exported twice, users already written are mentioned again as contributors and authors
+    exportSynthetic(syntheticUsers + syntheticUsers)
+    for name, (_, header) in NODE_FILES.items():
+        idColumn = next(i for i, column in enumerate(header) if ":ID(" in column)
+        ids = [row[idColumn] for row in readCsv(f"nodes_{name}.csv")[1:]]
+        assert len(ids) == len(set(ids)), name
+    assert len(readCsv("nodes_repositories.csv")) > 1
+    assert len(readCsv("nodes_issues.csv")) > 1
+
+
+def test_everyRelationshipEndpointIsNode(syntheticUsers):
+    exportSynthetic(syntheticUsers)
+    idsBySpace = {}
+    for name, (_, header) in NODE_FILES.items():
+        idColumn = next(i for i, column in enumerate(header) if ":ID(" in column)
+        idsBySpace.setdefault(getIdSpace(header[idColumn]), set()).update(
+            row[idColumn] for row in readCsv(f"nodes_{name}.csv")[1:])
+    for name, (_, startSpace, endSpace) in RELATIONSHIP_FILES.items():
+        rows = readCsv(f"relationships_{name}.csv")[1:]
+        assert len(rows) > 0, name
+        for start, end in rows:
+            assert start in idsBySpace[startSpace], name
+            assert end in idsBySpace[endSpace], name
+
+
+def test_importArgumentsListEveryFile(emptyCache):
+    exporter = CsvExporter()
+    exporter.close()
+    arguments = exporter.getImportArguments()
+    assert arguments[0] == "--multiline-fields=true"
+    assert len(arguments) == 1 + len(NODE_FILES) + len(RELATIONSHIP_FILES)
+    assert all(os.path.exists(argument.split("=")[-1]) for argument in arguments[1:])
@@ -0,0 +1,52 @@
+import pytest
+
+import dataset_snapshot
+import neo4j_importer
+from dataset_snapshot import SNAPSHOT_FILE, compileSnapshot, getSnapshot, isSnapshotFresh
+from gh_cache import getCache
+from neo4j_importer import Neo4JConnection, importUserWithData
+from recording_driver import RecordingDriver
+
+
+@pytest.fixture
+def snapshotImport(monkeypatch):
+    # Snapshot is a global of the importer, it is opened in the folder of the test and closed after it
+    monkeypatch.setattr(dataset_snapshot, "snapshot", None)
+    yield
+    if dataset_snapshot.snapshot is not None:
+        dataset_snapshot.snapshot.close()
+
+
+def recordImport(userNames) -> list:
+    driver = RecordingDriver(keepStatements=True)
+    conn = Neo4JConnection(driver)
+    for userName in userNames:
+        importUserWithData(userName, conn)
+    return driver.recorded
+
+
+def test_snapshotImportWritesSameStatementsAsCache(syntheticUsers, snapshotImport, monkeypatch):
+    fromCache = recordImport(syntheticUsers)
+    compileSnapshot()
+    monkeypatch.setattr(neo4j_importer, "IMPORT_FROM_SNAPSHOT", True)
+    fromSnapshot = recordImport(syntheticUsers + ["not-in-snapshot"])
+
+    assert len(fromCache) > 0
+    assert fromSnapshot == fromCache
+    assert getSnapshot().findAccount("not-in-snapshot") is None
+
+
+def test_cacheWriteMakesSnapshotStale(syntheticUsers):
+    assert not isSnapshotFresh()
+    compileSnapshot()
+    assert isSnapshotFresh()
+    getCache().putMany([("users__someone-new", "{}", None)])
+    assert not isSnapshotFresh()
+
+
+def test_staleSnapshotIsCompiledAgainWhenOpened(syntheticUsers, snapshotImport):
+    compileSnapshot(accounts=syntheticUsers[:1])
+    getCache().putMany([("users__someone-new", "{}", None)])
+    # Opening finds the snapshot stale and compiles it from the whole cache
+    assert getSnapshot().findAccount(syntheticUsers[-1]) is not None
+    assert isSnapshotFresh(SNAPSHOT_FILE)
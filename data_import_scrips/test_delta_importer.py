@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+from data_types import Repo, User
+from delta_importer import ImportManifest, fingerprintRepo, importUserDelta, readUserSnapshot
+from gh_cache import getRepoCacheName, iterCachedItems, readCached
+from neo4j_importer import BatchedNeo4JConnection
+from recording_driver import RecordingDriver
+from synthetic_data import DatasetWriter
+
+
+def importDelta(userNames, manifest: ImportManifest, driver: RecordingDriver = None) -> RecordingDriver:
+    driver = driver or RecordingDriver(keepStatements=True)
+    conn = BatchedNeo4JConnection(driver, batchSize=100000, journal=manifest, wholeUsers=True)
+    for userName in userNames:
+        importUserDelta(userName, conn, manifest)
+    conn.close()
+    return driver
+
+
+def getRows(driver: RecordingDriver, query: str) -> list:
+    return [row for recordedQuery, params in driver.recorded if recordedQuery == query for row in params["rows"]]
+
+
+def findRepoWithIssues(userNames):
+    for userName in userNames:
+        repos = list(iterCachedItems(f"users__{userName}__repos"))
+        for position, repo in enumerate(repos):
+            if len(list(iterCachedItems(getRepoCacheName(Repo(repo), "issues")))) > 0:
+                return userName, repos, position
+    raise Exception("no repo with issues in synthetic data")
+
+
+def test_fingerprintChangesOnlyWithGraphFields(syntheticUsers):
+    repo = next(iterCachedItems(f"users__{syntheticUsers[0]}__repos"))
+    original = fingerprintRepo(Repo(repo))
+    # Counters are not in the graph
+    assert fingerprintRepo(Repo(dict(repo, stargazers_count=repo["stargazers_count"] + 1))) == original
+    assert fingerprintRepo(Repo(dict(repo, description="changed"))) != original
+    assert fingerprintRepo(Repo(dict(repo, topics=list(reversed(repo["topics"]))))) == original
+
+
+def test_manifestRoundTrip(syntheticUsers):
+    manifest = ImportManifest()
+    driver = importDelta(syntheticUsers, manifest)
+    manifest.close()
+    assert driver.transactions == 1
+
+    reopened = ImportManifest()
+    for userName in syntheticUsers:
+        user = User(json.loads(readCached(f"users__{userName}")))
+        assert reopened.load(userName) == readUserSnapshot(user).hashes
+    # Nothing changed since, nothing is written
+    driver = importDelta(syntheticUsers, reopened)
+    assert driver.statements == 0
+    reopened.close()
+
+
+def test_changedEntitiesAreUpsertedAndRemovedDeleted(syntheticUsers):
+    manifest = ImportManifest()
+    importDelta(syntheticUsers, manifest)
+
+    userName, repos, position = findRepoWithIssues(syntheticUsers)
+    repo = Repo(repos[position])
+    issues = list(iterCachedItems(getRepoCacheName(repo, "issues")))
+    writer = DatasetWriter()
+    repos[position] = dict(repos[position], description="changed")
+    writer.putList(f"users__{userName}__repos", repos)
+    writer.putList(getRepoCacheName(repo, "issues"), issues[1:])
+    writer.flush()
+
+    driver = importDelta(syntheticUsers, manifest)
+    assert getRows(driver, BatchedNeo4JConnection.DELETE_QUERIES["issue"]) == [issues[0]["id"]]
+    # Repo was imported before, its language and topics are cleared before they are written again
+    assert getRows(driver, BatchedNeo4JConnection.DELETE_QUERIES["repoLinks"]) == [repo.id]
+    upserted = [params for query, params in driver.recorded if query not in BatchedNeo4JConnection.DELETE_QUERIES.values()]
+    assert [row["repo_id"] for params in upserted for row in params["rows"]] == [repo.id]
+    assert ("issue", str(issues[0]["id"])) not in manifest.load(userName)
+    manifest.close()
+
+
+def test_manifestIsNotUpdatedWhenBatchFails(syntheticUsers):
+    manifest = ImportManifest()
+    with pytest.raises(Exception):
+        importDelta(syntheticUsers, manifest, RecordingDriver(keepStatements=True, failTransactions=1))
+    assert all(manifest.load(userName) == {} for userName in syntheticUsers)
+
+    # Next run writes everything again
+    driver = importDelta(syntheticUsers, manifest)
+    assert driver.transactions == 1
+    assert all(manifest.load(userName) != {} for userName in syntheticUsers)
+    manifest.close()
+
+
+def test_userIsCommittedInOneTransaction(syntheticUsers):
+    manifest = ImportManifest()
+    driver = RecordingDriver(keepStatements=True)
+    conn = BatchedNeo4JConnection(driver, batchSize=10, journal=manifest, wholeUsers=True)
+    for userName in syntheticUsers:
+        importUserDelta(userName, conn, manifest)
+        # Users are never split, a full batch is committed when the user is finished
+        assert conn.bufferedRows < 10
+    conn.close()
+    assert driver.transactions == len(syntheticUsers)
+    manifest.close()
@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+import fake_github
+import gh_data_fetcher
+from gh_data_fetcher import Github
+from metrics import metrics
+from synthetic_data import SyntheticGithub
+
+LOGIN = "synthetic-4"
+
+
+@pytest.fixture
+def fakeGithub(emptyCache, monkeypatch):
+    monkeypatch.setattr(fake_github, "FAKE_LATENCY", 0)
+    monkeypatch.setattr(fake_github, "FAKE_LATENCY_JITTER", 0)
+    server = fake_github.startFakeGithub(port=0)
+    yield f"http://{fake_github.FAKE_HOST}:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetcherGetsGeneratedData(fakeGithub, monkeypatch):
+    # Small pages, so lists are followed through Link headers
+    monkeypatch.setattr(gh_data_fetcher, "PER_PAGE", 2)
+    github = Github(domain=fakeGithub, tokens=[])
+    expected = SyntheticGithub().userData(LOGIN)
+
+    user = github.fetchUser(LOGIN)
+    assert user.id == expected[f"users__{LOGIN}"]["id"]
+    repos = list(github.fetchRepositories(user))
+    assert [repo.id for repo in repos] == [repo["id"] for repo in expected[f"users__{LOGIN}__repos"]]
+    assert len(repos) > 2
+    repo = repos[0]
+    repoName = f"repos__{repo.fullName.replace('/', '__')}"
+    assert [i.id for i in github.fetchIssues(repo)] == [i["id"] for i in expected[f"{repoName}__issues"]]
+    assert [u.id for u in github.fetchContibutors(repo)] == [u["id"] for u in expected[f"{repoName}__contributors"]]
+
+
+def test_unchangedResponsesAreNotModified(fakeGithub):
+    user = Github(domain=fakeGithub, tokens=[]).fetchUser(LOGIN)
+    list(Github(domain=fakeGithub, tokens=[]).fetchRepositories(user))
+    metrics.reset()
+    # Refresh sends the saved ETag, the fake answers 304 like Github when nothing changed
+    github = Github(domain=fakeGithub, tokens=[], refresh=True)
+    list(github.fetchRepositories(user))
+    counters = metrics.report()["counters"]
+    assert counters['http_responses_total{status="304"}'] > 0
+    assert "cache_misses_total" not in counters
+
+
+def test_rateLimitIsEnforcedPerToken(fakeGithub, monkeypatch):
+    monkeypatch.setattr(fake_github, "FAKE_RATE_LIMIT", 2)
+    url = f"{fakeGithub}/users/{LOGIN}"
+    responses = [requests.get(url, headers={"Authorization": "token a"}) for _ in range(3)]
+    assert [response.status_code for response in responses] == [200, 200, 403]
+    assert responses[-1].headers["X-RateLimit-Remaining"] == "0"
+    # Other token has its own budget
+    assert requests.get(url, headers={"Authorization": "token b"}).status_code == 200
+    assert requests.get(f"{fakeGithub}/users/nobody/repos").status_code == 200
+    assert requests.get(f"{fakeGithub}/orgs/nobody").status_code == 404
+
+
+def test_requestsSwitchToTokenWithBudget(fakeGithub, monkeypatch):
+    monkeypatch.setattr(fake_github, "FAKE_RATE_LIMIT", 3)
+    url = f"{fakeGithub}/users/{LOGIN}"
+    # Token a is used up before the fetcher starts, it learns that from /rate_limit
+    for _ in range(3):
+        requests.get(url, headers={"Authorization": "token a"})
+    github = Github(domain=fakeGithub, tokens=["a", "b", "c"])
+    used = [github.request(url) for _ in range(6)]
+
+    assert all(response.status_code == 200 for response in used)
+    assert [limiter.limits.remaining for limiter in github.tokens.limiters] == [0, 0, 0]
+    assert 'http_responses_total{status="403"}' not in metrics.report()["counters"]
@@ -0,0 +1,64 @@
+import pytest
+
+import gh_cache
+
+from fetch_scheduler import FetchFrontier, FRONTIER_MAX_ATTEMPTS, getListTask
+from gh_cache import saveToCache
+from gh_data_fetcher import Github
+
+
+@pytest.fixture
+def github():
+    # Frontier only needs cache names of urls, nothing is sent
+    github = Github.__new__(Github)
+    github.domain = "https://api.github.com"
+    return github
+
+
+def test_failedTaskIsRetriedUntilItRunsOutOfAttempts(emptyCache, github):
+    frontier = FetchFrontier()
+    frontier.add([getListTask(f"{github.domain}/users/someone/repos", "repos")], github)
+    for _ in range(FRONTIER_MAX_ATTEMPTS):
+        task = frontier.claim(False, github)
+        assert task is not None
+        frontier.fail(task)
+    assert frontier.claim(False, github) is None
+    frontier.close()
+
+    # Next start gives it new attempts
+    frontier = FetchFrontier()
+    assert frontier.claim(False, github).url == task.url
+    frontier.close()
+
+
+def test_retriedTaskGoesAfterNewOnes(emptyCache, github):
+    frontier = FetchFrontier()
+    frontier.add([getListTask(f"{github.domain}/users/first/repos", "repos"),
+                  getListTask(f"{github.domain}/users/second/repos", "repos")], github)
+    first = frontier.claim(False, github)
+    frontier.fail(first)
+    assert frontier.claim(False, github).url != first.url
+    assert frontier.claim(False, github).url == first.url
+    frontier.close()
+
+
+def test_cachedIsCheckedWhenTaskIsClaimed(emptyCache, github):
+    frontier = FetchFrontier()
+    frontier.add([getListTask(f"{github.domain}/users/someone/repos", "repos")], github)
+    assert frontier.countPending() == (0, 1)
+    # Cached by something else after the task was added
+    saveToCache("users__someone__repos", "[]")
+    assert frontier.claim(False, github) is not None
+    assert frontier.countPending() == (1, 0)
+    frontier.close()
+
+
+def test_taskNoLongerCachedIsNotClaimedAsCached(emptyCache, github):
+    saveToCache("users__someone__repos", "[]")
+    frontier = FetchFrontier()
+    frontier.add([getListTask(f"{github.domain}/users/someone/repos", "repos")], github)
+    gh_cache.getCache().connection.execute("DELETE FROM responses")
+    # Without budget only cached pages are taken, this one would need a request
+    assert frontier.claim(True, github) is None
+    assert frontier.countPending() == (0, 1)
+    frontier.close()
@@ -0,0 +1,23 @@
+import json
+
+from bench_names_extractor import generateDump
+from names_extractor import extractLogin, iterLogins
+
+
+def test_fastExtractionMatchesJson(tmp_path):
+    path = str(tmp_path / "users.jsonl")
+    generateDump(path, 1 << 16)
+    assert list(iterLogins(path, fast=True)) == list(iterLogins(path, fast=False))
+
+
+def test_loginOfNestedObjectIsNotTaken():
+    lines = [
+        {"plan": {"login": "nested"}, "login": "top"},
+        {"bio": "{ not an object", "org": {"owner": {"login": "nested"}}, "login": "top"},
+        {"bio": 'says "login": "quoted" and }', "login": "top"},
+        {"login": "top", "owner": {"login": "nested"}},
+        {"login": 'esc"aped'},
+    ]
+    for line in lines:
+        raw = json.dumps(line).encode("utf-8")
+        assert extractLogin(raw, fast=True) == json.loads(raw)["login"], raw
@@ -0,0 +1,141 @@
+import pytest
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+import gh_data_fetcher
+from gh_data_fetcher import Github
+from rate_limiter import RESET_MARGIN, RateLimiter, TokenPool, parseLimitHeaders
+
+
+def getHeaders(remaining: int, reset: float, limit: int = 5000) -> dict:
+    return {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(int(reset))}
+
+
+def createLimiter(clock, remaining: int, resetIn: float, burst: int = 10, limit: int = 5000) -> RateLimiter:
+    return RateLimiter(parseLimitHeaders(getHeaders(remaining, clock.now + resetIn, limit)), burst=burst)
+
+
+def test_headersUpdateLimits(fakeClock):
+    limiter = RateLimiter()
+    limiter.update(getHeaders(4000, fakeClock.now + 600))
+    assert limiter.limits.remaining == 4000
+    # Response of an earlier request that came late does not give the budget back
+    limiter.update(getHeaders(4100, fakeClock.now + 600))
+    assert limiter.limits.remaining == 4000
+    # First response of a new window
+    limiter.update(getHeaders(4999, fakeClock.now + 4200))
+    assert limiter.limits.remaining == 4999
+    limiter.update({})
+    assert limiter.limits.remaining == 4999
+
+
+def test_requestsArePacedOverWindowAfterBurst(fakeClock):
+    # 100 requests for 100 seconds, one per second once the burst is used
+    limiter = createLimiter(fakeClock, 100, 100, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert fakeClock.slept == []
+    assert limiter.tryAcquire() == pytest.approx(1.0, rel=0.05)
+    limiter.acquire()
+    assert sum(fakeClock.slept) == pytest.approx(1.0, rel=0.05)
+    assert limiter.limits.remaining == 97
+
+
+def test_exhaustedBudgetWakesAtReset(fakeClock):
+    limiter = createLimiter(fakeClock, 0, 50, limit=60)
+    assert not limiter.hasBudget()
+    limiter.acquire()
+    assert fakeClock.slept == [pytest.approx(50 + RESET_MARGIN, abs=1)]
+    # New window is guessed until a response tells the real one
+    assert limiter.limits.remaining == 59
+
+
+def test_blockForDelaysEveryRequest(fakeClock):
+    limiter = createLimiter(fakeClock, 100, 1000)
+    limiter.blockFor(30)
+    limiter.blockFor(10)
+    assert limiter.tryAcquire() == pytest.approx(30)
+    limiter.acquire()
+    assert sum(fakeClock.slept) == pytest.approx(30)
+    assert limiter.limits.remaining == 99
+
+
+def test_exhaustedWithResetBehindClockWaitsMargin(fakeClock):
+    # Github already counts a new window while our clock says the old one is still on
+    limiter = createLimiter(fakeClock, 100, -5)
+    limiter.exhausted()
+    assert limiter.limits.remaining == 0
+    assert limiter.tryAcquire() == pytest.approx(RESET_MARGIN)
+
+
+def test_refundGivesRequestBack(fakeClock):
+    limiter = createLimiter(fakeClock, 100, 1000)
+    limiter.acquire()
+    assert (limiter.limits.remaining, limiter.limits.used) == (99, 4901)
+    limiter.refund()
+    assert (limiter.limits.remaining, limiter.limits.used) == (100, 4900)
+
+
+def createResponse(status: int, text: str, headers: dict) -> Response:
+    response = Response()
+    response.status_code = status
+    response._content = text.encode("utf-8")
+    response.headers = CaseInsensitiveDict(headers)
+    return response
+
+
+class QueuedSession:
+    # Answers requests with given responses, in order
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.sent += 1
+        return self.responses.pop(0)
+
+
+@pytest.mark.parametrize("status", [403, 429])
+def test_limitResponseWithoutRetryAfterIsRetried(fakeClock, monkeypatch, status):
+    monkeypatch.setattr(gh_data_fetcher, "sleep", fakeClock.sleep)
+    github = Github.__new__(Github)
+    github.tokens = TokenPool([None])
+    github.session = QueuedSession([
+        createResponse(status, "Too many requests", getHeaders(100, fakeClock.now + 3600)),
+        createResponse(200, "{}", getHeaders(99, fakeClock.now + 3600)),
+    ])
+    assert github.request("https://api.github.com/users/someone").text == "{}"
+    assert github.session.sent == 2
+    # Token was blocked for at least the secondary limit delay
+    assert sum(fakeClock.slept) >= gh_data_fetcher.SECONDARY_LIMIT_DELAY
+
+
+def createPool(clock, *limits) -> TokenPool:
+    # limits are (remaining, seconds to reset) of each token
+    pool = TokenPool([f"token-{i}" for i in range(len(limits))])
+    for limiter, (remaining, resetIn) in zip(pool.limiters, limits):
+        limiter.setLimits(parseLimitHeaders(getHeaders(remaining, clock.now + resetIn)))
+    return pool
+
+
+def test_poolUsesTokenWithMostBudget(fakeClock):
+    pool = createPool(fakeClock, (10, 1000), (300, 1000), (50, 1000))
+    assert pool.acquire() is pool.limiters[1]
+    assert pool.getLimits().remaining == 359
+    assert pool.hasBudget()
+
+
+def test_poolSkipsBlockedAndExhaustedTokens(fakeClock):
+    pool = createPool(fakeClock, (10, 1000), (300, 1000), (50, 1000))
+    pool.limiters[1].blockFor(100)
+    pool.limiters[2].exhausted()
+    assert pool.acquire() is pool.limiters[0]
+    assert fakeClock.slept == []
+
+
+def test_poolSleepsUntilEarliestReset(fakeClock):
+    pool = createPool(fakeClock, (0, 100), (0, 50), (0, 300))
+    assert not pool.hasBudget()
+    assert pool.acquire() is pool.limiters[1]
+    assert fakeClock.slept == [pytest.approx(50 + RESET_MARGIN, abs=1)]
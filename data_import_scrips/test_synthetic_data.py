@@ -0,0 +1,46 @@
+import bench_import
+from gh_cache import iterCachedItems, readCached, readCacheMeta
+from metrics import metrics
+from synthetic_data import SyntheticGithub, generateDataset, readSyntheticUsers
+
+
+def test_userDataDependsOnlyOnSeedAndLogin():
+    github = SyntheticGithub(seed=3, otherUsers=100)
+    first = github.userData("synthetic-1")
+    github.userData("synthetic-2")
+    assert SyntheticGithub(seed=3, otherUsers=100).userData("synthetic-1") == first
+    assert SyntheticGithub(seed=4, otherUsers=100).userData("synthetic-1") != first
+
+
+def test_generatedDatasetIsReadableFromCache(emptyCache):
+    userNames = generateDataset(usersCount=3, seed=2)
+    assert readSyntheticUsers() == userNames
+    github = SyntheticGithub(seed=2)
+    for userName in userNames:
+        for name, data in github.userData(userName).items():
+            if isinstance(data, dict):
+                assert readCached(name) is not None
+            else:
+                # Lists longer than one page are followed through next links like fetched ones
+                assert list(iterCachedItems(name)) == data
+
+
+def test_longListsAreSplitIntoPages(emptyCache):
+    userNames = generateDataset(usersCount=20)
+    github = SyntheticGithub()
+    longLists = [name for userName in userNames for name, data in github.userData(userName).items()
+                 if isinstance(data, list) and len(data) > 100]
+    assert len(longLists) > 0
+    for name in longLists:
+        assert readCacheMeta(name)["next"] is not None
+
+
+def test_benchmarkImportsEverything(syntheticUsers):
+    # Sequential writes one row per transaction, batched the same rows in batches
+    written = {}
+    for mode in ["sequential", "batched"]:
+        bench_import.measure(mode, syntheticUsers)
+        written[mode] = sum(value for key, value in metrics.report()["counters"].items()
+                            if key.startswith("rows_written_total"))
+    assert written["sequential"] > 0
+    assert written["batched"] == written["sequential"]
@@ -4,7 +4,6 @@ import org.neo4j.graphdb.Node;
 import org.neo4j.graphdb.Transaction;
 import org.neo4j.procedure.*;
 
-import java.util.Collection;
 import java.util.HashMap;
 import java.util.Map;
 import java.util.stream.Stream;
@@ -14,30 +13,74 @@ public class FindCodersInLanguage {
 	public Transaction tx;
 
 	@Procedure(value = "dbproject.findCodersInLanguage", mode = Mode.READ)
-	@Description("Find every coder that contributes to or owns repository in given language")
-	public Stream<Coder> getCodersInLanguage(@Name("language") String language) {
-		final String query =
-			"MATCH " +
-			"    (repos:Repository)-[:IS_WRITTEN_IN]->" +
-			"        (:Language {name: $languageName}), " +
-			"    (contributors)-[:CONTRIBUTES]->(repos), " +
-			"    (owners)-[:OWNS]->(repos) " +
-			"RETURN owners, contributors";
+	@Description("Find every coder that contributes to or owns repository in given language, each coder once. " +
+		"Optionally pages the coders (limit -1 is no limit) and counts their repositories in the language")
+	public Stream<Coder> getCodersInLanguage(
+		@Name("language") String language,
+		@Name(value = "limit", defaultValue = "-1") long limit,
+		@Name(value = "skip", defaultValue = "0") long skip,
+		@Name(value = "countRepos", defaultValue = "false") boolean countRepos
+	) {
+		var query = new StringBuilder();
+		if (hasPrecomputedEdges(tx, "CODES_IN")) {
+			// One hop over edges written by collaboration_graph.py, repos counts the repositories in the language
+			query.append("MATCH (coder)-[codes:CODES_IN]->(:Language {name: $languageName}) ");
+			query.append(countRepos
+				? "RETURN coder, sum(codes.repos) AS repos "
+				: "RETURN DISTINCT coder, null AS repos ");
+		} else {
+			// One row per coder instead of one per owner x contributor pair of every repository.
+			// Owners of repositories without contributors are coders too, the old pattern left them out
+			query.append(
+				"MATCH " +
+					"    (:Language {name: $languageName})<-[:IS_WRITTEN_IN]-" +
+					"        (repo:Repository)" +
+					"    <-[:OWNS|CONTRIBUTES]-(coder) ");
+			query.append(countRepos
+				? "RETURN coder, count(DISTINCT repo) AS repos "
+				: "RETURN DISTINCT coder, null AS repos ");
+		}
 		final var params = new HashMap<String, Object>();
 		params.put("languageName", language);
-		return tx.execute(query, params)
+		appendPaging(query, params, limit, skip);
+		return tx.execute(query.toString(), params)
 			.stream()
-			.map(Map::values)
-			.flatMap(Collection::stream)
-			.map(a->(Node) a)
 			.map(Coder::new);
 	}
 
+	static boolean hasPrecomputedEdges(Transaction tx, String relation) {
+		// Without the collaboration graph stage there are no such edges and repositories are traversed
+		for (var type : tx.getAllRelationshipTypesInUse()) {
+			if (type.name().equals(relation)) {
+				return true;
+			}
+		}
+		return false;
+	}
+
+	static void appendPaging(StringBuilder query, Map<String, Object> params, long limit, long skip) {
+		if (limit < 0 && skip <= 0) {
+			return;
+		}
+		// Pages have to come from the same order every time
+		query.append("ORDER BY id(coder) ");
+		if (skip > 0) {
+			query.append("SKIP $skip ");
+			params.put("skip", skip);
+		}
+		if (limit >= 0) {
+			query.append("LIMIT $limit ");
+			params.put("limit", limit);
+		}
+	}
+
 	public static final class Coder {
 		public final Node node;
+		public final Long repos;
 
-		Coder(Node node) {
-			this.node = node;
+		Coder(Map<String, Object> row) {
+			this.node = (Node) row.get("coder");
+			this.repos = (Long) row.get("repos");
 		}
 	}
 
@@ -4,7 +4,6 @@ import org.neo4j.graphdb.Node;
 import org.neo4j.graphdb.Transaction;
 import org.neo4j.procedure.*;
 
-import java.util.Collection;
 import java.util.HashMap;
 import java.util.Map;
 import java.util.stream.Stream;
@@ -14,29 +13,48 @@ public class FindHelpers {
 	public Transaction tx;
 
 	@Procedure(value = "dbproject.findHelpers", mode = Mode.READ)
-	@Description("Find users that contribute to repositories of given user")
-	public Stream<Coder> getCodersInLanguage(@Name("userName") String userName) {
-		final String query =
-			"MATCH " +
-				"    (c)-[:CONTRIBUTES]-> " +
-				"        (repos:Repository) " +
-				"    <-[:OWNS]-(sf {name: $userName})" +
-				"RETURN c";
+	@Description("Find users that contribute to repositories of given user, each user once. " +
+		"Optionally pages the users (limit -1 is no limit) and counts the repositories they contribute to")
+	public Stream<Coder> getCodersInLanguage(
+		@Name("userName") String userName,
+		@Name(value = "limit", defaultValue = "-1") long limit,
+		@Name(value = "skip", defaultValue = "0") long skip,
+		@Name(value = "countRepos", defaultValue = "false") boolean countRepos
+	) {
+		var query = new StringBuilder();
+		if (FindCodersInLanguage.hasPrecomputedEdges(tx, "HELPS")) {
+			// One hop over edges written by collaboration_graph.py, repos counts the contributions
+			query.append("MATCH (coder)-[helps:HELPS]->({name: $userName}) ");
+			query.append(countRepos
+				? "RETURN coder, sum(helps.repos) AS repos "
+				: "RETURN DISTINCT coder, null AS repos ");
+		} else {
+			// One row per helper instead of one per contribution, owner is not own helper as with HELPS
+			query.append(
+				"MATCH " +
+					"    (coder)-[:CONTRIBUTES]-> " +
+					"        (repo:Repository) " +
+					"    <-[:OWNS]-(sf {name: $userName}) " +
+					"WHERE coder <> sf ");
+			query.append(countRepos
+				? "RETURN coder, count(DISTINCT repo) AS repos "
+				: "RETURN DISTINCT coder, null AS repos ");
+		}
 		final var params = new HashMap<String, Object>();
 		params.put("userName", userName);
-		return tx.execute(query, params)
+		FindCodersInLanguage.appendPaging(query, params, limit, skip);
+		return tx.execute(query.toString(), params)
 			.stream()
-			.map(Map::values)
-			.flatMap(Collection::stream)
-			.map(a -> (Node) a)
 			.map(Coder::new);
 	}
 
 	public static final class Coder {
 		public final Node node;
+		public final Long repos;
 
-		Coder(Node node) {
-			this.node = node;
+		Coder(Map<String, Object> row) {
+			this.node = (Node) row.get("coder");
+			this.repos = (Long) row.get("repos");
 		}
 	}
 
@@ -0,0 +1,83 @@
+package pl.ziemniakoss.projektdb;
+
+import org.junit.jupiter.api.BeforeAll;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.TestInstance;
+import org.neo4j.driver.Config;
+import org.neo4j.driver.GraphDatabase;
+import org.neo4j.harness.Neo4j;
+import org.neo4j.harness.Neo4jBuilders;
+
+import static org.assertj.core.api.Assertions.assertThat;
+
+@TestInstance(TestInstance.Lifecycle.PER_CLASS)
+public class CollaborationEdgesTest {
+
+	private static final Config driverConfig = Config.builder().withoutEncryption().build();
+	private Neo4j embeddedDatabaseServer;
+
+	@BeforeAll
+	void initializeNeo4j() {
+		this.embeddedDatabaseServer = Neo4jBuilders.newInProcessBuilder()
+			.withDisabledServer()
+			.withProcedure(FindHelpers.class)
+			.withProcedure(FindCodersInLanguage.class)
+			.build();
+		try(
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			// Edges differ from what traversal would find, so results show which one was read
+			session.run(
+				"CREATE (ow:User {name: 'owner'})," +
+					"(lang:Language {name: 'Rust'})," +
+					"(repo:Repository)," +
+					"(contr:User {name: 'contr'})," +
+					"(edgeOnly:User {name: 'edgeOnly'})," +
+					"(ow)-[:OWNS]->(repo)," +
+					"(contr)-[:CONTRIBUTES]->(repo)," +
+					"(repo)-[:IS_WRITTEN_IN]->(lang)," +
+					"(contr)-[:HELPS {repos: 3}]->(ow)," +
+					"(edgeOnly)-[:HELPS {repos: 1}]->(ow)," +
+					"(ow)-[:CODES_IN {repos: 2}]->(lang)," +
+					"(edgeOnly)-[:CODES_IN {repos: 5}]->(lang)"
+			);
+		}
+	}
+
+	@Test
+	void findHelpers_readsHelpsEdges() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var repos = session.run("call dbproject.findHelpers('owner', -1, 0, true)")
+				.list(record -> record.get("node").asNode().get("name").asString() + ":" + record.get("repos").asLong());
+			assertThat(repos).containsExactlyInAnyOrder("contr:3", "edgeOnly:1");
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_readsCodesInEdges() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var repos = session.run("call dbproject.findCodersInLanguage('Rust', -1, 0, true)")
+				.list(record -> record.get("node").asNode().get("name").asString() + ":" + record.get("repos").asLong());
+			assertThat(repos).containsExactlyInAnyOrder("owner:2", "edgeOnly:5");
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_pagesCodesInEdges() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var firstPage = session.run("call dbproject.findCodersInLanguage('Rust', 1)").single();
+			var secondPage = session.run("call dbproject.findCodersInLanguage('Rust', 1, 1)").single();
+			assertThat(firstPage.get("node").asNode().id()).isNotEqualTo(secondPage.get("node").asNode().id());
+		}
+	}
+}
@@ -0,0 +1,134 @@
+package pl.ziemniakoss.projektdb;
+
+import org.junit.jupiter.api.BeforeAll;
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.TestInstance;
+import org.neo4j.driver.Config;
+import org.neo4j.driver.GraphDatabase;
+import org.neo4j.driver.Session;
+import org.neo4j.harness.Neo4j;
+import org.neo4j.harness.Neo4jBuilders;
+
+import java.util.ArrayList;
+import java.util.HashSet;
+import java.util.Map;
+import java.util.Set;
+
+import static org.assertj.core.api.Assertions.assertThat;
+
+/**
+ * Result size regression test, nothing here is timed. Language with many repositories, each with
+ * one owner and many contributors picked from a shared pool of users. Old query returned owner x
+ * contributor pairs of every repository (REPOS * CONTRIBUTORS_PER_REPO rows), procedure returns
+ * the same coders, every one of them once, so at most USERS rows. Every repository here has
+ * contributors, so owners found by the old query and the procedure are the same.
+ */
+@TestInstance(TestInstance.Lifecycle.PER_CLASS)
+public class FindCodersInLanguageResultSizeRegressionTest {
+
+	private static final Config driverConfig = Config.builder().withoutEncryption().build();
+	private static final int USERS = 2000;
+	private static final int REPOS = 500;
+	private static final int CONTRIBUTORS_PER_REPO = 100;
+	// Query used before, pairs of owners and contributors
+	private static final String CROSS_PRODUCT_QUERY =
+		"MATCH " +
+			"    (repos:Repository)-[:IS_WRITTEN_IN]->" +
+			"        (:Language {name: $languageName}), " +
+			"    (contributors)-[:CONTRIBUTES]->(repos), " +
+			"    (owners)-[:OWNS]->(repos) " +
+			"RETURN owners, contributors";
+	private Neo4j embeddedDatabaseServer;
+
+	@BeforeAll
+	void initializeNeo4j() {
+		this.embeddedDatabaseServer = Neo4jBuilders.newInProcessBuilder()
+			.withDisabledServer()
+			.withProcedure(FindCodersInLanguage.class)
+			.build();
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			session.run("CREATE INDEX user_id FOR (u:User) ON (u.id)").consume();
+			session.run("CALL db.awaitIndexes()").consume();
+			session.run("UNWIND range(0, $users - 1) AS i CREATE (:User {id: i, name: 'user-' + i})",
+				Map.of("users", USERS)).consume();
+			session.run(
+				"CREATE (lang:Language {name: 'Rust'}) " +
+					"WITH lang " +
+					"UNWIND range(0, $repos - 1) AS r " +
+					"MATCH (owner:User {id: r % $users}) " +
+					"CREATE (owner)-[:OWNS]->(repo:Repository {id: r})-[:IS_WRITTEN_IN]->(lang) " +
+					"WITH repo, r " +
+					"UNWIND range(1, $contributors) AS c " +
+					"MATCH (contributor:User {id: (r * 7 + c * 13) % $users}) " +
+					"CREATE (contributor)-[:CONTRIBUTES]->(repo)",
+				Map.of("repos", REPOS, "users", USERS, "contributors", CONTRIBUTORS_PER_REPO)).consume();
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_returnsEveryCoderOnce() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var coders = session.run("call dbproject.findCodersInLanguage('Rust')")
+				.list(record -> record.get("node").asNode().id());
+			assertThat(coders).hasSizeLessThanOrEqualTo(USERS);
+			assertThat(coders).doesNotHaveDuplicates();
+			assertThat(coders).containsExactlyInAnyOrderElementsOf(findCodersWithOldQuery(session));
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_pagesDoNotOverlap() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var pageSize = 300;
+			var coders = new ArrayList<Long>();
+			var pages = 0;
+			while (true) {
+				var page = session.run("call dbproject.findCodersInLanguage('Rust', $limit, $skip)",
+					Map.of("limit", pageSize, "skip", pages * pageSize))
+					.list(record -> record.get("node").asNode().id());
+				coders.addAll(page);
+				pages++;
+				if (page.size() < pageSize) {
+					break;
+				}
+			}
+			assertThat(coders).doesNotHaveDuplicates();
+			assertThat(coders).containsExactlyInAnyOrderElementsOf(findCodersWithOldQuery(session));
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_countsRepos() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var repos = session.run("call dbproject.findCodersInLanguage('Rust', -1, 0, true) " +
+				"YIELD repos RETURN sum(repos) AS total").single().get("total").asLong();
+			var ownedOrContributed = session.run(
+				"MATCH (:Language {name: 'Rust'})<-[:IS_WRITTEN_IN]-(repo)<-[:OWNS|CONTRIBUTES]-(coder) " +
+					"RETURN count(DISTINCT [id(coder), id(repo)]) AS total").single().get("total").asLong();
+			assertThat(repos).isEqualTo(ownedOrContributed);
+		}
+	}
+
+	private Set<Long> findCodersWithOldQuery(Session session) {
+		var rows = session.run(CROSS_PRODUCT_QUERY, Map.of("languageName", "Rust")).list();
+		assertThat(rows).hasSize(REPOS * CONTRIBUTORS_PER_REPO);
+		var coders = new HashSet<Long>();
+		rows.forEach(row -> {
+			coders.add(row.get("owners").asNode().id());
+			coders.add(row.get("contributors").asNode().id());
+		});
+		return coders;
+	}
+}
@@ -33,7 +33,8 @@ public class FindCodersInLanguageTest {
 					"(contr:User)," +
 					"(ow)-[:OWNS]->(repo)," +
 					"(contr)-[:CONTRIBUTES]->(repo)," +
-					"(repo)-[:IS_WRITTEN_IN]->(lang)"
+					"(repo)-[:IS_WRITTEN_IN]->(lang)," +
+					"(solo:User {name: 'solo'})-[:OWNS]->(:Repository)-[:IS_WRITTEN_IN]->(:Language {name: 'Go'})"
 			);
 		}
 	}
@@ -49,6 +50,42 @@ public class FindCodersInLanguageTest {
 		}
 	}
 
+	@Test
+	void findCodersInLanguage_limit() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var firstPage = session.run("call dbproject.findCodersInLanguage('Rust', 1)").single();
+			var secondPage = session.run("call dbproject.findCodersInLanguage('Rust', 1, 1)").single();
+			assertThat(firstPage.get("node").asNode().id()).isNotEqualTo(secondPage.get("node").asNode().id());
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_countRepos() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var repos = session.run("call dbproject.findCodersInLanguage('Rust', -1, 0, true)")
+				.list(record -> record.get("repos").asLong());
+			assertThat(repos).containsExactly(1L, 1L);
+		}
+	}
+
+	@Test
+	void findCodersInLanguage_ownerWithoutContributors() {
+		// Before each coder was returned once, only owners of repositories with contributors were found
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var result = session.run("call dbproject.findCodersInLanguage('Go')").single();
+			assertThat(result.get("node").asNode().get("name").asString()).isEqualTo("solo");
+		}
+	}
+
 	@Test
 	void findCodersInLanguage_doesntExist() {
 		try (
@@ -33,7 +33,9 @@ public class FindHelpersTest {
 					"(contr:User {name: 'contr'})," +
 					"(ow)-[:OWNS]->(repo)," +
 					"(contr)-[:CONTRIBUTES]->(repo)," +
-					"(repo)-[:IS_WRITTEN_IN]->(lang)"
+					"(repo)-[:IS_WRITTEN_IN]->(lang)," +
+					"(solo:User {name: 'solo'})-[:OWNS]->(soloRepo:Repository)," +
+					"(solo)-[:CONTRIBUTES]->(soloRepo)"
 			);
 		}
 	}
@@ -48,4 +50,27 @@ public class FindHelpersTest {
 			assertThat(result.size()).isEqualTo(1);
 		}
 	}
+
+	@Test
+	void findHelpers_countRepos() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var result = session.run("call dbproject.findHelpers('owner', -1, 0, true)").single();
+			assertThat(result.get("node").asNode().get("name").asString()).isEqualTo("contr");
+			assertThat(result.get("repos").asLong()).isEqualTo(1L);
+		}
+	}
+
+	@Test
+	void findHelpers_ownerIsNotOwnHelper() {
+		try (
+			var driver = GraphDatabase.driver(embeddedDatabaseServer.boltURI(), driverConfig);
+			var session = driver.session()
+		) {
+			var result = session.run("call dbproject.findHelpers('solo')").list();
+			assertThat(result.size()).isEqualTo(0);
+		}
+	}
 }
\ No newline at end of file